@@ -0,0 +1,174 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from .db import engine
+from .jobs import claim_job, claimable
+from .models import (
+    AccountDeletionJob,
+    User,
+    UploadedFile,
+    DocumentChunk,
+    SalesLedger,
+    DailySalesRollup,
+    OrderQuote,
+    InventoryItem,
+    ChatLog,
+    Alert,
+    BusinessInfo,
+)
+from .rag_engine import delete_tenant_vectors
+from .retention import delete_chat_archives
+from .retrieval import invalidate_lexical_index
+from .tenants import invalidate_tenant
+from .dashboard import invalidate_dashboard
+from .storage import blob_in_grace_period
+
+# --- BACKGROUND ACCOUNT DELETION ---
+# DELETE /config/account only queues an AccountDeletionJob; this job does the work:
+#   1. vectors - one tenant-wide metadata-filter delete
+#   2. files   - uploaded files removed from disk in parallel (blobs still shared, or stored
+#                within BLOB_GRACE_SECONDS like release_blob, are kept)
+#   3. rows    - one set-based DELETE ... WHERE user_id = ? per table, children before parents
+#   4. archives - the tenant's chat retention archives, after the rows so the retention job
+#                has nothing left to archive for them. Left behind, they would be exported by
+#                the next account given the same id (SQLite can reuse the highest rowid)
+# Every step is idempotent and the job row records progress, so an interrupted job is simply
+# re-run (on startup, or by the scheduler once its claim goes stale, see app/jobs.py). Each table is deleted in its own transaction together with the
+# progress update (SQLite allows one writer at a time).
+
+UNFINISHED_STATUSES = ("PENDING", "PROCESSING")
+FILE_DELETE_WORKERS = 8
+
+# Deletion order: rows that reference user/uploadedfile go first, the user row last
+TENANT_TABLES = [DailySalesRollup, OrderQuote, SalesLedger, InventoryItem, ChatLog, Alert, BusinessInfo, UploadedFile]
+
+def _delete_statements(user_id: int) -> list:
+    file_ids = select(UploadedFile.id).where(UploadedFile.user_id == user_id)
+    statements = [("documentchunk", delete(DocumentChunk).where(DocumentChunk.file_id.in_(file_ids)))]
+    statements += [(model.__tablename__, delete(model).where(model.user_id == user_id)) for model in TENANT_TABLES]
+    statements.append(("user", delete(User).where(User.id == user_id)))
+    return statements
+
+def _remove_file(path: str) -> bool:
+    if blob_in_grace_period(path):
+        return False # another tenant's upload of the same content may be committing right now
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        print(f"⚠️ Could not remove {path}: {e}")
+        return False
+
+def _set_step(session: Session, job: AccountDeletionJob, step: str, steps: int = 1):
+    job.step = step
+    job.steps_done += steps
+    job.heartbeat_at = datetime.utcnow()
+    session.add(job)
+    session.commit()
+
+def run_account_deletion_job(job_id: int):
+    """Sync on purpose: FastAPI runs sync background tasks in its threadpool."""
+    with Session(engine) as session:
+        if not claim_job(session, AccountDeletionJob, job_id):
+            return # finished, missing, or another run has it
+        job = session.get(AccountDeletionJob, job_id)
+        user_id = job.user_id
+        statements = _delete_statements(user_id)
+
+        try:
+            job.error = None
+            job.steps_done = 0
+            job.steps_total = 3 + len(statements)
+            session.add(job)
+            session.commit()
+
+            # 1. Vectors (orphans left by a vector-store outage are cleaned up by app.reconcile)
+            files = session.exec(select(UploadedFile.id, UploadedFile.filepath).where(UploadedFile.user_id == user_id)).all()
+            try:
+                delete_tenant_vectors(user_id, [file_id for file_id, _ in files])
+            except Exception as e:
+                print(f"⚠️ Vector cleanup failed for user {user_id}, leaving it to reconciliation: {e}")
+            _set_step(session, job, "vectors")
+
+            # 2. Files on disk, except content-addressed blobs another tenant also uploaded
+            paths = {path for _, path in files}
+            shared = set(session.exec(
+                select(UploadedFile.filepath).where(UploadedFile.filepath.in_(paths), UploadedFile.user_id != user_id)
+            ).all()) if paths else set()
+            with ThreadPoolExecutor(max_workers=FILE_DELETE_WORKERS) as pool:
+                removed = sum(pool.map(_remove_file, sorted(paths - shared)))
+            job.files_removed += removed
+            _set_step(session, job, "files")
+
+            # 3. SQL rows, one set-based DELETE per table
+            for table, statement in statements:
+                result = session.exec(statement)
+                job.rows_deleted += result.rowcount
+                _set_step(session, job, f"rows:{table}") # commits the DELETE with the progress
+
+            # 4. Chat archives
+            job.files_removed += delete_chat_archives(user_id)
+            _set_step(session, job, "archives")
+
+            job.status = "COMPLETED"
+            job.step = "done"
+            job.finished_at = datetime.utcnow()
+            invalidate_lexical_index(user_id)
+            invalidate_tenant(user_id)
+            invalidate_dashboard(user_id)
+            print(f"🗑️ Deleted account {user_id}: {job.rows_deleted} rows, {job.files_removed} files.")
+        except Exception as e:
+            print(f"❌ Account deletion failed for user {user_id}: {e}")
+            session.rollback()
+            job.status = "FAILED"
+            job.error = str(e)
+
+        session.add(job)
+        session.commit()
+
+def queue_account_deletion(user_id: int) -> AccountDeletionJob:
+    """Returns the user's unfinished deletion job, or creates one. Caller schedules the run."""
+    with Session(engine) as session:
+        job = session.exec(
+            select(AccountDeletionJob).where(
+                AccountDeletionJob.user_id == user_id,
+                AccountDeletionJob.status.in_(UNFINISHED_STATUSES),
+            )
+        ).first()
+        if not job:
+            job = AccountDeletionJob(user_id=user_id)
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+        return job
+
+def resume_account_deletions() -> int:
+    """Runs deletion jobs that are still queued or whose run died (e.g. in a deploy). Returns how many."""
+    with Session(engine) as session:
+        job_ids = session.exec(
+            select(AccountDeletionJob.id).where(claimable(AccountDeletionJob, datetime.utcnow()))
+        ).all()
+
+    for job_id in job_ids:
+        print(f"🔁 Resuming account deletion job {job_id}")
+        run_account_deletion_job(job_id)
+    return len(job_ids)
+
+def deletion_status(job: AccountDeletionJob) -> dict:
+    progress = (job.steps_done / job.steps_total) if job.steps_total else 0.0
+    return {
+        "id": job.id,
+        "status": job.status,
+        "step": job.step,
+        "progress": round(progress, 4),
+        "rows_deleted": job.rows_deleted,
+        "files_removed": job.files_removed,
+        "error": job.error,
+        "finished_at": job.finished_at,
+    }
@@ -1,5 +1,3 @@
-import os
-from groq import Groq
 from langchain_groq import ChatGroq
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
@@ -12,7 +10,11 @@ from typing import List
 from sqlmodel import Session, select
 from .config import settings
 from .db import engine
-from .models import ChatLog, User
+from .models import ChatLog
+from starlette.concurrency import run_in_threadpool
+from .tenants import resolve_tenant, resolve_tenant_async, current_tenant
+from .chat_logger import chat_logger, merge_pending
+from .metrics import timed, model_label, llm_callbacks
 from .tools import (
     get_sales_analytics,
     log_offline_sale,
@@ -32,11 +34,17 @@ def get_session_history(session_id: str):
 def load_history_from_db(user_phone: str, limit: int = 10):
     """Loads the last N messages from the SQL ChatLog into LangChain history."""
     history = ChatMessageHistory()
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == user_phone)).first()
+    user = resolve_tenant(user_phone)
+    with timed("history_load"), Session(engine) as session:
         if user:
-            logs = session.exec(select(ChatLog).where(ChatLog.user_id == user.id).order_by(ChatLog.timestamp.desc()).limit(limit)).all()
-            for log in reversed(logs):
+            # The tenant's rows include its customer conversations; the admin chat is owner <-> bot only
+            senders = (user_phone, user.bot_phone_number)
+            pending = [log for log in chat_logger.pending_logs(user_id=user.id) if log.sender in senders] # Not yet flushed
+            logs = session.exec(
+                select(ChatLog).where(ChatLog.user_id == user.id, ChatLog.sender.in_(senders))
+                .order_by(ChatLog.timestamp.desc()).limit(limit)
+            ).all()
+            for log in reversed(merge_pending(logs, pending, limit)):
                 if log.sender == user_phone:
                      history.add_user_message(log.message_text)
                 else:
@@ -67,7 +75,7 @@ async def run_admin_agent(user_phone: str, message: str, bot_name: str, business
     agent = create_tool_calling_agent(llm, tools, prompt)
     agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
 
-    session_history = load_history_from_db(user_phone)
+    session_history = await run_in_threadpool(load_history_from_db, user_phone)
     store[user_phone] = session_history
 
     agent_with_chat_history = RunnableWithMessageHistory(
@@ -77,16 +85,22 @@ async def run_admin_agent(user_phone: str, message: str, bot_name: str, business
         history_messages_key="chat_history",
     )
 
-    response = await agent_with_chat_history.ainvoke(
-        {
-            "input": message,
-            "bot_name": bot_name,
-            "business_name": business_name,
-            "owner_phone": user_phone,
-            "user_phone": user_phone # Explicitly passed for prompt injection
-        },
-        config={"configurable": {"session_id": user_phone}}
-    )
+    # Tools resolve the owner from this instead of re-querying by phone on every call
+    token = current_tenant.set(await resolve_tenant_async(user_phone))
+    try:
+        with model_label(llm.model_name):
+            response = await agent_with_chat_history.ainvoke(
+                {
+                    "input": message,
+                    "bot_name": bot_name,
+                    "business_name": business_name,
+                    "owner_phone": user_phone,
+                    "user_phone": user_phone # Explicitly passed for prompt injection
+                },
+                config={"configurable": {"session_id": user_phone}, "callbacks": llm_callbacks}
+            )
+    finally:
+        current_tenant.reset(token)
 
     return response["output"]
 
@@ -111,7 +125,7 @@ async def analyze_sentiment(message: str):
     chain = prompt | llm | parser
 
     try:
-        response = await chain.ainvoke({"message": message})
+        response = await chain.ainvoke({"message": message}, config={"callbacks": llm_callbacks})
         return response
     except Exception as e:
         print(f"Sentiment Analysis Error: {e}")
@@ -146,23 +160,4 @@ async def extract_business_info(text: str):
     ])
 
     chain = prompt | structured_llm
-    return await chain.ainvoke({})
-
-# --- AUDIO TRANSCRIPTION (Crucial for Voice Notes) ---
-
-async def transcribe_audio(file_path: str):
-    """
-    Transcribes audio using Groq's Whisper model (distil-whisper-large-v3-en).
-    """
-    client = Groq(api_key=settings.GROQ_API_KEY)
-    
-    with open(file_path, "rb") as file:
-        transcription = client.audio.transcriptions.create(
-            file=(os.path.basename(file_path), file.read()),
-            model="whisper-large-v3",
-            response_format="json",
-            language="en",
-            temperature=0.0
-        )
-    
-    return transcription.text
\ No newline at end of file
+    return await chain.ainvoke({}, config={"callbacks": llm_callbacks})
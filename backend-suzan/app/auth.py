@@ -3,20 +3,25 @@ from sqlmodel import Session, select
 from .db import engine
 from .models import User
 from .schema import UserCreate, UserLogin, UserResponse
+from .tenants import normalize_phone, invalidate_tenant
 from datetime import datetime
 
 router = APIRouter()
 
 @router.post("/signup", response_model=UserResponse)
 def signup(user_data: UserCreate):
-    # Validation
-    if not user_data.phone_number.startswith("+234"):
+    # Validation (stored in canonical E.164 form, e.g. +2348012345678)
+    try:
+        phone_number = normalize_phone(user_data.phone_number)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid phone number")
+    if not phone_number.startswith("+234"):
          raise HTTPException(status_code=400, detail="Phone number must start with +234")
 
     with Session(engine) as session:
         # Check if user exists
         existing_user = session.exec(select(User).where(
-            User.phone_number == user_data.phone_number
+            User.phone_number == phone_number
         )).first()
 
         if existing_user:
@@ -25,13 +30,14 @@ def signup(user_data: UserCreate):
         # Create User
         new_user = User(
             business_name=user_data.business_name,
-            phone_number=user_data.phone_number,
+            phone_number=phone_number,
             password_hash=user_data.password, # Note: using password_hash to match models.py
             bot_name="Suzan"
         )
         session.add(new_user)
         session.commit()
         session.refresh(new_user)
+        invalidate_tenant(phone=phone_number) # Drop a cached "no such user"
         
         # Return User + Token
         return {
@@ -44,12 +50,16 @@ def signup(user_data: UserCreate):
 
 @router.post("/login", response_model=UserResponse)
 def login(login_data: UserLogin):
-    if not login_data.phone_number.startswith("+234"):
+    try:
+        phone_number = normalize_phone(login_data.phone_number)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid phone number")
+    if not phone_number.startswith("+234"):
          raise HTTPException(status_code=400, detail="Phone number must start with +234")
 
     with Session(engine) as session:
         # Find User
-        user = session.exec(select(User).where(User.phone_number == login_data.phone_number)).first()
+        user = session.exec(select(User).where(User.phone_number == phone_number)).first()
 
         # Verify Password (Simple check for now)
         if not user or user.password_hash != login_data.password:
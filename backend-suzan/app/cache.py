@@ -0,0 +1,44 @@
+import threading
+import time
+
+# --- IN-PROCESS TTL CACHE ---
+# Per-worker cache for small, hot lookups (tenants, dashboard summaries, ...). Each uvicorn
+# worker has its own copy, so entries must be safe to serve for up to `ttl_seconds` after
+# a write in another process; writers in this process call pop()/clear() to invalidate.
+
+MISSING = object() # get() default, so a cached None (e.g. "no such user") is still a hit
+
+class TTLCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {} # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
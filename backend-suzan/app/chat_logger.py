@@ -0,0 +1,185 @@
+import asyncio
+import threading
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from .db import AsyncSessionLocal
+from .metrics import timed
+from .models import ChatLog
+
+# --- WRITE-BEHIND CHAT LOGGING ---
+# Webhooks and reply paths call chat_logger.log(...) instead of add+commit per message.
+# Rows are buffered and written as one multi-row INSERT every FLUSH_INTERVAL_SECONDS or
+# as soon as FLUSH_MAX_ROWS are waiting, so a burst of messages costs one commit (one fsync
+# on SQLite, one round trip on Postgres) instead of one each. stop() flushes on shutdown.
+#
+# Until a row is committed it is only in this process's memory; history loaders merge it
+# back in with pending_logs()/merge_pending() so a conversation always sees its latest turns.
+#
+# A failed flush puts the rows back for the next one. Connection errors (database down or
+# locked) retry until it comes back; anything else (a row the database rejects) retries
+# MAX_FLUSH_ATTEMPTS times, then the batch is split in halves until the bad rows are found,
+# and those are logged and dropped. At most MAX_BUFFERED_ROWS wait in memory: past that
+# the oldest are dropped, so an outage can't grow the process without bound.
+
+FLUSH_INTERVAL_SECONDS = 0.05
+FLUSH_MAX_ROWS = 200
+MAX_FLUSH_ATTEMPTS = 3
+MAX_BUFFERED_ROWS = 20_000
+
+class ChatLogWriter:
+    def __init__(self, interval: float = FLUSH_INTERVAL_SECONDS, max_rows: int = FLUSH_MAX_ROWS,
+                 max_buffered: int = MAX_BUFFERED_ROWS):
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_buffered = max_buffered
+        self._buffer = [] # rows waiting for the next flush
+        self._failed_attempts = 0 # consecutive failed flushes of the rows at the head of the buffer
+        self.dropped = 0
+        self._inflight = [] # rows being written right now (still visible to readers)
+        self._lock = threading.Lock() # history loaders read from threadpool threads
+        self._wakeup = None
+        self._task = None
+        self._flush_lock = None
+
+    def log(self, sender: str, message_text: str, user_id: int = None, conversation_id: str = None, media_url: str = None):
+        """Queues one ChatLog row. Must be called from the event loop thread."""
+        row = {
+            "conversation_id": conversation_id or str(uuid4()),
+            "sender": sender,
+            "message_text": message_text,
+            "media_url": media_url,
+            "user_id": user_id,
+            "timestamp": datetime.utcnow(),
+        }
+        with self._lock:
+            self._buffer.append(row)
+            overflow = self._trim()
+            size = len(self._buffer)
+        self._report_overflow(overflow)
+        self._ensure_started()
+        if size >= self.max_rows:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _trim(self) -> int:
+        """Drops the oldest rows past max_buffered. Call with self._lock held."""
+        overflow = len(self._buffer) - self.max_buffered
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+        return max(overflow, 0)
+
+    def _report_overflow(self, overflow: int):
+        if overflow:
+            print(f"⚠️ Chat log buffer full ({self.max_buffered} rows), dropped the {overflow} oldest")
+
+    async def _insert(self, rows: list):
+        with timed("chatlog_commit"):
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(ChatLog).values(rows))
+                await session.commit()
+
+    async def _insert_or_drop_bad_rows(self, rows: list, settled: list):
+        """Bisects a batch the database keeps rejecting. Rows written or dropped go into `settled`."""
+        try:
+            await self._insert(rows)
+            settled.extend(rows)
+            return
+        except (OperationalError, InterfaceError):
+            raise # the database went away: not these rows' fault
+        except Exception as e:
+            if len(rows) == 1:
+                self.dropped += 1
+                settled.extend(rows)
+                print(f"🗑️ Dropping chat log row from {rows[0]['sender']} ({rows[0]['conversation_id']}): {e}")
+                return
+        middle = len(rows) // 2
+        await self._insert_or_drop_bad_rows(rows[:middle], settled)
+        await self._insert_or_drop_bad_rows(rows[middle:], settled)
+
+    async def flush(self) -> int:
+        """Writes everything buffered so far in one INSERT. Returns rows written or dropped."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            with self._lock:
+                if not self._buffer:
+                    return 0
+                self._inflight, self._buffer = self._buffer, []
+                rows = list(self._inflight)
+            settled = []
+            try:
+                if self._failed_attempts >= MAX_FLUSH_ATTEMPTS:
+                    await self._insert_or_drop_bad_rows(rows, settled)
+                else:
+                    await self._insert(rows)
+            except Exception as e:
+                if isinstance(e, (OperationalError, InterfaceError)):
+                    print(f"❌ Chat log flush failed, database unavailable; retrying {len(rows)} rows: {e}")
+                else:
+                    self._failed_attempts += 1
+                    print(f"❌ Chat log flush failed (attempt {self._failed_attempts}/{MAX_FLUSH_ATTEMPTS}), "
+                          f"retrying {len(rows)} rows: {e}")
+                done = {id(row) for row in settled}
+                with self._lock:
+                    self._buffer[:0] = [row for row in rows if id(row) not in done]
+                    self._inflight = []
+                    overflow = self._trim()
+                self._report_overflow(overflow)
+                return len(settled)
+            self._failed_attempts = 0
+            with self._lock:
+                self._inflight = []
+            return len(rows)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        written = await self.flush()
+        if written:
+            print(f"📝 Flushed {written} buffered chat logs on shutdown.")
+
+    def pending_logs(self, sender: str = None, user_id: int = None) -> list:
+        """Uncommitted rows matching the filters, as transient ChatLog objects."""
+        with self._lock:
+            rows = self._inflight + self._buffer
+        return [
+            ChatLog(**row) for row in rows
+            if (sender is None or row["sender"] == sender) and (user_id is None or row["user_id"] == user_id)
+        ]
+
+chat_logger = ChatLogWriter()
+
+def merge_pending(logs: list, pending: list, limit: int) -> list:
+    """
+    Newest-first merge of committed `logs` with `pending` rows, deduped by conversation_id.
+    Take the pending snapshot before querying: a row committed in between then shows up in
+    both lists and is kept once, instead of in neither.
+    """
+    seen = {log.conversation_id for log in logs}
+    merged = list(logs) + [log for log in pending if log.conversation_id not in seen]
+    merged.sort(key=lambda log: log.timestamp, reverse=True)
+    return merged[:limit]
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -17,9 +17,43 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: Optional[str] = None
+    # Per engine (sync + async); ignored for SQLite
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
 
     # Monitoring
     SENTRY_DSN: Optional[str] = None
+    # Log a per-stage timing breakdown for requests/messages slower than this (see app/metrics.py); unset = off
+    SLOW_REQUEST_MS: Optional[int] = None
+    # Metrics tier label per tenant, e.g. {"12": "premium"} (JSON in the env); others are "standard"
+    TENANT_TIERS: Dict[str, str] = {}
+
+    # Ingestion: >1 shards embedding across that many worker processes (see app/embedding_workers.py)
+    INGEST_WORKERS: int = 0
+
+    # ChatLog retention: older rows move to compressed monthly archives (see app/retention.py)
+    CHAT_RETENTION_DAYS: int = 90
+    CHAT_ARCHIVE_DIR: str = "archives"
+
+    # Uploads larger than this are rejected with 413; blobs, temp files and media live under UPLOAD_DIR (see app/storage.py)
+    MAX_UPLOAD_MB: int = 25
+    UPLOAD_DIR: str = "uploads"
+
+    # Customer orders hold their stock this long before the sweeper releases it (see app/orders.py)
+    ORDER_HOLD_MINUTES: int = 30
+    # Also WhatsApp the owner when an item runs low (the dashboard Alert is always created)
+    LOW_STOCK_WHATSAPP: bool = False
+
+    # Scheduled bulk sends (daily digests) are spaced out to this rate
+    WHATSAPP_BULK_SENDS_PER_SECOND: float = 10.0
+    # In-process job scheduler (see app/scheduler.py); disable on extra web workers if you like
+    SCHEDULER_ENABLED: bool = True
+
+    # Concurrent Whisper calls per worker when a long voice note is split (see app/voice.py)
+    VOICE_MAX_PARALLEL: int = 4
+    # Inbound WhatsApp media (see app/media.py): parallel downloads per worker, days kept on disk
+    MEDIA_MAX_CONCURRENT_DOWNLOADS: int = 8
+    MEDIA_CACHE_DAYS: int = 7
 
     # LangChain tracing
     LANGCHAIN_TRACING_V2: Optional[str] = None
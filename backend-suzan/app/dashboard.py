@@ -0,0 +1,106 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, event, func
+from sqlmodel import Session, select
+
+from .cache import TTLCache, MISSING
+from .db import engine
+from .models import Alert, BusinessInfo, DailySalesRollup, InventoryItem, SalesLedger
+
+# --- DASHBOARD SUMMARY ---
+# Everything the dashboard home shows in three aggregate queries (rollups for revenue, one
+# row of counters, top items), cached per tenant for DASHBOARD_CACHE_SECONDS.
+#
+# Writers call touch_dashboard(session, user_id) inside their transaction; the tenant's
+# entry is dropped once that transaction commits, so the next request sees the write.
+# Rollups, stock alerts and knowledge saves already do this.
+
+DASHBOARD_CACHE_SECONDS = 10
+TOP_ITEMS_DAYS = 30
+TOP_ITEMS_LIMIT = 5
+
+DIRTY_KEY = "dashboard_dirty" # session.info key: tenants to invalidate after commit
+
+_cache = TTLCache(DASHBOARD_CACHE_SECONDS)
+
+def touch_dashboard(session, user_id: int):
+    """Marks the tenant's summary stale once `session` commits (Session or AsyncSession)."""
+    session.info.setdefault(DIRTY_KEY, set()).add(user_id)
+
+def invalidate_dashboard(user_id: int = None):
+    if user_id is None:
+        _cache.clear()
+    else:
+        _cache.pop(user_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_touched(session):
+    for user_id in session.info.pop(DIRTY_KEY, ()):
+        invalidate_dashboard(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop(DIRTY_KEY, None)
+
+# --- QUERIES ---
+
+def _revenue(session: Session, user_id: int, today: date) -> dict:
+    week_start = today - timedelta(days=6)
+    today_revenue, week_revenue = session.exec(
+        select(
+            func.coalesce(func.sum(case((DailySalesRollup.day == today, DailySalesRollup.revenue), else_=0.0)), 0.0),
+            func.coalesce(func.sum(DailySalesRollup.revenue), 0.0),
+        ).where(
+            DailySalesRollup.user_id == user_id,
+            DailySalesRollup.status == "COMPLETED",
+            DailySalesRollup.day >= week_start,
+            DailySalesRollup.day <= today,
+        )
+    ).one()
+    return {"today": today_revenue, "week": week_revenue}
+
+def _counters(session: Session, user_id: int) -> dict:
+    def count(model, *criteria):
+        return select(func.count()).select_from(model).where(model.user_id == user_id, *criteria).scalar_subquery()
+
+    pending, low_stock, unread, knowledge = session.exec(
+        select(
+            count(SalesLedger, SalesLedger.status == "PENDING"),
+            count(InventoryItem, InventoryItem.stock <= InventoryItem.low_stock_threshold),
+            count(Alert, Alert.is_read == False), # noqa: E712 - SQL expression
+            count(BusinessInfo),
+        )
+    ).one()
+    return {"pending_orders": pending, "low_stock_items": low_stock, "unread_alerts": unread, "knowledge_rows": knowledge}
+
+def _top_items(session: Session, user_id: int, today: date) -> list:
+    # Orders are grouped by product; walk-in sales (no product link) by their description
+    name = func.coalesce(InventoryItem.name, SalesLedger.item_description)
+    since = datetime.combine(today - timedelta(days=TOP_ITEMS_DAYS - 1), datetime.min.time())
+    rows = session.exec(
+        select(name, func.sum(SalesLedger.quantity), func.sum(SalesLedger.amount))
+        .select_from(SalesLedger)
+        .outerjoin(InventoryItem, InventoryItem.id == SalesLedger.inventory_item_id)
+        .where(SalesLedger.user_id == user_id, SalesLedger.status == "COMPLETED", SalesLedger.timestamp >= since)
+        .group_by(name)
+        .order_by(func.sum(SalesLedger.amount).desc())
+        .limit(TOP_ITEMS_LIMIT)
+    ).all()
+    return [{"name": n, "quantity": q, "revenue": r or 0.0} for n, q, r in rows]
+
+def dashboard_summary(session: Session, user_id: int, today: date = None) -> dict:
+    today = today or datetime.now().date()
+    return {
+        "revenue": _revenue(session, user_id, today),
+        **_counters(session, user_id),
+        "top_items": _top_items(session, user_id, today),
+    }
+
+def get_dashboard_summary(user_id: int) -> dict:
+    """Cached dashboard_summary() for one tenant."""
+    summary = _cache.get(user_id)
+    if summary is MISSING:
+        with Session(engine) as session:
+            summary = dashboard_summary(session, user_id)
+        _cache.set(user_id, summary)
+    return summary
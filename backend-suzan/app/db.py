@@ -1,4 +1,7 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from .config import settings
 
 # Use SQLite by default if DATABASE_URL is not set
@@ -8,7 +11,63 @@ DATABASE_URL = getattr(settings, "DATABASE_URL", None) or "sqlite:///./backend.d
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL, echo=False)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+def to_async_url(url: str) -> str:
+    """sqlite:// -> sqlite+aiosqlite://, postgresql:// -> postgresql+asyncpg://"""
+    scheme, rest = url.split("://", 1)
+    driver = scheme.split("+", 1)[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if driver == "postgresql":
+        # asyncpg takes 'ssl', not libpq's 'sslmode'
+        return f"postgresql+asyncpg://{rest.replace('sslmode=', 'ssl=')}"
+    return url
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+def _pool_options() -> dict:
+    # SQLite keeps SQLAlchemy's defaults; a server database gets a bounded, health-checked pool
+    if IS_SQLITE:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": 30,
+        "pool_recycle": 1800, # Managed Postgres drops idle connections
+        "pool_pre_ping": True,
+    }
+
+# Sync engine: threadpool code (LangChain tools, ingestion jobs, sync endpoints)
+engine = create_engine(DATABASE_URL, echo=False, **_pool_options())
+
+# Async engine: async endpoints and webhook processing, so DB waits don't block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **_pool_options())
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+# --- SQLITE PRAGMAS ---
+# WAL lets readers run while the chat logger / ingestion jobs write, and with
+# synchronous=NORMAL a commit no longer fsyncs the main database file (only checkpoints do).
+# busy_timeout makes a second writer wait instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -20000, # KiB (~20 MB page cache)
+    "temp_store": "MEMORY",
+}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
+    # Versioned migrations (baseline create_all + indexes/columns for existing databases)
+    from .migrations import run_migrations
+    run_migrations(engine)
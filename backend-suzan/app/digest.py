@@ -0,0 +1,117 @@
+import argparse
+from datetime import date, datetime
+
+from sqlalchemy import func, or_, update
+from sqlmodel import Session, select
+
+from .db import engine
+from .models import DailySalesRollup, InventoryItem, SalesLedger, User
+from .whatsapp import send_whatsapp_throttled
+
+# --- DAILY OWNER DIGEST ---
+# Answers "how did I do today?" without an LLM. Every minute the scheduler calls
+# send_daily_digests(): owners who opted in (User.digest_enabled) and whose digest_time has
+# passed are claimed in one UPDATE ... RETURNING (digest_sent_on = today, so each owner gets
+# one digest a day even with several workers), their stats are computed for all of them at
+# once with grouped SQL, and the rendered messages go out through the throttled sender.
+#
+# Usage: python -m app.digest [--dry-run]  (--dry-run prints every opted-in owner's digest, sends nothing)
+
+DIGEST_BATCH_SIZE = 500
+
+DIGEST_TEMPLATE = """📊 {business_name}: your day ({day})
+
+💰 Revenue: ₦{revenue:,.2f} from {sales} sale(s)
+⏳ Pending orders: {pending}
+⚠️ Low-stock items: {low_stock}
+{footer}"""
+
+def daily_stats(session: Session, user_ids: list, day: date) -> dict:
+    """{user_id: {"revenue", "sales", "pending", "low_stock"}} for many tenants in three queries."""
+    stats = {user_id: {"revenue": 0.0, "sales": 0, "pending": 0, "low_stock": 0} for user_id in user_ids}
+    if not user_ids:
+        return stats
+
+    for user_id, revenue, count in session.exec(
+        select(DailySalesRollup.user_id, func.sum(DailySalesRollup.revenue), func.sum(DailySalesRollup.count))
+        .where(DailySalesRollup.user_id.in_(user_ids), DailySalesRollup.day == day, DailySalesRollup.status == "COMPLETED")
+        .group_by(DailySalesRollup.user_id)
+    ):
+        stats[user_id].update(revenue=revenue or 0.0, sales=count or 0)
+
+    for user_id, pending in session.exec(
+        select(SalesLedger.user_id, func.count())
+        .where(SalesLedger.user_id.in_(user_ids), SalesLedger.status == "PENDING")
+        .group_by(SalesLedger.user_id)
+    ):
+        stats[user_id]["pending"] = pending
+
+    for user_id, low_stock in session.exec(
+        select(InventoryItem.user_id, func.count())
+        .where(InventoryItem.user_id.in_(user_ids), InventoryItem.stock <= InventoryItem.low_stock_threshold)
+        .group_by(InventoryItem.user_id)
+    ):
+        stats[user_id]["low_stock"] = low_stock
+
+    return stats
+
+def render_digest(business_name: str, day: date, stats: dict) -> str:
+    footer = "Ask me about 'this week' for the weekly view." if stats["sales"] else "No completed sales today."
+    return DIGEST_TEMPLATE.format(business_name=business_name, day=day.strftime("%a %d %b"), footer=footer, **stats)
+
+def _claim_due_owners(session: Session, now: datetime) -> list:
+    """Marks up to DIGEST_BATCH_SIZE due owners as sent today and returns (id, phone, business_name)."""
+    today = now.date()
+    due_ids = select(User.id).where(
+        User.digest_enabled == True, # noqa: E712 - SQL expression
+        User.digest_time <= now.time(),
+        or_(User.digest_sent_on == None, User.digest_sent_on < today), # noqa: E711
+    ).limit(DIGEST_BATCH_SIZE)
+    claimed = session.exec(
+        update(User)
+        .where(User.id.in_(due_ids.scalar_subquery()), or_(User.digest_sent_on == None, User.digest_sent_on < today)) # noqa: E711
+        .values(digest_sent_on=today)
+        .returning(User.id, User.phone_number, User.business_name)
+        .execution_options(synchronize_session=False)
+    ).all()
+    session.commit()
+    return claimed
+
+def send_daily_digests(now: datetime = None, dry_run: bool = False) -> dict:
+    """Sends today's digest to every opted-in owner whose send time has passed."""
+    now = now or datetime.now()
+    sent = failed = 0
+    with Session(engine) as session:
+        while True:
+            if dry_run:
+                owners = session.exec(
+                    select(User.id, User.phone_number, User.business_name).where(User.digest_enabled == True) # noqa: E712
+                ).all()
+            else:
+                owners = _claim_due_owners(session, now)
+            if not owners:
+                break
+
+            stats = daily_stats(session, [owner[0] for owner in owners], now.date())
+            for user_id, phone, business_name in owners:
+                message = render_digest(business_name, now.date(), stats[user_id])
+                if dry_run:
+                    print(f"--- {phone} ---\n{message}")
+                    continue
+                result = send_whatsapp_throttled(phone, message)
+                if isinstance(result, dict) and result.get("error"):
+                    failed += 1
+                else:
+                    sent += 1
+            if dry_run:
+                break
+
+    if sent or failed:
+        print(f"📬 Daily digests: {sent} sent, {failed} failed.")
+    return {"sent": sent, "failed": failed}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send (or preview) the daily owner digests.")
+    parser.add_argument("--dry-run", action="store_true", help="Print every opted-in owner's digest without sending")
+    args = parser.parse_args()
+    send_daily_digests(dry_run=args.dry_run)
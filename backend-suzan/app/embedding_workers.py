@@ -0,0 +1,138 @@
+import argparse
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# --- MULTIPROCESS EMBEDDING ---
+# Sentence-transformer inference in one threadpool thread is GIL- and tokenizer-bound, so
+# bulk ingestion used a single core. This pool shards chunk batches across processes that
+# each load the model once. Workers write their vectors straight into one shared-memory
+# float32 block owned by the parent, so results are never pickled back through the pool.
+#
+# Enabled for ingestion with INGEST_WORKERS > 1 (see rag_engine.embed_texts).
+# Benchmark: python -m app.embedding_workers --chunks 2000 --workers 1 2 4
+
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+EMBEDDING_DIM = 768
+SHARD_SIZE = 32
+
+_model = None
+
+def _init_worker(model_name: str):
+    """Runs once per worker process: load the model and stop torch oversubscribing cores."""
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(1)
+    _model = SentenceTransformer(model_name)
+
+def _embed_shard(texts: list, shm_name: str, row_offset: int, dim: int):
+    vectors = _model.encode(texts, batch_size=SHARD_SIZE, convert_to_numpy=True)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((len(texts), dim), dtype=np.float32, buffer=shm.buf, offset=row_offset * dim * 4)
+        out[:] = vectors
+        del out # Release the buffer export before closing
+    finally:
+        shm.close()
+    return len(texts)
+
+class EmbeddingPool:
+    def __init__(self, workers: int = None, model_name: str = MODEL_NAME, dim: int = EMBEDDING_DIM, shard_size: int = SHARD_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.dim = dim
+        self.shard_size = shard_size
+        # spawn, not fork: forking a process that already initialised torch can deadlock
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name,),
+        )
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Returns an (n, dim) float32 array; row i is the embedding of texts[i]."""
+        n = len(texts)
+        if n == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        # Spread small batches over every worker instead of filling shards one by one
+        shard = max(1, min(self.shard_size, -(-n // self.workers)))
+        shm = shared_memory.SharedMemory(create=True, size=n * self.dim * 4)
+        try:
+            futures = [
+                self.executor.submit(_embed_shard, texts[i : i + shard], shm.name, i, self.dim)
+                for i in range(0, n, shard)
+            ]
+            for future in futures:
+                future.result()
+            view = np.ndarray((n, self.dim), dtype=np.float32, buffer=shm.buf)
+            result = view.copy()
+            del view
+            return result
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def warm_up(self):
+        """Forces every worker to load the model so the first real batch isn't penalised."""
+        self.embed(["warm up"] * self.workers)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+_pool = None
+_pool_lock = threading.Lock() # ingestion jobs run on several threadpool threads at once
+
+def get_embedding_pool(workers: int) -> EmbeddingPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = EmbeddingPool(workers=workers)
+    return _pool
+
+def shutdown_embedding_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def benchmark(texts: list, worker_counts: list) -> list:
+    """Measures chunks/sec for each worker count (model load time excluded)."""
+    results = []
+    for workers in worker_counts:
+        pool = EmbeddingPool(workers=workers)
+        try:
+            pool.warm_up()
+            start = time.perf_counter()
+            pool.embed(texts)
+            seconds = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        rate = len(texts) / seconds
+        results.append({
+            "workers": workers,
+            "chunks": len(texts),
+            "seconds": round(seconds, 3),
+            "chunks_per_sec": round(rate, 1),
+            "chunks_per_sec_per_core": round(rate / workers, 1),
+        })
+        print(f"⚙️ {workers} worker(s): {rate:.1f} chunks/s ({rate / workers:.1f} per core)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark multiprocess embedding throughput.")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    sample = "Rice 50kg bag, premium long grain. Free delivery within Lagos on orders above N50,000. " * 10
+    benchmark([f"{i}: {sample}" for i in range(args.chunks)], args.workers)
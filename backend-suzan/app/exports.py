@@ -0,0 +1,96 @@
+import csv
+import io
+import itertools
+import zlib
+from datetime import datetime
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+
+from .db import engine
+from .models import SalesLedger, ChatLog
+
+# --- STREAMING EXPORTS (accounting / history downloads) ---
+# Rows come off a server-side cursor (yield_per) and are written out one batch at a time,
+# so memory stays flat however many rows the tenant has. The generator owns its own
+# session; StreamingResponse drives it from the threadpool.
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"csv", "ndjson"}
+
+SALES_COLUMNS = [
+    SalesLedger.id, SalesLedger.transaction_id, SalesLedger.timestamp, SalesLedger.item_description,
+    SalesLedger.amount, SalesLedger.customer_name, SalesLedger.status, SalesLedger.logged_by,
+]
+CHAT_COLUMNS = [
+    ChatLog.id, ChatLog.conversation_id, ChatLog.timestamp, ChatLog.sender,
+    ChatLog.message_text, ChatLog.media_url,
+]
+
+def sales_export_query(user_id: int):
+    return select(*SALES_COLUMNS).where(SalesLedger.user_id == user_id).order_by(SalesLedger.id)
+
+def chat_export_query(user_id: int):
+    return select(*CHAT_COLUMNS).where(ChatLog.user_id == user_id).order_by(ChatLog.timestamp, ChatLog.id)
+
+def _iter_batches(statement):
+    with Session(engine) as session:
+        result = session.exec(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for batch in result.partitions():
+            yield batch
+
+def _csv_chunks(columns: list, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.key for c in columns])
+    for batch in batches:
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in batch
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _ndjson_chunks(columns: list, batches):
+    keys = [c.key for c in columns]
+    for batch in batches:
+        yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in batch)
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31) # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(statement, columns: list, fmt: str, filename: str, gzip: bool = False,
+                  archived_batches=None) -> StreamingResponse:
+    """
+    Streams `statement` as CSV or NDJSON (optionally gzipped) as a file download.
+    `archived_batches` (lists of dicts keyed like `columns`) are emitted first, e.g. rows
+    already moved out of the hot table by app.retention.
+    """
+    batches = _iter_batches(statement)
+    if archived_batches is not None:
+        keys = [c.key for c in columns]
+        archived = ([tuple(record.get(k) for k in keys) for record in batch] for batch in archived_batches)
+        batches = itertools.chain(archived, batches)
+
+    if fmt == "csv":
+        chunks, media_type = _csv_chunks(columns, batches), "text/csv"
+    else:
+        chunks, media_type = _ndjson_chunks(columns, batches), "application/x-ndjson"
+    filename = f"{filename}.{fmt}"
+    if gzip:
+        chunks, media_type, filename = _gzipped(chunks), "application/gzip", f"{filename}.gz"
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
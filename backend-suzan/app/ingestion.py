@@ -0,0 +1,255 @@
+import time
+from datetime import datetime
+from sqlalchemy import update
+from sqlmodel import Session, select, delete
+
+from .db import engine
+from .jobs import claim_job, claimable
+from .models import UploadedFile, DocumentChunk
+from .rag_engine import (
+    text_splitter,
+    INGEST_FLUSH_SIZE,
+    iter_pdf_pages,
+    count_pdf_pages,
+    content_hash,
+    chunk_vector_id,
+    embed_and_upsert,
+    copy_vectors,
+    delete_vectors,
+)
+from .retrieval import invalidate_lexical_index
+from .config import settings
+
+# --- BACKGROUND PDF INGESTION JOBS ---
+# The upload endpoint only stores the file and queues a job; the job state lives on
+# the UploadedFile row so clients can poll GET /files/{id}/status and an interrupted
+# job resumes from its last checkpoint instead of starting over. Runs claim the row first
+# (app/jobs.py), so a file queued twice is still indexed once.
+#
+# Every run diffs the PDF against the file's DocumentChunk manifest: unchanged pages are
+# skipped by page hash, and only chunks whose content hash isn't indexed yet get embedded.
+# A first upload is simply a diff against an empty manifest, and a re-upload of an edited
+# catalog costs embeddings proportional to the edit.
+#
+# A first upload whose content (UploadedFile.sha256) is already indexed for another file,
+# from any tenant, copies that file's manifest and vectors instead of embedding anything.
+#
+# Replaced manifest rows aren't deleted at a checkpoint; they move to page RETIRED_PAGE in
+# the same commit. Their vectors are deleted at the end of the run (unless the new content
+# still uses them), so a run that resumes after a crash still knows what to clean up.
+
+UNFINISHED_STATUSES = ("PENDING", "PROCESSING")
+RETIRED_PAGE = -1
+
+def _load_manifest(session: Session, file_id: int) -> dict:
+    """page_number -> (page_hash, [vector_id, ...]) for what is currently indexed (retired rows included)."""
+    pages = {}
+    rows = session.exec(
+        select(DocumentChunk.page_number, DocumentChunk.page_hash, DocumentChunk.vector_id)
+        .where(DocumentChunk.file_id == file_id)
+    ).all()
+    for page_number, page_hash, vector_id in rows:
+        pages.setdefault(page_number, (page_hash, []))[1].append(vector_id)
+    return pages
+
+def _index_file(session: Session, record: UploadedFile):
+    file_id = record.id
+    metadata = {"file_id": file_id, "user_id": record.user_id, "source": "pdf_upload"}
+
+    manifest = _load_manifest(session, file_id)
+    indexed_ids = {vid for _, vids in manifest.values() for vid in vids} # retired ones still exist too
+
+    buffer = [] # (vector_id, text, metadata) waiting to be embedded
+    queued_ids = set()
+    pending_pages = [] # (page_number, [DocumentChunk, ...]) waiting for the buffer to be flushed
+    embed_seconds = 0.0
+
+    def flush(pages_done: int):
+        nonlocal buffer, pending_pages, embed_seconds
+        start = time.perf_counter()
+        embedded = embed_and_upsert(buffer)
+        embed_seconds += time.perf_counter() - start
+        indexed_ids.update(queued_ids)
+        queued_ids.clear()
+
+        # Manifest rows are only swapped once their vectors exist, so this is the checkpoint
+        for page_number, rows in pending_pages:
+            _retire_pages(session, file_id, DocumentChunk.page_number == page_number)
+            session.add_all(rows)
+
+        record.pages_done = pages_done
+        record.chunks_embedded += embedded
+        record.heartbeat_at = datetime.utcnow()
+        session.add(record)
+        session.commit()
+        buffer, pending_pages = [], []
+
+    page_number = record.pages_done - 1
+    for page_number, text in iter_pdf_pages(record.filepath, record.pages_done):
+        page_hash = content_hash(text)
+        old_hash, _ = manifest.get(page_number, (None, []))
+        if old_hash == page_hash:
+            continue
+
+        rows = []
+        for chunk in text_splitter.split_text(text):
+            chunk_hash = content_hash(chunk)
+            vector_id = chunk_vector_id(file_id, chunk_hash)
+            rows.append(DocumentChunk(
+                file_id=file_id,
+                page_number=page_number,
+                page_hash=page_hash,
+                chunk_hash=chunk_hash,
+                vector_id=vector_id,
+                content=chunk,
+            ))
+            # Chunks that merely moved between pages are already in the vector store
+            if vector_id not in indexed_ids and vector_id not in queued_ids:
+                buffer.append((vector_id, chunk, metadata))
+                queued_ids.add(vector_id)
+
+        pending_pages.append((page_number, rows))
+
+        if len(buffer) >= INGEST_FLUSH_SIZE:
+            flush(page_number + 1)
+
+    flush(page_number + 1)
+
+    if record.chunks_embedded and embed_seconds:
+        workers = max(1, settings.INGEST_WORKERS)
+        rate = record.chunks_embedded / embed_seconds
+        print(f"⚙️ File {file_id}: {rate:.1f} chunks/s embed+upsert on {workers} worker(s) ({rate / workers:.1f} per core)")
+
+    # Pages past the end of the new document vanished entirely
+    _retire_pages(session, file_id, DocumentChunk.page_number >= record.pages_total)
+    session.commit()
+
+    # A retired vector is only dropped if no page references its content anymore
+    retired_ids, live_ids = set(), set()
+    for page_number, vector_id in session.exec(
+        select(DocumentChunk.page_number, DocumentChunk.vector_id).where(DocumentChunk.file_id == file_id)
+    ).all():
+        (retired_ids if page_number == RETIRED_PAGE else live_ids).add(vector_id)
+    record.chunks_deleted += delete_vectors(retired_ids - live_ids)
+    record.chunks_indexed = len(live_ids)
+    session.exec(delete(DocumentChunk).where(DocumentChunk.file_id == file_id, DocumentChunk.page_number == RETIRED_PAGE))
+
+def _retire_pages(session: Session, file_id: int, pages_clause):
+    session.exec(
+        update(DocumentChunk)
+        .where(DocumentChunk.file_id == file_id, DocumentChunk.page_number != RETIRED_PAGE, pages_clause)
+        .values(page_number=RETIRED_PAGE)
+    )
+
+def _indexed_copy(session: Session, record: UploadedFile):
+    """Another fully indexed file with the same content, if any."""
+    if not record.sha256:
+        return None
+    return session.exec(
+        select(UploadedFile).where(
+            UploadedFile.sha256 == record.sha256,
+            UploadedFile.status == "COMPLETED",
+            UploadedFile.id != record.id,
+        ).limit(1)
+    ).first()
+
+def _clone_index(session: Session, record: UploadedFile, donor: UploadedFile) -> bool:
+    """Copies donor's chunks and vectors to `record`. False (nothing written) if it can't."""
+    if session.exec(select(DocumentChunk.id).where(DocumentChunk.file_id == record.id).limit(1)).first():
+        return False # already has a manifest: the normal diff is cheaper
+    rows = session.exec(select(DocumentChunk).where(DocumentChunk.file_id == donor.id)).all()
+    if not rows:
+        return False
+
+    pairs = {}
+    for row in rows:
+        pairs.setdefault(chunk_vector_id(record.id, row.chunk_hash), row.vector_id)
+    metadata = {"file_id": record.id, "user_id": record.user_id, "source": "pdf_upload"}
+    if copy_vectors([(source, target) for target, source in pairs.items()], metadata) < len(pairs):
+        return False # donor vectors incomplete; re-indexing overwrites whatever was copied
+
+    session.add_all(
+        DocumentChunk(
+            file_id=record.id, page_number=row.page_number, page_hash=row.page_hash,
+            chunk_hash=row.chunk_hash, vector_id=chunk_vector_id(record.id, row.chunk_hash), content=row.content,
+        )
+        for row in rows
+    )
+    record.chunks_indexed = len(pairs)
+    print(f"♻️ File {record.id}: same content as file {donor.id}, copied {len(pairs)} vectors instead of embedding.")
+    return True
+
+def run_ingestion_job(file_id: int):
+    """
+    Streams a PDF into the vector store, checkpointing progress on the UploadedFile row.
+    Sync on purpose: FastAPI runs sync background tasks in its threadpool.
+    """
+    with Session(engine) as session:
+        if not claim_job(session, UploadedFile, file_id):
+            return # finished, missing, or another run has it
+        record = session.get(UploadedFile, file_id)
+
+        try:
+            record.error = None
+            record.pages_total = count_pdf_pages(record.filepath)
+            session.add(record)
+            session.commit()
+
+            donor = _indexed_copy(session, record)
+            if not (donor and _clone_index(session, record, donor)):
+                _index_file(session, record)
+
+            record.status = "COMPLETED"
+            record.pages_done = record.pages_total
+            invalidate_lexical_index(record.user_id)
+            print(f"✅ Indexed file {file_id}: {record.chunks_embedded} embedded, {record.chunks_deleted} deleted, {record.chunks_indexed} total.")
+        except Exception as e:
+            print(f"❌ Ingestion failed for file {file_id}: {e}")
+            session.rollback()
+            record.status = "FAILED"
+            record.error = str(e)
+
+        session.add(record)
+        session.commit()
+
+def reset_for_reindex(record: UploadedFile, filename: str, filepath: str, sha256: str = None, size_bytes: int = None):
+    """Points an existing file at new content and re-queues it; the job diffs against the manifest."""
+    record.filename = filename
+    record.filepath = filepath
+    record.sha256 = sha256
+    record.size_bytes = size_bytes
+    record.status = "PENDING"
+    record.pages_done = 0
+    record.chunks_embedded = 0
+    record.chunks_deleted = 0
+    record.error = None
+
+def resume_ingestion_jobs() -> int:
+    """
+    Runs jobs that are still queued or whose run died (e.g. in a deploy), from their checkpoint.
+    Called at startup and by the scheduler. Returns how many it looked at.
+    """
+    with Session(engine) as session:
+        file_ids = session.exec(
+            select(UploadedFile.id).where(claimable(UploadedFile, datetime.utcnow()))
+        ).all()
+
+    for file_id in file_ids:
+        print(f"🔁 Resuming ingestion for file {file_id}")
+        run_ingestion_job(file_id)
+    return len(file_ids)
+
+def ingestion_status(record: UploadedFile) -> dict:
+    progress = (record.pages_done / record.pages_total) if record.pages_total else 0.0
+    return {
+        "id": record.id,
+        "filename": record.filename,
+        "status": record.status,
+        "pages_done": record.pages_done,
+        "pages_total": record.pages_total,
+        "chunks_indexed": record.chunks_indexed,
+        "chunks_embedded": record.chunks_embedded,
+        "chunks_deleted": record.chunks_deleted,
+        "progress": round(progress, 4),
+        "error": record.error,
+    }
@@ -0,0 +1,160 @@
+import csv
+import io
+import re
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+
+from .models import InventoryItem
+from .search import refresh_search_index
+from .stock_alerts import check_low_stock
+
+# --- BULK INVENTORY IMPORT (CSV / XLSX) ---
+# Rows are parsed lazily from the upload, validated one by one, and upserted in batches of
+# IMPORT_BATCH_SIZE with a multi-row INSERT ... ON CONFLICT (user_id, name) DO UPDATE.
+# Invalid rows are skipped and reported with their spreadsheet row number; valid rows are
+# imported. The search index is refreshed once at the end instead of per row.
+
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ROWS = 50_000
+
+# Accepted header spellings -> InventoryItem field
+HEADER_ALIASES = {
+    "name": "name", "product": "name", "item": "name", "product name": "name",
+    "price": "price", "unit price": "price",
+    "stock": "stock", "quantity": "stock", "qty": "stock",
+    "description": "description", "details": "description",
+}
+PRICE_NOISE_RE = re.compile(r"[^\d.\-]") # currency symbols, thousands separators, spaces
+
+class ImportFormatError(ValueError):
+    pass
+
+# --- PARSING ---
+
+def _normalize_header(header: list) -> list:
+    fields = [HEADER_ALIASES.get(str(h or "").strip().lower()) for h in header]
+    if "name" not in fields or "price" not in fields:
+        raise ImportFormatError("Header must include 'name' and 'price' columns (optional: 'stock', 'description').")
+    return fields
+
+def _records(rows):
+    """Yields (row_number, {field: value}) from an iterator of raw rows whose first row is the header."""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError("The file is empty.")
+    fields = _normalize_header(header)
+    for row_number, row in enumerate(rows, start=2):
+        if not any(v not in (None, "") for v in row):
+            continue # blank line
+        yield row_number, {f: v for f, v in zip(fields, row) if f}
+
+def iter_csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        yield from _records(csv.reader(text))
+    finally:
+        text.detach() # leave the upload's file open for its owner
+
+def iter_xlsx_rows(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("XLSX import needs openpyxl installed; upload a CSV instead.")
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as e: # not a zip, missing parts, bad XML: openpyxl raises all sorts
+        raise ImportFormatError(f"Couldn't read the .xlsx file ({type(e).__name__}). Re-save it from Excel or upload a CSV.")
+    try:
+        yield from _records(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+def iter_import_rows(filename: str, fileobj):
+    if filename.lower().endswith(".csv"):
+        return iter_csv_rows(fileobj)
+    if filename.lower().endswith(".xlsx"):
+        return iter_xlsx_rows(fileobj)
+    raise ImportFormatError("Unsupported file type. Upload a .csv or .xlsx file.")
+
+# --- VALIDATION ---
+
+def validate_row(record: dict) -> dict:
+    """Returns InventoryItem values for one row, or raises ValueError with a readable reason."""
+    name = str(record.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+
+    raw_price = record.get("price")
+    try:
+        price = float(raw_price) if isinstance(raw_price, (int, float)) else float(PRICE_NOISE_RE.sub("", str(raw_price or "")))
+    except ValueError:
+        raise ValueError(f"price '{raw_price}' is not a number")
+    if price < 0:
+        raise ValueError("price cannot be negative")
+
+    raw_stock = record.get("stock")
+    if raw_stock in (None, ""):
+        stock = 0
+    else:
+        try:
+            stock_value = float(str(raw_stock).replace(",", ""))
+        except ValueError:
+            raise ValueError(f"stock '{raw_stock}' is not a number")
+        if not stock_value.is_integer() or stock_value < 0:
+            raise ValueError(f"stock '{raw_stock}' must be a whole number >= 0")
+        stock = int(stock_value)
+
+    description = str(record.get("description") or "").strip() or None
+    return {"name": name, "price": price, "stock": stock, "description": description}
+
+# --- UPSERT ---
+
+def _upsert_batch(session: Session, user_id: int, batch: dict) -> list:
+    """Upserts one batch; returns the ids of the rows written."""
+    insert = postgresql.insert if session.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(InventoryItem).values([{"user_id": user_id, **values} for values in batch.values()])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "name"],
+        set_={
+            "price": stmt.excluded.price,
+            "stock": stmt.excluded.stock,
+            "description": func.coalesce(stmt.excluded.description, InventoryItem.description),
+        },
+    )
+    return session.exec(stmt.returning(InventoryItem.id)).scalars().all()
+
+def import_inventory(session: Session, user_id: int, rows) -> dict:
+    """
+    Validates and upserts (row_number, record) pairs for one tenant; commits per batch.
+    Returns {"imported": n, "errors": [{"row": n, "error": "..."}]}.
+    """
+    imported, errors = set(), [] # names upserted: a name repeated in the file is one product
+    batch = {} # name -> values; a later row for the same name wins (one conflict per name per statement)
+
+    for row_number, record in rows:
+        if row_number - 1 > MAX_IMPORT_ROWS:
+            errors.append({"row": row_number, "error": f"Import stopped: more than {MAX_IMPORT_ROWS} rows"})
+            break
+        try:
+            values = validate_row(record)
+        except ValueError as e:
+            errors.append({"row": row_number, "error": str(e)})
+            continue
+
+        imported.add(values["name"])
+        batch[values["name"]] = values
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            check_low_stock(session, _upsert_batch(session, user_id, batch))
+            session.commit()
+            batch = {}
+
+    if batch:
+        check_low_stock(session, _upsert_batch(session, user_id, batch))
+        session.commit()
+
+    refresh_search_index(session)
+    print(f"📥 Inventory import for user {user_id}: {len(imported)} products upserted, {len(errors)} rows rejected")
+    return {"imported": len(imported), "errors": errors}
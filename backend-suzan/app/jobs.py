@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session
+
+# --- CLAIMING BACKGROUND JOBS ---
+# PDF ingestion (UploadedFile) and account deletion (AccountDeletionJob) rows double as job
+# records. A run starts with a conditional UPDATE to PROCESSING, so when the same job is
+# queued twice (a background task plus the startup / scheduler sweep, or several workers)
+# only one run proceeds. A run bumps heartbeat_at at every checkpoint; a PROCESSING job
+# whose heartbeat is older than STALE_CLAIM lost its process and may be claimed again.
+
+STALE_CLAIM = timedelta(minutes=10)
+
+def claimable(model, now: datetime):
+    """Jobs a sweep should pick up: queued, or PROCESSING without a recent heartbeat."""
+    return or_(
+        model.status == "PENDING",
+        and_(
+            model.status == "PROCESSING",
+            or_(model.heartbeat_at == None, model.heartbeat_at <= now - STALE_CLAIM), # noqa: E711
+        ),
+    )
+
+def claim_job(session: Session, model, job_id: int) -> bool:
+    """Marks the job PROCESSING unless it is finished or another run holds it. Commits."""
+    now = datetime.utcnow()
+    result = session.exec(
+        update(model)
+        .where(model.id == job_id, or_(claimable(model, now), model.status == "FAILED"))
+        .values(status="PROCESSING", heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
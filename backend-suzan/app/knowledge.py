@@ -0,0 +1,48 @@
+from datetime import datetime
+from sqlalchemy import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .dashboard import touch_dashboard
+from .models import BusinessInfo
+from .metrics import timed
+from .rag_engine import embed_texts, index_business_rows
+from .retrieval import business_row_text
+
+# --- BULK KNOWLEDGE SAVING ("Teach Suzan" text & voice) ---
+
+async def save_business_facts(session: AsyncSession, user_id: int, facts: list) -> int:
+    """
+    Saves extracted facts in bulk: one embedding batch, one multi-row INSERT ... RETURNING
+    for the SQL rows, then one upsert for the vectors.
+    Embedding comes first because it doesn't need the ids and is the slow part: the INSERT's
+    transaction (on SQLite, the database write lock) stays open only for the upsert.
+    The caller commits, so a failed vector upsert leaves no SQL rows behind.
+    """
+    if not facts:
+        return 0
+
+    texts = [business_row_text(fact.category, fact.topic, fact.details) for fact in facts]
+    with timed("embed"):
+        vectors = await run_in_threadpool(embed_texts, texts)
+
+    now = datetime.utcnow()
+    values = [
+        {
+            "user_id": user_id,
+            "category": fact.category,
+            "topic": fact.topic,
+            "details": fact.details,
+            "created_at": now,
+        }
+        for fact in facts
+    ]
+    result = await session.execute(
+        insert(BusinessInfo).returning(BusinessInfo.id, sort_by_parameter_order=True),
+        values,
+    )
+    row_ids = result.scalars().all()
+    touch_dashboard(session, user_id)
+
+    await index_business_rows(list(zip(row_ids, texts)), user_id, vectors)
+    return len(row_ids)
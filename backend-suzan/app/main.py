@@ -1,24 +1,42 @@
 from fastapi import FastAPI, Request, UploadFile, File, HTTPException, Depends, Query, BackgroundTasks, Form
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select, or_  # <--- FIXED: Added or_
-from uuid import uuid4
+from sqlmodel import Session, select, delete
+from datetime import datetime
 import os
-import shutil
+import asyncio
 from better_profanity import profanity
 import sentry_sdk
 import requests
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel # <--- FIXED: Added BaseModel
 
 from .config import settings
-from .db import engine, init_db
-from .models import ChatLog, SalesLedger, UploadedFile, User, Alert, InventoryItem, BusinessInfo
-from .whatsapp import send_whatsapp
-from .rag_engine import answer_from_rag, process_document, delete_document_vectors, index_business_row
-from .utils import save_upload_file
-from .agents import run_admin_agent, analyze_sentiment, extract_business_info, transcribe_audio
+from .db import engine, init_db, AsyncSessionLocal, async_engine
+from .models import SalesLedger, UploadedFile, User, Alert, InventoryItem, BusinessInfo, DocumentChunk, AccountDeletionJob
+from .whatsapp import send_whatsapp, whatsapp_number
+from .rag_engine import answer_from_rag, delete_document_vectors, delete_business_row_vectors
+from .knowledge import save_business_facts
+from .retrieval import invalidate_lexical_index
+from .embedding_workers import shutdown_embedding_pool
+from .ingestion import run_ingestion_job, resume_ingestion_jobs, ingestion_status, reset_for_reindex, UNFINISHED_STATUSES
+from .account_deletion import queue_account_deletion, run_account_deletion_job, resume_account_deletions, deletion_status
+from .storage import store_upload, release_blob, UploadTooLarge
+from .voice import save_audio_upload, transcribe_file, remove_quietly
+from .media import fetch_media, close_media_client, graph_media_url
+from .agents import run_admin_agent, analyze_sentiment, extract_business_info
 from .auth import router as auth_router
-from .tools import submit_order_request
+from .stock_alerts import check_low_stock
+from .dashboard import get_dashboard_summary, touch_dashboard
+from .orders import place_quoted_order, confirm_order, cancel_order
+from .scheduler import run_scheduler
+from .chat_logger import chat_logger
+from .metrics import timed, request_timer, timed_message, set_tenant, render_metrics
+from .tenants import Tenant, resolve_tenant, resolve_tenant_async, get_tenant_async, invalidate_tenant
+from .pagination import fetch_page, page_response, NEXT_CURSOR_HEADER
+from .inventory_import import iter_import_rows, import_inventory, ImportFormatError
+from .retention import iter_archived_chats
+from .exports import stream_export, sales_export_query, chat_export_query, SALES_COLUMNS, CHAT_COLUMNS, EXPORT_FORMATS
 
 # Initialize profanity filter
 profanity.load_censor_words()
@@ -61,15 +79,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER], # Keyset pagination cursor on list endpoints
 )
 
+if settings.SLOW_REQUEST_MS is not None:
+    @app.middleware("http")
+    async def log_slow_requests(request: Request, call_next):
+        # Prints a per-stage breakdown of requests slower than SLOW_REQUEST_MS (see app/metrics.py)
+        with request_timer(f"{request.method} {request.url.path}"):
+            return await call_next(request)
+
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 
 init_db()
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    # Pick up PDF ingestion jobs that were queued or interrupted before the restart
+    asyncio.create_task(run_in_threadpool(resume_ingestion_jobs))
+    asyncio.create_task(run_in_threadpool(resume_account_deletions))
+    # Periodic jobs: order expiry, daily digests, chat retention, media cache pruning
+    if settings.SCHEDULER_ENABLED:
+        asyncio.create_task(run_scheduler())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await chat_logger.stop() # Write out buffered chat logs before the engine goes away
+    shutdown_embedding_pool()
+    await close_media_client()
+    await async_engine.dispose()
 
 # --- Helpers for Interactive Messages ---
 
@@ -83,7 +122,7 @@ def send_interactive_list(to: str, header: str, body: str, sections: list):
     payload = {
         "messaging_product": "whatsapp",
         "recipient_type": "individual",
-        "to": to,
+        "to": whatsapp_number(to),
         "type": "interactive",
         "interactive": {
             "type": "list",
@@ -92,7 +131,8 @@ def send_interactive_list(to: str, header: str, body: str, sections: list):
             "action": {"button": "Menu", "sections": sections}
         }
     }
-    requests.post(url, headers=headers, json=payload)
+    with timed("whatsapp_send"):
+        requests.post(url, headers=headers, json=payload)
 
 def send_interactive_buttons(to: str, body: str, buttons: list):
     """Sends a WhatsApp Interactive Button Message."""
@@ -105,7 +145,7 @@ def send_interactive_buttons(to: str, body: str, buttons: list):
     payload = {
         "messaging_product": "whatsapp",
         "recipient_type": "individual",
-        "to": to,
+        "to": whatsapp_number(to),
         "type": "interactive",
         "interactive": {
             "type": "button",
@@ -113,29 +153,36 @@ def send_interactive_buttons(to: str, body: str, buttons: list):
             "action": {"buttons": formatted_buttons}
         }
     }
-    requests.post(url, headers=headers, json=payload)
+    with timed("whatsapp_send"):
+        requests.post(url, headers=headers, json=payload)
+
 
+# --- Monitoring ---
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms and LLM token counters."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 # --- Configuration Endpoints ---
 @app.get("/config/bot-number")
 def get_bot_number(phone: str = Query(...)):
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == phone)).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return {"botNumber": user.bot_phone_number}
+    user = resolve_tenant(phone)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"botNumber": user.bot_phone_number}
 
 @app.get("/config")
 def get_config(phone: str = Query(None)):
-    with Session(engine) as session:
-        if phone:
-            user = session.exec(select(User).where(User.phone_number == phone)).first()
-        else:
+    if phone:
+        user = resolve_tenant(phone)
+    else:
+        with Session(engine) as session:
             user = session.exec(select(User)).first()
 
-        if user:
-            return {"name": user.bot_name, "status": "active"}
-        return {"name": "Suzan", "status": "active"}
+    if user:
+        return {"name": user.bot_name, "status": "active"}
+    return {"name": "Suzan", "status": "active"}
 
 @app.post("/config/name")
 def update_assistant_name(data: dict):
@@ -146,83 +193,163 @@ def update_assistant_name(data: dict):
          raise HTTPException(status_code=400, detail="Name contains inappropriate language")
 
     with Session(engine) as session:
-        query = select(User)
         if phone:
-            query = query.where(User.phone_number == phone)
-        user = session.exec(query).first()
+            tenant = resolve_tenant(phone)
+            user = session.get(User, tenant.id) if tenant else None
+        else:
+            user = session.exec(select(User)).first()
 
         if user:
             user.bot_name = new_name
             session.add(user)
             session.commit()
+            invalidate_tenant(user.id)
             return {"name": user.bot_name}
     return {"name": new_name}
 
-@app.post("/config/status")
-def update_status(data: dict):
-    new_status = data.get("status")
-    # For now we just return it, you can add DB logic if needed to persist status
-    return {"status": new_status}
+@app.get("/config/digest")
+def get_digest_settings(phone: str = Query(...)):
+    with Session(engine) as session:
+        tenant = resolve_tenant(phone)
+        user = session.get(User, tenant.id) if tenant else None
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return {"enabled": user.digest_enabled, "time": user.digest_time.strftime("%H:%M")}
 
-@app.delete("/config/account")
-async def delete_account(phone: str = Query(...)):
+@app.post("/config/digest")
+def update_digest_settings(data: dict):
+    """Opts the owner in/out of the daily WhatsApp digest. Body: {phone, enabled, time: "HH:MM"}."""
     with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == phone)).first()
+        tenant = resolve_tenant(data.get("phone"))
+        user = session.get(User, tenant.id) if tenant else None
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        files = session.exec(select(UploadedFile).where(UploadedFile.user_id == user.id)).all()
-        for f in files:
+        if "time" in data:
             try:
-                await delete_document_vectors(f.id)
-                if os.path.exists(f.filepath):
-                    os.remove(f.filepath)
-            except Exception as e:
-                print(f"Error cleaning up file {f.id}: {e}")
-
-        for model in [SalesLedger, InventoryItem, ChatLog, Alert, UploadedFile, BusinessInfo]:
-            stmt = select(model).where(model.user_id == user.id)
-            results = session.exec(stmt).all()
-            for r in results:
-                session.delete(r)
-
-        session.delete(user)
+                user.digest_time = datetime.strptime(str(data["time"]), "%H:%M").time()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="time must be HH:MM")
+        if "enabled" in data:
+            user.digest_enabled = bool(data["enabled"])
+        session.add(user)
         session.commit()
+        return {"enabled": user.digest_enabled, "time": user.digest_time.strftime("%H:%M")}
+
+@app.post("/config/status")
+def update_status(data: dict):
+    new_status = data.get("status")
+    # For now we just return it, you can add DB logic if needed to persist status
+    return {"status": new_status}
 
-        return {"message": "Account permanently deleted"}
+@app.delete("/config/account", status_code=202)
+async def delete_account(background_tasks: BackgroundTasks, phone: str = Query(...)):
+    """
+    Queues permanent deletion of the account and everything it owns.
+    Returns immediately; poll /config/account/deletion/{job_id} for progress.
+    """
+    user = await resolve_tenant_async(phone)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), phone: str = Query(...)):
+    job = await run_in_threadpool(queue_account_deletion, user.id)
+    background_tasks.add_task(run_account_deletion_job, job.id)
+    return {"message": "Account deletion started", "job_id": job.id, "status": job.status}
+
+@app.get("/config/account/deletion/{job_id}")
+def get_account_deletion_status(job_id: int):
+    with Session(engine) as session:
+        job = session.get(AccountDeletionJob, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Deletion job not found")
+        return deletion_status(job)
+
+@app.post("/upload", status_code=202)
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...), phone: str = Query(...)):
+    """
+    Stores the PDF and queues ingestion. Returns immediately; poll /files/{id}/status for progress.
+    Content already indexed for another file is copied instead of re-embedded.
+    """
     try:
-        file_path = save_upload_file(file)
-        with Session(engine) as session:
-            user = session.exec(select(User).where(User.phone_number == phone)).first()
-            if not user:
-                 raise HTTPException(status_code=404, detail="User not found")
+        user = await resolve_tenant_async(phone)
+        if not user:
+             raise HTTPException(status_code=404, detail="User not found")
 
-            db_file = UploadedFile(filename=file.filename, filepath=file_path, user_id=user.id)
+        try:
+            stored = await store_upload(file)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        async with AsyncSessionLocal() as session:
+            db_file = UploadedFile(
+                filename=file.filename, filepath=stored.path, sha256=stored.sha256, size_bytes=stored.size,
+                user_id=user.id, status="PENDING",
+            )
             session.add(db_file)
-            session.commit()
-            session.refresh(db_file)
+            await session.commit()
+            await session.refresh(db_file)
 
-            await process_document(file_path, file_id=db_file.id)
-
-        return {"message": "File uploaded", "id": db_file.id, "filename": db_file.filename}
+        background_tasks.add_task(run_ingestion_job, db_file.id)
+        return {"message": "File uploaded", "id": db_file.id, "filename": db_file.filename, "status": db_file.status}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/files")
-def list_files(phone: str = Query(...)):
+def list_files(phone: str = Query(...), after_id: int = Query(None), limit: int = Query(None)):
+    user = resolve_tenant(phone)
+    if not user: return []
     with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == phone)).first()
-        if not user: return []
-        files = session.exec(select(UploadedFile).where(UploadedFile.user_id == user.id)).all()
-        return files
+        columns = [
+            UploadedFile.id, UploadedFile.filename, UploadedFile.filepath, UploadedFile.created_at,
+            UploadedFile.status, UploadedFile.pages_total, UploadedFile.pages_done, UploadedFile.chunks_indexed,
+            UploadedFile.chunks_embedded, UploadedFile.chunks_deleted, UploadedFile.error, UploadedFile.user_id,
+        ]
+        rows, next_after_id = fetch_page(session, UploadedFile, columns, user.id, after_id, limit)
+    return page_response(rows, next_after_id)
 
-@app.delete("/files/{file_id}")
-async def delete_file(file_id: int):
+@app.get("/files/{file_id}/status")
+def get_file_status(file_id: int):
     with Session(engine) as session:
         file_record = session.get(UploadedFile, file_id)
+        if not file_record:
+            raise HTTPException(status_code=404, detail="File not found")
+        return ingestion_status(file_record)
+
+@app.put("/files/{file_id}", status_code=202)
+async def replace_file(file_id: int, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """
+    Replaces a file's content (e.g. an updated catalog). Only new or changed chunks
+    are embedded; chunks that no longer appear are removed from the vector store.
+    """
+    async with AsyncSessionLocal() as session:
+        file_record = await session.get(UploadedFile, file_id)
+        if not file_record:
+            raise HTTPException(status_code=404, detail="File not found")
+        if file_record.status in UNFINISHED_STATUSES: # its queued job would run next to ours
+            raise HTTPException(status_code=409, detail="File is still being indexed")
+
+        try:
+            stored = await store_upload(file)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        old_path = file_record.filepath
+        reset_for_reindex(file_record, file.filename, stored.path, stored.sha256, stored.size)
+        session.add(file_record)
+        await session.commit()
+
+    if old_path != stored.path:
+        await run_in_threadpool(release_blob, old_path) # unless another file shares it
+
+    background_tasks.add_task(run_ingestion_job, file_id)
+    return {"message": "File queued for re-indexing", "id": file_id, "status": "PENDING"}
+
+@app.delete("/files/{file_id}")
+async def delete_file(file_id: int):
+    async with AsyncSessionLocal() as session:
+        file_record = await session.get(UploadedFile, file_id)
         if not file_record:
             raise HTTPException(status_code=404, detail="File not found")
 
@@ -231,21 +358,26 @@ async def delete_file(file_id: int):
         except Exception as e:
             print(f"Error deleting vectors: {e}")
 
-        if os.path.exists(file_record.filepath):
-            os.remove(file_record.filepath)
-
-        session.delete(file_record)
-        session.commit()
-        return {"message": "Deleted"}
+        path = file_record.filepath
+        await session.exec(delete(DocumentChunk).where(DocumentChunk.file_id == file_id))
+        await session.delete(file_record)
+        await session.commit()
+        invalidate_lexical_index(file_record.user_id)
+    await run_in_threadpool(release_blob, path) # unless another file shares it
+    return {"message": "Deleted"}
 
 @app.get("/inventory")
-def get_inventory(phone: str = Query(...)):
+def get_inventory(phone: str = Query(...), after_id: int = Query(None), limit: int = Query(None)):
     with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == phone)).first()
+        user = resolve_tenant(phone)
         if not user:
              return []
-        items = session.exec(select(InventoryItem).where(InventoryItem.user_id == user.id)).all()
-        return items
+        columns = [
+            InventoryItem.id, InventoryItem.name, InventoryItem.price, InventoryItem.stock,
+            InventoryItem.description, InventoryItem.user_id,
+        ]
+        rows, next_after_id = fetch_page(session, InventoryItem, columns, user.id, after_id, limit)
+    return page_response(rows, next_after_id)
 
 @app.post("/inventory")
 def add_inventory(data: dict):
@@ -253,44 +385,129 @@ def add_inventory(data: dict):
     name = data.get("name")
     price = data.get("price")
     stock = data.get("stock", 0)
+    threshold = data.get("low_stock_threshold")
 
     with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == phone)).first()
+        user = resolve_tenant(phone)
         if not user:
              raise HTTPException(status_code=404, detail="User not found")
 
+        existing = session.exec(select(InventoryItem).where(InventoryItem.user_id == user.id, InventoryItem.name == name)).first()
+        if existing:
+            raise HTTPException(status_code=409, detail=f"Product '{name}' already exists")
+
         item = InventoryItem(user_id=user.id, name=name, price=price, stock=stock)
+        if threshold is not None: item.low_stock_threshold = threshold
         session.add(item)
+        session.flush()
+        check_low_stock(session, [item.id])
         session.commit()
         session.refresh(item)
         return item
 
+@app.post("/inventory/import")
+def import_inventory_file(file: UploadFile = File(...), phone: str = Form(...)):
+    """
+    Bulk-creates/updates products from a CSV or XLSX sheet (columns: name, price, stock, description).
+    Existing products (same name) are updated. Returns a per-row error report for rejected rows.
+    """
+    with Session(engine) as session:
+        user = resolve_tenant(phone)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        try:
+            return import_inventory(session, user.id, iter_import_rows(file.filename or "", file.file))
+        except ImportFormatError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/sales")
-def get_sales(phone: str = Query(...)):
+def get_sales(phone: str = Query(...), after_id: int = Query(None), limit: int = Query(None)):
     with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == phone)).first()
+        user = resolve_tenant(phone)
         if not user:
              return []
 
-        sales = session.exec(select(SalesLedger).where(SalesLedger.user_id == user.id).order_by(SalesLedger.timestamp.desc())).all()
-        return [
-            {
-                "id": s.id,
-                "item": s.item_description,
-                "amount": f"₦{s.amount:,.2f}" if s.amount else "₦0.00",
-                "customer": s.customer_name or "Unknown",
-                "date": s.timestamp.strftime("%Y-%m-%d %H:%M")
-            } for s in sales
-        ]
+        # Newest first (ids follow ledger insert order)
+        columns = [SalesLedger.id, SalesLedger.item_description, SalesLedger.amount, SalesLedger.customer_name, SalesLedger.status, SalesLedger.timestamp]
+        sales, next_after_id = fetch_page(session, SalesLedger, columns, user.id, after_id, limit)
+
+    return page_response([
+        {
+            "id": s["id"],
+            "item": s["item_description"],
+            "amount": f"₦{s['amount']:,.2f}" if s["amount"] else "₦0.00",
+            "customer": s["customer_name"] or "Unknown",
+            "status": s["status"],
+            "date": s["timestamp"].strftime("%Y-%m-%d %H:%M")
+        } for s in sales
+    ], next_after_id)
+
+def _update_order(sale_id: int, phone: str, action) -> dict:
+    user = resolve_tenant(phone)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    with Session(engine) as session:
+        sale = session.get(SalesLedger, sale_id)
+        if not sale or sale.user_id != user.id:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if not action(session, sale):
+            raise HTTPException(status_code=409, detail=f"Order is {sale.status}, not PENDING")
+        session.commit()
+        session.refresh(sale)
+        return {"id": sale.id, "status": sale.status}
+
+@app.post("/sales/{sale_id}/confirm")
+def confirm_sale(sale_id: int, phone: str = Query(...)):
+    """Confirms a pending customer order; its reserved stock stays sold."""
+    return _update_order(sale_id, phone, confirm_order)
+
+@app.post("/sales/{sale_id}/cancel")
+def cancel_sale(sale_id: int, phone: str = Query(...)):
+    """Cancels a pending customer order and puts its reserved stock back."""
+    return _update_order(sale_id, phone, cancel_order)
 
 @app.get("/alerts")
-def get_alerts(phone: str = Query(...)):
+def get_alerts(phone: str = Query(...), after_id: int = Query(None), limit: int = Query(None)):
     with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == phone)).first()
+        user = resolve_tenant(phone)
         if not user:
              return []
-        alerts = session.exec(select(Alert).where(Alert.user_id == user.id).order_by(Alert.created_at.desc())).all()
-        return alerts
+        columns = [Alert.id, Alert.type, Alert.message, Alert.created_at, Alert.is_read, Alert.user_id]
+        rows, next_after_id = fetch_page(session, Alert, columns, user.id, after_id, limit)
+    return page_response(rows, next_after_id)
+
+@app.get("/dashboard/summary")
+def get_dashboard(phone: str = Query(...)):
+    """
+    Revenue (today / last 7 days), pending orders, top items (30 days), low-stock items,
+    unread alerts and knowledge rows in one call. Cached for a few seconds per tenant.
+    """
+    user = resolve_tenant(phone)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return get_dashboard_summary(user.id)
+
+# --- EXPORTS ---
+
+def _export_user(phone: str, fmt: str) -> Tenant:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'. Use csv or ndjson.")
+    user = resolve_tenant(phone)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+@app.get("/export/sales")
+def export_sales(phone: str = Query(...), format: str = Query("csv"), gzip: bool = Query(False)):
+    user = _export_user(phone, format)
+    return stream_export(sales_export_query(user.id), SALES_COLUMNS, format, "sales", gzip)
+
+@app.get("/export/chats")
+def export_chats(phone: str = Query(...), format: str = Query("csv"), gzip: bool = Query(False),
+                 include_archive: bool = Query(True)):
+    user = _export_user(phone, format)
+    archived = iter_archived_chats(user.id) if include_archive else None
+    return stream_export(chat_export_query(user.id), CHAT_COLUMNS, format, "chats", gzip, archived)
 
 # --- KNOWLEDGE ENDPOINTS ---
 
@@ -303,45 +520,25 @@ async def process_knowledge(data: KnowledgeRequest):
     """
     Processes manual text input from the 'Teach Suzan' page.
     """
-    with Session(engine) as session:
-        # Validate User
-        user = session.exec(select(User).where(or_(
-            User.phone_number == data.phone, 
-            User.phone_number == f"+{data.phone.strip('+')}"
-        ))).first()
-        
-        if not user: raise HTTPException(404, "User not found")
+    # Validate User
+    user = await resolve_tenant_async(data.phone)
+    if not user: raise HTTPException(404, "User not found")
 
-        try:
-            # AI Extraction
-            print(f"🧠 Extracting info from text: {data.text[:50]}...")
-            extracted_data = await extract_business_info(data.text)
-            
-            new_rows = []
-            for fact in extracted_data.facts:
-                # 1. Save to SQL
-                row = BusinessInfo(
-                    user_id=user.id,
-                    category=fact.category,
-                    topic=fact.topic,
-                    details=fact.details
-                )
-                session.add(row)
-                session.flush() 
-                
-                # 2. Save to Vector DB
-                row_text = f"{fact.category} - {fact.topic}: {fact.details}"
-                await index_business_row(row_text, row.id, user.id)
-                
-                new_rows.append(row)
-            
-            session.commit()
-            print(f"✅ Saved {len(new_rows)} facts.")
-            return {"message": "Processed", "rows_added": len(new_rows)}
+    try:
+        # AI Extraction (no DB connection is held while the LLM runs)
+        print(f"🧠 Extracting info from text: {data.text[:50]}...")
+        extracted_data = await extract_business_info(data.text)
 
-        except Exception as e:
-            print(f"❌ Knowledge Process Error: {e}")
-            raise HTTPException(500, detail=f"AI Extraction Failed: {str(e)}")
+        # Save to SQL & Vector DB in bulk
+        async with AsyncSessionLocal() as session:
+            rows_added = await save_business_facts(session, user.id, extracted_data.facts)
+            await session.commit()
+        print(f"✅ Saved {rows_added} facts.")
+        return {"message": "Processed", "rows_added": rows_added}
+
+    except Exception as e:
+        print(f"❌ Knowledge Process Error: {e}")
+        raise HTTPException(500, detail=f"AI Extraction Failed: {str(e)}")
 
 @app.post("/knowledge/voice")
 async def process_voice_knowledge(file: UploadFile = File(...), phone: str = Form(...)):
@@ -351,136 +548,148 @@ async def process_voice_knowledge(file: UploadFile = File(...), phone: str = For
     3. Extracts Business Facts
     4. Saves to SQL & Pinecone
     """
-    with Session(engine) as session:
-        # Validate User
-        user = session.exec(select(User).where(or_(
-            User.phone_number == phone, 
-            User.phone_number == f"+{phone.strip('+')}"
-        ))).first()
-        
-        if not user: raise HTTPException(404, "User not found")
+    # Validate User
+    user = await resolve_tenant_async(phone)
+    if not user: raise HTTPException(404, "User not found")
 
-        try:
-            # 1. Save Audio Temporarily
-            temp_filename = f"voice_{uuid4()}.webm"
-            # Ensure uploads dir exists
-            if not os.path.exists("uploads"):
-                os.makedirs("uploads")
-                
-            temp_path = f"uploads/{temp_filename}"
-            
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            # 2. Transcribe (Whisper)
-            print(f"🎙️ Transcribing {temp_filename}...")
-            transcribed_text = await transcribe_audio(temp_path)
-            print(f"📝 Text: {transcribed_text}")
-            
-            # Clean up audio file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-
-            # 3. Reuse the Extraction Logic
-            extracted_data = await extract_business_info(transcribed_text)
-            
-            new_rows = []
-            for fact in extracted_data.facts:
-                # Save to SQL
-                row = BusinessInfo(
-                    user_id=user.id,
-                    category=fact.category,
-                    topic=fact.topic,
-                    details=fact.details
-                )
-                session.add(row)
-                session.flush()
-                
-                # Save to Vector DB
-                row_text = f"{fact.category} - {fact.topic}: {fact.details}"
-                await index_business_row(row_text, row.id, user.id)
-                new_rows.append(row)
-            
-            session.commit()
-            return {"message": "Processed", "text": transcribed_text, "rows_added": len(new_rows)}
+    try:
+        # 1. Save Audio Temporarily (off the event loop)
+        temp_path, sha256 = await save_audio_upload(file)
 
-        except Exception as e:
-            print(f"❌ Voice Process Error: {e}")
-            raise HTTPException(500, detail=str(e))
+        # 2. Transcribe (Whisper; long notes are split and transcribed in parallel)
+        print(f"🎙️ Transcribing {os.path.basename(temp_path)}...")
+        try:
+            transcribed_text = await transcribe_file(temp_path, sha256)
+        finally:
+            await run_in_threadpool(remove_quietly, temp_path)
+        print(f"📝 Text: {transcribed_text}")
+
+        # 3. Reuse the Extraction Logic
+        extracted_data = await extract_business_info(transcribed_text)
+
+        # 4. Save to SQL & Vector DB in bulk
+        async with AsyncSessionLocal() as session:
+            rows_added = await save_business_facts(session, user.id, extracted_data.facts)
+            await session.commit()
+        return {"message": "Processed", "text": transcribed_text, "rows_added": rows_added}
+
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        print(f"❌ Voice Process Error: {e}")
+        raise HTTPException(500, detail=str(e))
 
 @app.get("/knowledge")
-def get_knowledge(phone: str = Query(...)):
+def get_knowledge(phone: str = Query(...), after_id: int = Query(None), limit: int = Query(None)):
+    user = resolve_tenant(phone)
+    if not user: return []
     with Session(engine) as session:
-        user = session.exec(select(User).where(or_(
-            User.phone_number == phone, 
-            User.phone_number == f"+{phone.strip('+')}"
-        ))).first()
-        
-        if not user: return []
-        return session.exec(select(BusinessInfo).where(BusinessInfo.user_id == user.id)).all()
+        columns = [
+            BusinessInfo.id, BusinessInfo.category, BusinessInfo.topic, BusinessInfo.details,
+            BusinessInfo.created_at, BusinessInfo.user_id,
+        ]
+        rows, next_after_id = fetch_page(session, BusinessInfo, columns, user.id, after_id, limit)
+    return page_response(rows, next_after_id)
 
 @app.delete("/knowledge/{id}")
 async def delete_knowledge(id: int, phone: str = Query(...)):
-    with Session(engine) as session:
-        user = session.exec(select(User).where(or_(
-            User.phone_number == phone, 
-            User.phone_number == f"+{phone.strip('+')}"
-        ))).first()
-        
-        row = session.get(BusinessInfo, id)
-        if row and row.user_id == user.id:
-            session.delete(row)
-            session.commit()
-            # Note: Add delete_business_row_vectors(id) if available in rag_engine
+    user = await resolve_tenant_async(phone)
+    async with AsyncSessionLocal() as session:
+        row = await session.get(BusinessInfo, id)
+        if row and user and row.user_id == user.id:
+            await session.delete(row)
+            touch_dashboard(session, user.id)
+            await session.commit()
+            await delete_business_row_vectors(id)
+            invalidate_lexical_index(user.id)
             return {"ok": True}
         raise HTTPException(404, "Not found")
 
 # --- WEBHOOK LOGIC ---
 
+@timed_message("customer message")
 async def handle_customer_message(sender: str, text: str, user_id: int):
-    with Session(engine) as session:
-        business_owner = session.get(User, user_id)
-        if not business_owner: return 
-
-        # 1. Menu Trigger
-        if "menu" in text.lower():
-            sections = [{"title": "Options", "rows": [{"id": "browse_items", "title": "Browse Items"}, {"id": "support", "title": "Contact Support"}]}]
-            send_interactive_list(sender, "Welcome!", "How can I help?", sections)
-            return
-
-        # 2. RAG & Agent
-        response = await answer_from_rag(text, user_id=user_id, customer_phone=sender)
-
-        # 3. Check for Trigger Token (From Agent)
-        if "[TRIGGER_BUY_BUTTONS]" in response:
-            send_interactive_buttons(sender, "Would you like to place this order?", [
-                {"id": "yes_buy", "title": "Yes, Order"},
-                {"id": "no_cancel", "title": "No, Cancel"}
-            ])
-        else:
-            send_whatsapp(sender, response)
+    set_tenant(user_id)
+    business_owner = await get_tenant_async(user_id)
+    if not business_owner: return 
+
+    # 1. Menu Trigger
+    if "menu" in text.lower():
+        sections = [{"title": "Options", "rows": [{"id": "browse_items", "title": "Browse Items"}, {"id": "support", "title": "Contact Support"}]}]
+        send_interactive_list(sender, "Welcome!", "How can I help?", sections)
+        return
+
+    # 2. RAG & Agent (no DB connection is held while the LLM runs)
+    response = await answer_from_rag(text, user_id=user_id, customer_phone=sender)
+
+    # 3. Check for Trigger Token (From Agent)
+    if "[TRIGGER_BUY_BUTTONS]" in response:
+        send_interactive_buttons(sender, "Would you like to place this order?", [
+            {"id": "yes_buy", "title": "Yes, Order"},
+            {"id": "no_cancel", "title": "No, Cancel"}
+        ])
+    else:
+        send_whatsapp(sender, response)
+
+    # 4. Log
+    chat_logger.log(sender="Suzan", message_text=response, user_id=user_id)
+
+MEDIA_MESSAGE_TYPES = ("audio", "image", "video", "document", "sticker")
+
+@timed_message("customer media message")
+async def handle_customer_media(sender: str, message: dict, user_id: int):
+    """Voice notes are transcribed and answered like text; other media is logged and its caption answered."""
+    set_tenant(user_id)
+    msg_type = message.get("type")
+    media = message.get(msg_type, {})
+    text = media.get("caption") or ""
+    try:
+        media_path = await fetch_media(media["id"], media.get("mime_type"))
+        if msg_type == "audio":
+            text = await transcribe_file(media_path, media.get("sha256"))
+            print(f"📝 Voice note from {sender}: {text}")
+    except Exception as e:
+        print(f"❌ Customer Media Error: {e}")
+        if msg_type == "audio":
+            send_whatsapp(sender, "Sorry, I couldn't listen to that voice note. Could you type your message instead?")
 
-        # 4. Log
-        session.add(ChatLog(conversation_id=str(uuid4()), sender="Suzan", message_text=response, user_id=None))
-        session.commit()
+    label = "Voice" if msg_type == "audio" else msg_type.capitalize()
+    chat_logger.log(conversation_id=message.get("id"), sender=sender, message_text=f"[{label}] {text}".strip(),
+                    user_id=user_id, media_url=graph_media_url(media["id"]) if media.get("id") else None)
+    if text:
+        await handle_customer_message(sender, text, user_id)
 
+@timed_message("customer interactive message")
 async def handle_interactive_message(sender: str, button_id: str, user_id: int):
-    with Session(engine) as session:
-        business_owner = session.get(User, user_id)
-        if not business_owner: return
-
-        if button_id == "yes_buy":
-            submit_order_request.invoke({"item_name": "Item from Chat", "quantity": 1, "customer_phone": sender, "user_phone": business_owner.phone_number})
-            send_whatsapp(sender, "✅ Request sent!")
-            send_whatsapp(business_owner.phone_number, f"🔔 New Order from {sender}")
-        elif button_id == "no_cancel":
-            send_whatsapp(sender, "Order cancelled.")
-        elif button_id == "browse_items":
-            response = await answer_from_rag("List items", user_id=user_id, customer_phone=sender)
-            send_whatsapp(sender, response)
-        elif button_id == "support":
-            send_whatsapp(business_owner.phone_number, f"ℹ️ Support request from {sender}")
-            send_whatsapp(sender, "Owner notified.")
+    set_tenant(user_id)
+    business_owner = await get_tenant_async(user_id)
+    if not business_owner: return
+
+    if button_id == "yes_buy":
+        # Orders exactly what the agent last quoted to this customer
+        sale, reply = await run_in_threadpool(place_quoted_order, user_id, sender)
+        send_whatsapp(sender, reply)
+        if sale:
+            send_whatsapp(business_owner.phone_number, f"🔔 New Order from {sender}: {sale.item_description} (₦{sale.amount:,.2f})")
+    elif button_id == "no_cancel":
+        send_whatsapp(sender, "Order cancelled.")
+    elif button_id == "browse_items":
+        response = await answer_from_rag("List items", user_id=user_id, customer_phone=sender)
+        send_whatsapp(sender, response)
+    elif button_id == "support":
+        send_whatsapp(business_owner.phone_number, f"ℹ️ Support request from {sender}")
+        send_whatsapp(sender, "Owner notified.")
+
+@timed_message("admin message")
+async def handle_admin_message(u_phone: str, msg_text: str, u_id: int):
+    set_tenant(u_id)
+    u_obj = await get_tenant_async(u_id)
+    if not u_obj: return
+
+    resp = await run_admin_agent(u_phone, msg_text, u_obj.bot_name, u_obj.business_name)
+    send_whatsapp(u_phone, resp)
+    # Log Bot Response
+    chat_logger.log(sender=u_obj.bot_phone_number, message_text=resp, user_id=u_obj.id)
 
 
 @app.get("/webhook")
@@ -498,11 +707,12 @@ async def verify_webhook(request: Request):
 
 @app.post("/webhook")
 async def webhook(request: Request, background_tasks: BackgroundTasks):
-    body = await request.json()
-    entry = body.get("entry", [{}])[0]
-    changes = entry.get("changes", [{}])[0]
-    value = changes.get("value", {})
-    messages = value.get("messages", [])
+    with timed("webhook_parse"):
+        body = await request.json()
+        entry = body.get("entry", [{}])[0]
+        changes = entry.get("changes", [{}])[0]
+        value = changes.get("value", {})
+        messages = value.get("messages", [])
 
     if not messages:
         return {"ok": True}
@@ -511,49 +721,37 @@ async def webhook(request: Request, background_tasks: BackgroundTasks):
     sender = message.get("from")
     msg_type = message.get("type")
 
-    with Session(engine) as session:
+    async with AsyncSessionLocal() as session:
         # Identify User (Business Owner)
         # 1. Is the sender the Owner?
-        user = session.exec(select(User).where(User.phone_number == sender)).first()
+        user = await resolve_tenant_async(sender)
 
         if user:
+            set_tenant(user.id)
             # --- ADMIN ROUTE ---
             if msg_type == "text":
                 text = message.get("text", {}).get("body")
 
                 # Log User Message
-                log = ChatLog(
-                    conversation_id=message.get("id", str(uuid4())),
-                    sender=sender,
-                    message_text=text,
-                    user_id=user.id
-                )
-                session.add(log)
-                session.commit()
-
-                async def admin_task(u_phone, msg_text, u_id):
-                    # Refetch user
-                    with Session(engine) as session:
-                        u_obj = session.get(User, u_id)
-                        if not u_obj: return
-
-                        resp = await run_admin_agent(u_phone, msg_text, u_obj.bot_name, u_obj.business_name)
-                        send_whatsapp(u_phone, resp)
-                        # Log Bot Response
-                        log = ChatLog(conversation_id=str(uuid4()), sender=u_obj.bot_phone_number, message_text=resp, user_id=u_obj.id)
-                        session.add(log)
-                        session.commit()
-
-                background_tasks.add_task(admin_task, sender, text, user.id)
+                chat_logger.log(conversation_id=message.get("id"), sender=sender, message_text=text, user_id=user.id)
+
+                background_tasks.add_task(handle_admin_message, sender, text, user.id)
                 return {"mode": "admin"}
 
         else:
             # --- CUSTOMER ROUTE ---
             # Find the business owner (Default to first user for now)
-            business_owner = session.exec(select(User)).first()
+            with timed("tenant_lookup"):
+                business_owner = (await session.exec(select(User))).first()
             if not business_owner:
                 send_whatsapp(sender, "System not configured.")
                 return {"mode": "error"}
+            set_tenant(business_owner.id)
+
+            # Voice notes and other media are downloaded (and transcribed) off the request
+            if msg_type in MEDIA_MESSAGE_TYPES:
+                background_tasks.add_task(handle_customer_media, sender, message, business_owner.id)
+                return {"mode": "customer"}
 
             # Determine Message Content for Logging
             text = ""
@@ -569,15 +767,8 @@ async def webhook(request: Request, background_tasks: BackgroundTasks):
                 elif int_type == "list_reply":
                     text = f"[List] {interaction['list_reply']['id']}"
 
-            # Log Customer Message
-            log = ChatLog(
-                conversation_id=message.get("id", str(uuid4())),
-                sender=sender,
-                message_text=text,
-                user_id=None
-            )
-            session.add(log)
-            session.commit()
+            # Log Customer Message (attributed to the business, so it's in the tenant's export)
+            chat_logger.log(conversation_id=message.get("id"), sender=sender, message_text=text, user_id=business_owner.id)
 
             # Dispatch Background Tasks
             if msg_type == "text":
@@ -0,0 +1,133 @@
+import asyncio
+import mimetypes
+import os
+import time
+
+import anyio
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .storage import UPLOAD_DIR, temp_path, write_stream
+
+# --- INBOUND WHATSAPP MEDIA ---
+# A media message only carries an id. fetch_media() asks the Graph API for a short-lived
+# download URL and streams the file to disk through one pooled httpx.AsyncClient (never the
+# whole file in memory), with at most MEDIA_MAX_CONCURRENT_DOWNLOADS downloads per worker
+# in flight.
+#
+# Files are cached on disk as {UPLOAD_DIR}/media/{media_id}{ext}: a webhook retried by Meta,
+# or a note handled twice, is read from disk instead of downloaded again, and two concurrent
+# requests for the same id share one download. prune_media_cache() (scheduled, see
+# app/scheduler.py) drops files older than MEDIA_CACHE_DAYS, so ChatLog.media_url stores the
+# Graph API URL of the media (graph_media_url), not the cache path.
+
+GRAPH_API_URL = "https://graph.facebook.com/v22.0"
+MEDIA_DIR = os.path.join(UPLOAD_DIR, "media")
+MEDIA_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+MEDIA_EXTENSIONS = {"audio/ogg": ".ogg", "audio/amr": ".amr"} # ones mimetypes gets wrong or lacks
+
+_client = None
+_download_slots = asyncio.Semaphore(settings.MEDIA_MAX_CONCURRENT_DOWNLOADS)
+_inflight = {} # media_id -> download task
+
+class MediaDownloadError(Exception):
+    pass
+
+def _http() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=MEDIA_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.MEDIA_MAX_CONCURRENT_DOWNLOADS * 2, max_keepalive_connections=10),
+        )
+    return _client
+
+async def close_media_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def media_path(media_id: str, mime_type: str = None) -> str:
+    mime = (mime_type or "").split(";")[0].strip().lower()
+    ext = MEDIA_EXTENSIONS.get(mime) or mimetypes.guess_extension(mime) or ".bin"
+    return os.path.join(MEDIA_DIR, f"{media_id}{ext}")
+
+def graph_media_url(media_id: str) -> str:
+    """Where the media can be fetched again (with the WhatsApp token) while Meta keeps it."""
+    return f"{GRAPH_API_URL}/{media_id}"
+
+class _ResponseReader:
+    """Blocking read() over a streaming httpx response, for write_stream() on a worker thread."""
+    def __init__(self, response: httpx.Response):
+        self._chunks = response.aiter_bytes()
+        self._pending = b""
+
+    async def _next_chunk(self) -> bytes:
+        return await anext(self._chunks, b"")
+
+    def read(self, size: int) -> bytes:
+        while len(self._pending) < size:
+            chunk = anyio.from_thread.run(self._next_chunk) # on the event loop that owns the response
+            if not chunk:
+                break
+            self._pending += chunk
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+def _save_download(reader: _ResponseReader, path: str, max_bytes: int):
+    """Streams to a temp file, then moves it into place: nobody sees a half-written file at `path`."""
+    tmp_path = temp_path()
+    try:
+        write_stream(reader, tmp_path, max_bytes)
+        os.makedirs(MEDIA_DIR, exist_ok=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+async def _download(media_id: str, path: str) -> str:
+    headers = {"Authorization": f"Bearer {settings.WHATSAPP_TOKEN}"}
+    max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+    async with _download_slots:
+        try:
+            meta = await _http().get(graph_media_url(media_id), headers=headers)
+            meta.raise_for_status()
+            url = meta.json()["url"]
+
+            async with _http().stream("GET", url, headers=headers) as response:
+                response.raise_for_status()
+                await run_in_threadpool(_save_download, _ResponseReader(response), path, max_bytes)
+        except (httpx.HTTPError, KeyError, ValueError) as e: # ValueError includes UploadTooLarge
+            raise MediaDownloadError(f"Could not download media {media_id}: {e}") from e
+    return path
+
+async def fetch_media(media_id: str, mime_type: str = None) -> str:
+    """Local path of a WhatsApp media file, downloading it unless cached. Raises MediaDownloadError."""
+    path = media_path(media_id, mime_type)
+    if await run_in_threadpool(os.path.exists, path):
+        return path
+
+    task = _inflight.get(media_id)
+    if task is None:
+        task = asyncio.ensure_future(_download(media_id, path))
+        _inflight[media_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(media_id, None))
+    return await asyncio.shield(task) # one caller giving up doesn't cancel the others' download
+
+def prune_media_cache(max_age_days: int = None) -> int:
+    """Removes cached media older than MEDIA_CACHE_DAYS. Sync; returns how many files."""
+    max_age_days = settings.MEDIA_CACHE_DAYS if max_age_days is None else max_age_days
+    if not os.path.isdir(MEDIA_DIR):
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for entry in os.scandir(MEDIA_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    if removed:
+        print(f"🧹 Removed {removed} cached media files.")
+    return removed
@@ -0,0 +1,172 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+from .config import settings
+
+# --- PER-STAGE LATENCY METRICS ---
+# Every stage of a reply (webhook parse, tenant lookup, history load, each LLM call, each
+# tool, vector search, outbound send, the ChatLog group commit) is timed with
+#   with timed("stage"): ...
+# into one Prometheus histogram labelled by stage, tenant tier and model. LLM and tool
+# timings come from the LangChain callback in `llm_callbacks`, so the agent loop's
+# iterations are counted one by one. GET /metrics exposes everything.
+#
+# Tiers are a low-cardinality stand-in for the tenant (TENANT_TIERS maps user ids to a tier;
+# everyone else is DEFAULT_TIER). Stages outside an LLM call carry the model of the agent
+# that is running, or "-".
+#
+# With SLOW_REQUEST_MS set, request_timer() also collects each request's (or each inbound
+# message's) stages and prints the breakdown when the whole thing took longer than that.
+
+DEFAULT_TIER = "standard"
+NO_LABEL = "-"
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "suzan_stage_seconds", "Time spent in each stage of handling a request", ["stage", "tier", "model"], buckets=STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter("suzan_stage_errors_total", "Stages that raised", ["stage", "tier", "model"])
+LLM_TOKENS = Counter("suzan_llm_tokens_total", "Tokens used by LLM calls", ["tier", "model", "kind"])
+
+current_tier: ContextVar[str] = ContextVar("metrics_tier", default=NO_LABEL)
+current_model: ContextVar[str] = ContextVar("metrics_model", default=NO_LABEL)
+
+def tenant_tier(user_id: Optional[int]) -> str:
+    if user_id is None:
+        return NO_LABEL
+    return settings.TENANT_TIERS.get(str(user_id), DEFAULT_TIER)
+
+def set_tenant(user_id: Optional[int]):
+    """Labels the rest of this task's stages with the tenant's tier."""
+    current_tier.set(tenant_tier(user_id))
+
+def observe(stage: str, seconds: float, model: str = None, error: bool = False):
+    labels = (stage, current_tier.get(), model or current_model.get())
+    STAGE_SECONDS.labels(*labels).observe(seconds)
+    if error:
+        STAGE_ERRORS.labels(*labels).inc()
+    breakdown = _current_breakdown.get()
+    if breakdown is not None and breakdown.open:
+        breakdown.stages.append((stage, seconds))
+
+@contextmanager
+def timed(stage: str, model: str = None):
+    """Times the block as `stage` (sync or async code; exceptions are counted and re-raised)."""
+    start, error = time.perf_counter(), False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, model, error)
+
+@contextmanager
+def model_label(model: str):
+    token = current_model.set(model)
+    try:
+        yield
+    finally:
+        current_model.reset(token)
+
+def render_metrics() -> tuple:
+    """(body, content type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+# --- LANGCHAIN CALLBACK (LLM calls and tools) ---
+
+class StageMetricsCallback(BaseCallbackHandler):
+    """Times every chat model call and tool run. Stateless per turn, so one instance is shared."""
+    run_inline = True # on the event loop, so it sees the turn's context variables
+
+    def __init__(self):
+        self._runs = {} # run_id -> (stage, model, started)
+
+    def _start(self, run_id, stage: str, model: str = None):
+        self._runs[run_id] = (stage, model, time.perf_counter())
+
+    def _end(self, run_id, error: bool = False):
+        run = self._runs.pop(run_id, None)
+        if run:
+            stage, model, started = run
+            observe(stage, time.perf_counter() - started, model, error)
+        return run
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (metadata or {}).get("ls_model_name")
+        self._start(run_id, "llm", model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, metadata=metadata, **kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._end(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        model = (run and run[1]) or current_model.get()
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.labels(current_tier.get(), model, kind.split("_")[0]).inc(usage[kind])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, f"tool:{(serialized or {}).get('name', 'unknown')}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+llm_callbacks = [StageMetricsCallback()]
+
+# --- SLOW REQUEST BREAKDOWN ---
+
+class _Breakdown:
+    def __init__(self, name: str):
+        self.name = name
+        self.stages = []
+        self.open = True
+
+_current_breakdown: ContextVar[Optional[_Breakdown]] = ContextVar("metrics_breakdown", default=None)
+
+@contextmanager
+def request_timer(name: str):
+    """
+    Collects the stages timed inside the block and logs them if it took over SLOW_REQUEST_MS.
+    No-op when the setting is off or an enclosing request_timer is already collecting.
+    """
+    active = _current_breakdown.get()
+    if settings.SLOW_REQUEST_MS is None or (active is not None and active.open):
+        yield
+        return
+    breakdown = _Breakdown(name)
+    token = _current_breakdown.set(breakdown)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        breakdown.open = False # background work spawned from here (inherits the context) stops adding to it
+        _current_breakdown.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+        if total_ms >= settings.SLOW_REQUEST_MS:
+            parts = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in breakdown.stages)
+            print(f"🐢 Slow: {name} took {total_ms:.0f}ms [{parts or 'no timed stages'}]")
+
+def timed_message(name: str):
+    """request_timer() for a whole async handler, e.g. a webhook message processed in the background."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with request_timer(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
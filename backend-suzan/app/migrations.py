@@ -0,0 +1,263 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, text, insert, select
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+from . import models # noqa: F401 - registers every table on SQLModel.metadata
+from .models import SchemaMigration, DailySalesRollup, AccountDeletionJob, OrderQuote, ScheduledJobRun
+
+# --- VERSIONED SCHEMA MIGRATIONS ---
+# Each migration runs once, in its own transaction, and is recorded in schema_migrations.
+# Migrations must be idempotent (IF NOT EXISTS / column checks): a fresh database gets the
+# current schema from the baseline create_all, and later migrations then find nothing to do.
+#
+# Runs at deploy time (render.yaml preDeployCommand) and on app startup via init_db().
+# Usage: python -m app.migrations
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if not _has_column(conn, table, column):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+def _create_index(conn: Connection, name: str, table: str, columns: list, unique: bool = False):
+    cols = ", ".join(f'"{c}"' for c in columns)
+    conn.execute(text(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {name} ON "{table}" ({cols})'))
+
+# --- MIGRATIONS ---
+
+def _0001_baseline(conn: Connection):
+    SQLModel.metadata.create_all(conn)
+
+def _0002_ingestion_job_columns(conn: Connection):
+    _add_column(conn, "uploadedfile", "status", "VARCHAR NOT NULL DEFAULT 'COMPLETED'")
+    _add_column(conn, "uploadedfile", "pages_total", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "uploadedfile", "pages_done", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "uploadedfile", "chunks_indexed", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "uploadedfile", "chunks_embedded", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "uploadedfile", "chunks_deleted", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "uploadedfile", "error", "VARCHAR")
+
+def _0003_hot_query_indexes(conn: Connection):
+    _create_index(conn, "ix_chatlog_sender_timestamp", "chatlog", ["sender", "timestamp"])
+    _create_index(conn, "ix_chatlog_user_id_timestamp", "chatlog", ["user_id", "timestamp"])
+    _create_index(conn, "ix_salesledger_user_id_status_timestamp", "salesledger", ["user_id", "status", "timestamp"])
+    _create_index(conn, "ix_inventoryitem_user_id_name", "inventoryitem", ["user_id", "name"])
+    _create_index(conn, "ix_businessinfo_user_id", "businessinfo", ["user_id"])
+    _create_index(conn, "ix_alert_user_id_created_at", "alert", ["user_id", "created_at"])
+    _create_index(conn, "ix_uploadedfile_user_id", "uploadedfile", ["user_id"])
+    _create_index(conn, "ix_documentchunk_vector_id", "documentchunk", ["vector_id"])
+
+def _0004_catalog_search_index(conn: Connection):
+    """Search index behind app/search.py (FTS5 trigram on SQLite, pg_trgm on Postgres)."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_inventoryitem_name_trgm ON inventoryitem USING gin (lower(name) gin_trgm_ops)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_businessinfo_search_trgm ON businessinfo USING gin (lower(topic || ' ' || details) gin_trgm_ops)"))
+        return
+    if conn.dialect.name != "sqlite":
+        return
+
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search "
+        "USING fts5(body, tenant, tokenize = 'trigram')"
+    ))
+    # rowid = id*2 for inventory items, id*2+1 for knowledge rows
+    item_row = "(new.id * 2, new.name || ' ' || coalesce(new.description, ''), '#' || new.user_id || '#')"
+    fact_row = "(new.id * 2 + 1, new.topic || ' ' || new.details, '#' || new.user_id || '#')"
+    for statement in [
+        f"CREATE TRIGGER IF NOT EXISTS inventoryitem_search_insert AFTER INSERT ON inventoryitem BEGIN "
+        f"INSERT INTO catalog_search(rowid, body, tenant) VALUES {item_row}; END",
+        f"CREATE TRIGGER IF NOT EXISTS inventoryitem_search_update AFTER UPDATE OF name, description, user_id ON inventoryitem BEGIN "
+        f"DELETE FROM catalog_search WHERE rowid = old.id * 2; "
+        f"INSERT INTO catalog_search(rowid, body, tenant) VALUES {item_row}; END",
+        "CREATE TRIGGER IF NOT EXISTS inventoryitem_search_delete AFTER DELETE ON inventoryitem BEGIN "
+        "DELETE FROM catalog_search WHERE rowid = old.id * 2; END",
+        f"CREATE TRIGGER IF NOT EXISTS businessinfo_search_insert AFTER INSERT ON businessinfo BEGIN "
+        f"INSERT INTO catalog_search(rowid, body, tenant) VALUES {fact_row}; END",
+        f"CREATE TRIGGER IF NOT EXISTS businessinfo_search_update AFTER UPDATE OF topic, details, user_id ON businessinfo BEGIN "
+        f"DELETE FROM catalog_search WHERE rowid = old.id * 2 + 1; "
+        f"INSERT INTO catalog_search(rowid, body, tenant) VALUES {fact_row}; END",
+        "CREATE TRIGGER IF NOT EXISTS businessinfo_search_delete AFTER DELETE ON businessinfo BEGIN "
+        "DELETE FROM catalog_search WHERE rowid = old.id * 2 + 1; END",
+    ]:
+        conn.execute(text(statement))
+
+    # Backfill rows written before the triggers existed
+    conn.execute(text("DELETE FROM catalog_search"))
+    conn.execute(text(
+        "INSERT INTO catalog_search(rowid, body, tenant) "
+        "SELECT id * 2, name || ' ' || coalesce(description, ''), '#' || user_id || '#' FROM inventoryitem"
+    ))
+    conn.execute(text(
+        "INSERT INTO catalog_search(rowid, body, tenant) "
+        "SELECT id * 2 + 1, topic || ' ' || details, '#' || user_id || '#' FROM businessinfo"
+    ))
+
+def _0005_daily_sales_rollups(conn: Connection):
+    from .rollups import rebuild_rollups
+    DailySalesRollup.__table__.create(conn, checkfirst=True)
+    rebuild_rollups(conn)
+
+def _0006_keyset_pagination_indexes(conn: Connection):
+    # List endpoints page with WHERE user_id = ? AND id < ? ORDER BY id DESC
+    for table in ["salesledger", "inventoryitem", "alert", "businessinfo", "uploadedfile"]:
+        _create_index(conn, f"ix_{table}_user_id_id", table, ["user_id", "id"])
+    # Superseded by the (user_id, id) indexes above
+    conn.execute(text("DROP INDEX IF EXISTS ix_businessinfo_user_id"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_uploadedfile_user_id"))
+
+def _0007_unique_inventory_names(conn: Connection):
+    # Merge duplicate (user_id, name) rows into the oldest one, then make the pair the
+    # bulk-import upsert key. Stock is summed; sales and quotes move to the kept row.
+    referencing = [t for t in ("salesledger", "orderquote")
+                   if inspect(conn).has_table(t) and _has_column(conn, t, "inventory_item_id")]
+    duplicates = conn.execute(text(
+        "SELECT user_id, name, MIN(id) FROM inventoryitem GROUP BY user_id, name HAVING COUNT(*) > 1"
+    )).all()
+    for user_id, name, keep_id in duplicates:
+        same = {"user_id": user_id, "name": name, "keep": keep_id}
+        merged_ids = conn.execute(text(
+            "SELECT id FROM inventoryitem WHERE user_id = :user_id AND name = :name AND id <> :keep"
+        ), same).scalars().all()
+        conn.execute(text(
+            "UPDATE inventoryitem SET "
+            "stock = (SELECT SUM(stock) FROM inventoryitem WHERE user_id = :user_id AND name = :name), "
+            "description = COALESCE(description, (SELECT description FROM inventoryitem "
+            "WHERE user_id = :user_id AND name = :name AND description IS NOT NULL ORDER BY id LIMIT 1)) "
+            "WHERE id = :keep"
+        ), same)
+        for merged_id in merged_ids:
+            for table in referencing:
+                conn.execute(text(f'UPDATE "{table}" SET inventory_item_id = :keep WHERE inventory_item_id = :old'),
+                             {"keep": keep_id, "old": merged_id})
+            conn.execute(text("DELETE FROM inventoryitem WHERE id = :old"), {"old": merged_id})
+        print(f"🔀 User {user_id}: merged {len(merged_ids) + 1} '{name}' products into item {keep_id} (stock summed)")
+    conn.execute(text("DROP INDEX IF EXISTS ix_inventoryitem_user_id_name"))
+    _create_index(conn, "ix_inventoryitem_user_id_name", "inventoryitem", ["user_id", "name"], unique=True)
+
+def _0008_account_deletion_jobs(conn: Connection):
+    AccountDeletionJob.__table__.create(conn, checkfirst=True)
+
+def _0009_normalize_user_phones(conn: Connection):
+    # Fails (and rolls back) if any stored number can't be normalized or would collide with
+    # another user's: tenant lookup only matches E.164, so those owners would be locked out.
+    # Fix the listed rows by hand and rerun.
+    from .tenants import normalize_phone
+    users = conn.execute(text('SELECT id, phone_number FROM "user" ORDER BY id')).all()
+    owner_of = {phone: user_id for user_id, phone in users}
+    updates, problems = {}, []
+    for user_id, phone in users:
+        try:
+            canonical = normalize_phone(phone)
+        except ValueError:
+            problems.append(f"user {user_id}: {phone!r} is not a valid phone number")
+            continue
+        if canonical == phone:
+            continue
+        if canonical in owner_of:
+            problems.append(f"user {user_id}: {phone!r} normalizes to {canonical}, which user {owner_of[canonical]} has")
+            continue
+        updates[user_id] = canonical
+        owner_of[canonical] = user_id
+    if problems:
+        raise RuntimeError(
+            "Can't normalize user phone numbers; fix these rows and rerun `python -m app.migrations`:\n  "
+            + "\n  ".join(problems)
+        )
+    for user_id, canonical in updates.items():
+        conn.execute(text('UPDATE "user" SET phone_number = :phone WHERE id = :id'), {"phone": canonical, "id": user_id})
+
+def _0010_order_reservations(conn: Connection):
+    _add_column(conn, "salesledger", "inventory_item_id", "INTEGER")
+    _add_column(conn, "salesledger", "quantity", "INTEGER NOT NULL DEFAULT 1")
+    _add_column(conn, "salesledger", "expires_at", "TIMESTAMP")
+    _create_index(conn, "ix_salesledger_status_expires_at", "salesledger", ["status", "expires_at"])
+    OrderQuote.__table__.create(conn, checkfirst=True)
+
+def _0011_low_stock_alerts(conn: Connection):
+    _add_column(conn, "inventoryitem", "low_stock_threshold", "INTEGER NOT NULL DEFAULT 5")
+    _add_column(conn, "inventoryitem", "low_stock_alerted", "BOOLEAN NOT NULL DEFAULT FALSE")
+
+def _0012_scheduler_and_digests(conn: Connection):
+    ScheduledJobRun.__table__.create(conn, checkfirst=True)
+    _add_column(conn, "user", "digest_enabled", "BOOLEAN NOT NULL DEFAULT FALSE")
+    _add_column(conn, "user", "digest_time", "TIME NOT NULL DEFAULT '20:00:00'")
+    _add_column(conn, "user", "digest_sent_on", "DATE")
+    _create_index(conn, "ix_user_digest_enabled_digest_time", "user", ["digest_enabled", "digest_time"])
+
+def _0013_content_addressed_uploads(conn: Connection):
+    _add_column(conn, "uploadedfile", "sha256", "VARCHAR")
+    _add_column(conn, "uploadedfile", "size_bytes", "INTEGER")
+    _create_index(conn, "ix_uploadedfile_sha256_status", "uploadedfile", ["sha256", "status"])
+    _create_index(conn, "ix_uploadedfile_filepath", "uploadedfile", ["filepath"])
+
+def _0014_attribute_customer_chats(conn: Connection):
+    # Customer messages and bot replies used to be logged without a tenant. Customers have
+    # always been routed to the first business, so that's whose conversations they are.
+    conn.execute(text(
+        'UPDATE chatlog SET user_id = (SELECT MIN(id) FROM "user") WHERE user_id IS NULL'
+    ))
+
+def _0015_job_heartbeats(conn: Connection):
+    _add_column(conn, "uploadedfile", "heartbeat_at", "TIMESTAMP")
+    _add_column(conn, "accountdeletionjob", "heartbeat_at", "TIMESTAMP")
+
+def _0016_reindex_pre_manifest_files(conn: Connection):
+    # Migration 0002 marked existing uploads COMPLETED, but they have no DocumentChunk manifest
+    # and their vectors carry no user_id, so tenant-filtered retrieval never finds them.
+    # Queue them again; the ingestion sweep indexes them with the current pipeline (and
+    # app.reconcile drops the old vectors once the manifest exists).
+    conn.execute(text(
+        "UPDATE uploadedfile SET status = 'PENDING', pages_done = 0 "
+        "WHERE status = 'COMPLETED' AND NOT EXISTS (SELECT 1 FROM documentchunk WHERE documentchunk.file_id = uploadedfile.id)"
+    ))
+
+MIGRATIONS = [
+    (1, "baseline schema", _0001_baseline),
+    (2, "ingestion job columns on uploadedfile", _0002_ingestion_job_columns),
+    (3, "composite indexes for hot queries", _0003_hot_query_indexes),
+    (4, "catalog search index", _0004_catalog_search_index),
+    (5, "daily sales rollups", _0005_daily_sales_rollups),
+    (6, "keyset pagination indexes", _0006_keyset_pagination_indexes),
+    (7, "unique inventory names per tenant", _0007_unique_inventory_names),
+    (8, "account deletion jobs", _0008_account_deletion_jobs),
+    (9, "canonical E.164 user phone numbers", _0009_normalize_user_phones),
+    (10, "order stock reservations and quotes", _0010_order_reservations),
+    (11, "low-stock alert thresholds", _0011_low_stock_alerts),
+    (12, "job scheduler and daily digests", _0012_scheduler_and_digests),
+    (13, "content-addressed uploads", _0013_content_addressed_uploads),
+    (14, "attribute customer chat logs to the business", _0014_attribute_customer_chats),
+    (15, "heartbeats for claimed background jobs", _0015_job_heartbeats),
+    (16, "re-index uploads from before the chunk manifest", _0016_reindex_pre_manifest_files),
+]
+
+def run_migrations(bind: Engine = None) -> list:
+    """Applies pending migrations in order; returns the versions applied."""
+    if bind is None:
+        from .db import engine as bind
+
+    with bind.begin() as conn:
+        SchemaMigration.__table__.create(conn, checkfirst=True)
+        applied = set(conn.execute(select(SchemaMigration.version)).scalars())
+
+    newly_applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with bind.begin() as conn:
+            migrate(conn)
+            conn.execute(insert(SchemaMigration).values(
+                version=version,
+                description=description,
+                applied_at=datetime.utcnow(),
+            ))
+        print(f"⬆️ Applied migration {version:04d}: {description}")
+        newly_applied.append(version)
+    return newly_applied
+
+if __name__ == "__main__":
+    applied = run_migrations()
+    print(f"✅ Schema up to date ({len(applied)} migration(s) applied).")
@@ -1,9 +1,15 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, UniqueConstraint
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date, time
+
+# Composite indexes are declared on the models (for fresh databases) and created by
+# app/migrations.py (for existing ones); keep the names in sync.
 
 # Replaces 'Business' - The SaaS User/Owner
 class User(SQLModel, table=True):
+    __table_args__ = (Index("ix_user_digest_enabled_digest_time", "digest_enabled", "digest_time"),) # Digest due-owner scan
+
     id: Optional[int] = Field(default=None, primary_key=True)
     business_name: str
     phone_number: str = Field(index=True, unique=True) # The unique identifier (WhatsApp Number)
@@ -12,6 +18,12 @@ class User(SQLModel, table=True):
     bot_phone_number: str = Field(default="+1 (555) 194-0685") # Assigned Bot Number
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Daily WhatsApp digest (see app/digest.py)
+    # Server defaults too, so rows inserted outside the ORM (scripts, raw SQL) stay valid
+    digest_enabled: bool = Field(default=False, sa_column_kwargs={"server_default": "0"})
+    digest_time: time = Field(default=time(20, 0), sa_column_kwargs={"server_default": "20:00:00"}) # Server local time, like the ledger
+    digest_sent_on: Optional[date] = None # Last day a digest went out; claimed before sending
+
     # Relationships (Links to other tables)
     inventory: List["InventoryItem"] = Relationship(back_populates="user")
     sales: List["SalesLedger"] = Relationship(back_populates="user")
@@ -22,16 +34,29 @@ class User(SQLModel, table=True):
 
 # The Inventory/Catalog
 class InventoryItem(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_inventoryitem_user_id_name", "user_id", "name", unique=True), # Upsert key for bulk import
+        Index("ix_inventoryitem_user_id_id", "user_id", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     price: float
     stock: int = Field(default=0)
     description: Optional[str] = None
+    low_stock_threshold: int = Field(default=5) # Alert when stock drops to this (see app/stock_alerts.py)
+    low_stock_alerted: bool = Field(default=False) # Set once alerted; cleared when restocked above the threshold
     
     user_id: int = Field(foreign_key="user.id")
     user: Optional[User] = Relationship(back_populates="inventory")
 
 class SalesLedger(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_salesledger_user_id_status_timestamp", "user_id", "status", "timestamp"),
+        Index("ix_salesledger_user_id_id", "user_id", "id"),
+        Index("ix_salesledger_status_expires_at", "status", "expires_at"), # Order expiry sweep
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     transaction_id: str
     item_description: Optional[str]
@@ -40,11 +65,46 @@ class SalesLedger(SQLModel, table=True):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     logged_by: str 
     status: str = Field(default="COMPLETED") 
+
+    # Customer orders (see app/orders.py): the reserved stock and when the hold lapses
+    inventory_item_id: Optional[int] = None
+    quantity: int = Field(default=1)
+    expires_at: Optional[datetime] = None # Set while PENDING; the sweeper releases stock after it
     
     user_id: int = Field(foreign_key="user.id")
     user: Optional[User] = Relationship(back_populates="sales")
 
+# The last item/quantity quoted to a customer, so the "Yes, Order" button orders exactly that
+class OrderQuote(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("user_id", "customer_phone", name="uq_orderquote_user_id_customer_phone"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    customer_phone: str
+    inventory_item_id: int
+    item_name: str
+    quantity: int
+    unit_price: float
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime
+
+# Per-tenant daily sales totals, maintained alongside SalesLedger writes (see app/rollups.py)
+class DailySalesRollup(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("user_id", "day", "status", name="uq_dailysalesrollup_user_id_day_status"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    day: date
+    status: str # Same values as SalesLedger.status
+    revenue: float = Field(default=0.0)
+    count: int = Field(default=0)
+
 class ChatLog(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_chatlog_sender_timestamp", "sender", "timestamp"),
+        Index("ix_chatlog_user_id_timestamp", "user_id", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     conversation_id: str
     sender: str
@@ -56,16 +116,49 @@ class ChatLog(SQLModel, table=True):
     user: Optional[User] = Relationship(back_populates="chat_logs")
 
 class UploadedFile(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_uploadedfile_user_id_id", "user_id", "id"),
+        Index("ix_uploadedfile_sha256_status", "sha256", "status"), # Find an indexed copy of the same content
+        Index("ix_uploadedfile_filepath", "filepath"), # Blob reference checks
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     filename: str
     filepath: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    sha256: Optional[str] = None # Content hash; identical uploads share one blob (see app/storage.py)
+    size_bytes: Optional[int] = None
+
+    # Ingestion job state (see app/ingestion.py)
+    status: str = Field(default="PENDING") # PENDING, PROCESSING, COMPLETED, FAILED
+    pages_total: int = Field(default=0)
+    pages_done: int = Field(default=0) # Checkpoint: pages fully embedded & upserted
+    chunks_indexed: int = Field(default=0)
+    chunks_embedded: int = Field(default=0) # Last run only: new/changed chunks sent to the embedder
+    chunks_deleted: int = Field(default=0) # Last run only: vanished chunks removed from the vector store
+    error: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None # Bumped at every checkpoint while PROCESSING (see app/jobs.py)
     
     user_id: int = Field(foreign_key="user.id")
     user: Optional[User] = Relationship(back_populates="uploads")
 
+# Manifest of what is indexed for each file, used to diff re-uploads page by page
+class DocumentChunk(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_id: int = Field(foreign_key="uploadedfile.id", index=True)
+    page_number: int
+    page_hash: str
+    chunk_hash: str
+    vector_id: str = Field(index=True) # "file-{file_id}-{chunk_hash[:32]}", content-addressed so unchanged chunks keep their vector
+    content: str
+
 # Alerts for the Dashboard
 class Alert(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_alert_user_id_created_at", "user_id", "created_at"),
+        Index("ix_alert_user_id_id", "user_id", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     type: str # "Sentiment", "Stock", "System"
     message: str
@@ -77,6 +170,8 @@ class Alert(SQLModel, table=True):
 
 # --- NEW: BUSINESS KNOWLEDGE MODEL (Fixes your Error) ---
 class BusinessInfo(SQLModel, table=True):
+    __table_args__ = (Index("ix_businessinfo_user_id_id", "user_id", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     category: str  # "Product", "Service", "Policy"
     topic: str     # "Rice", "Delivery", "Opening Hours"
@@ -84,4 +179,37 @@ class BusinessInfo(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     user_id: int = Field(foreign_key="user.id")
-    user: Optional[User] = Relationship(back_populates="knowledge")
\ No newline at end of file
+    user: Optional[User] = Relationship(back_populates="knowledge")
+
+# Background account deletion (see app/account_deletion.py).
+# No FK to user: the job row outlives the account so clients can poll it to completion.
+class AccountDeletionJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True)
+    status: str = Field(default="PENDING") # PENDING, PROCESSING, COMPLETED, FAILED
+    step: str = Field(default="queued") # queued, vectors, files, rows:<table>, archives, done
+    steps_done: int = Field(default=0)
+    steps_total: int = Field(default=0)
+    rows_deleted: int = Field(default=0)
+    files_removed: int = Field(default=0)
+    error: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None # Bumped at every step while PROCESSING (see app/jobs.py)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+# Persistent state of the in-process job scheduler (see app/scheduler.py), one row per job
+class ScheduledJobRun(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    last_started_at: Optional[datetime] = None # Claimed with a conditional UPDATE, so one worker runs each slot
+    last_finished_at: Optional[datetime] = None
+    last_status: Optional[str] = None # COMPLETED, FAILED
+    last_error: Optional[str] = None
+    last_result: Optional[str] = None
+
+# Applied schema migrations (see app/migrations.py)
+class SchemaMigration(SQLModel, table=True):
+    __tablename__ = "schema_migrations"
+
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
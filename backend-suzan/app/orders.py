@@ -0,0 +1,181 @@
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from .config import settings
+from .db import engine
+from .models import InventoryItem, OrderQuote, SalesLedger
+from .rollups import change_sale_status, record_sale
+from .stock_alerts import check_low_stock
+from .tenants import normalize_phone
+
+# --- CUSTOMER ORDERS ---
+# Stock is reserved the moment an order is placed, with one conditional statement:
+#   UPDATE inventoryitem SET stock = stock - :q WHERE id = :id AND stock >= :q
+# The database applies it atomically per row, so two customers racing for the last unit
+# cannot both win (one UPDATE matches 0 rows) and no table lock is needed.
+#
+# A PENDING order holds its stock until expires_at (ORDER_HOLD_MINUTES). The owner confirms
+# (COMPLETED) or cancels it; otherwise expire_pending_orders() marks it EXPIRED and puts the
+# stock back (app/scheduler.py runs it every minute). Every status change is itself
+# conditional on the current status (rollups.change_sale_status), so a sweep, a
+# confirmation and a cancellation racing on the same order release stock at most once.
+#
+# The customer agent records what it quoted (save_quote) and the "Yes, Order" button orders
+# exactly that (place_quoted_order); a quote is consumed by a conditional DELETE, so a
+# double tap places one order.
+#
+# Usage: python -m app.orders  (expire overdue orders once)
+
+QUOTE_TTL_MINUTES = 60
+EXPIRY_BATCH_SIZE = 500
+
+def customer_key(phone: str) -> str:
+    """Quotes are keyed by the canonical number, whatever format the model passes back."""
+    try:
+        return normalize_phone(phone)
+    except ValueError:
+        return str(phone or "").strip()
+
+# --- STOCK RESERVATION ---
+
+def reserve_stock(session: Session, item_id: int, quantity: int) -> bool:
+    """Takes `quantity` units if (and only if) they are all available. Caller commits."""
+    result = session.exec(
+        update(InventoryItem)
+        .where(InventoryItem.id == item_id, InventoryItem.stock >= quantity)
+        .values(stock=InventoryItem.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def release_stock(session: Session, item_id: Optional[int], quantity: int):
+    if item_id is None:
+        return
+    session.exec(
+        update(InventoryItem)
+        .where(InventoryItem.id == item_id)
+        .values(stock=InventoryItem.stock + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+# --- ORDERS ---
+
+def place_order(session: Session, user_id: int, customer_phone: str, item: InventoryItem, quantity: int) -> Optional[SalesLedger]:
+    """Reserves stock and records a PENDING sale, or returns None if stock ran out. Caller commits."""
+    if quantity < 1 or not reserve_stock(session, item.id, quantity):
+        return None
+    check_low_stock(session, [item.id])
+
+    now = datetime.utcnow()
+    sale = SalesLedger(
+        transaction_id=str(uuid4()),
+        item_description=f"{quantity} x {item.name}",
+        amount=item.price * quantity,
+        customer_name=f"Customer {customer_phone}",
+        logged_by=customer_phone,
+        user_id=user_id,
+        status="PENDING",
+        timestamp=datetime.now(), # Local time, like every other ledger write (rollup days follow it)
+        inventory_item_id=item.id,
+        quantity=quantity,
+        expires_at=now + timedelta(minutes=settings.ORDER_HOLD_MINUTES),
+    )
+    session.add(sale)
+    record_sale(session, sale)
+    return sale
+
+def _transition(session: Session, sale: SalesLedger, new_status: str) -> bool:
+    """PENDING -> new_status, only if the order is still PENDING; releases the stock unless it sold. Caller commits."""
+    if not change_sale_status(session, sale, new_status, expected_status="PENDING"):
+        return False
+    if new_status != "COMPLETED":
+        release_stock(session, sale.inventory_item_id, sale.quantity)
+        check_low_stock(session, [sale.inventory_item_id])
+    return True
+
+def confirm_order(session: Session, sale: SalesLedger) -> bool:
+    """The reserved stock becomes a sale. False if the order is no longer pending."""
+    return _transition(session, sale, "COMPLETED")
+
+def cancel_order(session: Session, sale: SalesLedger) -> bool:
+    return _transition(session, sale, "CANCELLED")
+
+def expire_pending_orders(now: datetime = None) -> int:
+    """Expires overdue PENDING orders and releases their stock. Returns how many."""
+    now = now or datetime.utcnow()
+    expired = 0
+    with Session(engine) as session:
+        while True:
+            overdue = session.exec(
+                select(SalesLedger)
+                .where(SalesLedger.status == "PENDING", SalesLedger.expires_at < now)
+                .order_by(SalesLedger.expires_at)
+                .limit(EXPIRY_BATCH_SIZE)
+            ).all()
+            if not overdue:
+                break
+            expired += sum(_transition(session, sale, "EXPIRED") for sale in overdue)
+            session.commit()
+            session.expunge_all() # re-select: rows taken by a concurrent confirm are skipped
+    if expired:
+        print(f"⌛ Expired {expired} unconfirmed orders and released their stock.")
+    return expired
+
+# --- QUOTES ---
+
+def _upsert(dialect: str):
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+def save_quote(session: Session, user_id: int, customer_phone: str, item: InventoryItem, quantity: int):
+    """Remembers the customer's current quote, replacing any earlier one. Caller commits."""
+    now = datetime.utcnow()
+    values = dict(
+        inventory_item_id=item.id, item_name=item.name, quantity=quantity, unit_price=item.price,
+        created_at=now, expires_at=now + timedelta(minutes=QUOTE_TTL_MINUTES),
+    )
+    stmt = _upsert(session.get_bind().dialect.name)(OrderQuote).values(
+        user_id=user_id, customer_phone=customer_key(customer_phone), **values
+    )
+    session.exec(stmt.on_conflict_do_update(index_elements=["user_id", "customer_phone"], set_=values))
+
+def take_quote(session: Session, user_id: int, customer_phone: str) -> Optional[OrderQuote]:
+    """Removes and returns the customer's live quote; None if absent, expired or already taken."""
+    quote = session.exec(
+        select(OrderQuote).where(OrderQuote.user_id == user_id, OrderQuote.customer_phone == customer_key(customer_phone))
+    ).first()
+    if not quote:
+        return None
+    taken = session.exec(delete(OrderQuote).where(OrderQuote.id == quote.id, OrderQuote.created_at == quote.created_at))
+    if taken.rowcount != 1 or quote.expires_at < datetime.utcnow():
+        return None
+    return quote
+
+def place_quoted_order(user_id: int, customer_phone: str) -> tuple:
+    """
+    Orders what was last quoted to the customer. Returns (sale, message); sale is None
+    when there is nothing to order or the stock is gone.
+    """
+    with Session(engine) as session:
+        quote = take_quote(session, user_id, customer_phone)
+        if not quote:
+            session.commit()
+            return None, "I couldn't find a recent quote to order. Which item and how many would you like?"
+
+        item = session.get(InventoryItem, quote.inventory_item_id)
+        sale = place_order(session, user_id, customer_phone, item, quote.quantity) if item else None
+        session.commit()
+        if not sale:
+            return None, f"Sorry, {quote.item_name} is out of stock for {quote.quantity} unit(s)."
+        session.refresh(sale)
+        return sale, f"✅ Order placed: {sale.item_description} (₦{sale.amount:,.2f}). Waiting for confirmation."
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expire overdue pending orders and release their stock.")
+    parser.parse_args()
+    expire_pending_orders()
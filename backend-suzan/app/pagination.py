@@ -0,0 +1,37 @@
+from fastapi.responses import ORJSONResponse
+from sqlmodel import Session, select
+
+# --- KEYSET PAGINATION FOR LIST ENDPOINTS ---
+# Pages are read with `WHERE user_id = ? AND id < after_id ORDER BY id DESC LIMIT n` on a
+# (user_id, id) index, so every page costs the same no matter how deep the client scrolls.
+# Only the columns in the response are selected (no ORM objects), and the rows are
+# serialized with orjson.
+#
+# The body stays a plain JSON list; the cursor for the next page is sent in the
+# X-Next-After-Id header (absent on the last page). A request with neither `limit` nor
+# `after_id` still gets every row, as before pagination existed, so existing clients
+# aren't silently truncated; a client opts in by sending either parameter.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-After-Id"
+
+def fetch_page(session: Session, model, columns: list, user_id: int, after_id: int = None,
+               limit: int = None, newest_first: bool = True) -> tuple:
+    """Returns (rows as dicts, next after_id or None). `columns` must include model.id.
+    Without `limit` and `after_id` every row is returned (unpaginated)."""
+    stmt = select(*columns).where(model.user_id == user_id)
+    stmt = stmt.order_by(model.id.desc() if newest_first else model.id.asc())
+    if limit is None and after_id is None:
+        return [dict(row._mapping) for row in session.exec(stmt).all()], None
+
+    limit = max(1, min(DEFAULT_PAGE_SIZE if limit is None else limit, MAX_PAGE_SIZE))
+    if after_id is not None:
+        stmt = stmt.where(model.id < after_id if newest_first else model.id > after_id)
+    rows = [dict(row._mapping) for row in session.exec(stmt.limit(limit + 1)).all()]
+    next_after_id = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], next_after_id
+
+def page_response(rows: list, next_after_id: int = None) -> ORJSONResponse:
+    headers = {NEXT_CURSOR_HEADER: str(next_after_id)} if next_after_id is not None else None
+    return ORJSONResponse(content=rows, headers=headers)
@@ -1,10 +1,15 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
+import asyncio
+import hashlib
+from functools import lru_cache
+from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import StructuredTool
+from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_community.chat_message_histories import ChatMessageHistory
@@ -15,10 +20,14 @@ from langchain.docstore.document import Document # <--- Needed for Text Indexing
 
 from sqlmodel import Session, select
 from .db import engine
-from .models import InventoryItem, User, ChatLog
+from .models import InventoryItem, ChatLog
 from .config import settings
 from .prompts import CUSTOMER_SYSTEM_PROMPT
-from .tools import check_item_stock, submit_order_request, get_current_time
+from .tools import check_item_stock, quote_order, submit_order_request, get_current_time
+from .tenants import get_tenant_async, current_tenant, current_customer
+from .chat_logger import chat_logger, merge_pending
+from .metrics import timed, model_label, llm_callbacks
+from .retrieval import lexical_search, reciprocal_rank_fusion, invalidate_lexical_index
 
 # Ensure env vars are set
 if settings.PINECONE_API_KEY:
@@ -40,51 +49,139 @@ def get_session_history(session_id: str):
 
 def load_customer_history(customer_id: str, limit: int = 10):
     history = ChatMessageHistory()
-    with Session(engine) as session:
+    pending = chat_logger.pending_logs(sender=customer_id) # Not yet flushed by the write-behind logger
+    with timed("history_load"), Session(engine) as session:
         logs = session.exec(select(ChatLog).where(ChatLog.sender == customer_id).order_by(ChatLog.timestamp.desc()).limit(limit)).all()
-        for log in reversed(logs):
+        for log in reversed(merge_pending(logs, pending, limit)):
             history.add_user_message(log.message_text)
     return history
 
 # --- DOCUMENT PROCESSING (PDFs) ---
 
-def _process_document_sync(file_path: str, file_id: int):
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+# Chunks are embedded in batches of this size (per worker process when INGEST_WORKERS > 1)
+EMBED_BATCH_SIZE = 64
+UPSERT_BATCH_SIZE = 100
+INGEST_FLUSH_SIZE = EMBED_BATCH_SIZE * max(1, settings.INGEST_WORKERS)
+
+@lru_cache(maxsize=1)
+def get_pinecone_index():
+    """Shared Pinecone index handle (the client keeps its own connection pool)."""
+    pc = PineconeClient(api_key=settings.PINECONE_API_KEY)
+    return pc.Index(settings.PINECONE_INDEX_NAME)
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_vector_id(file_id: int, chunk_hash: str) -> str:
+    """Content-addressed id: an unchanged chunk keeps its vector across re-uploads."""
+    return f"file-{file_id}-{chunk_hash[:32]}"
+
+def count_pdf_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+def iter_pdf_pages(file_path: str, start_page: int = 0):
+    """
+    Yields (page_number, text) one page at a time.
+    Unlike PyPDFLoader.load(), only the current page's text is held in memory.
+    """
+    reader = PdfReader(file_path)
+    for page_number in range(start_page, len(reader.pages)):
+        yield page_number, reader.pages[page_number].extract_text() or ""
+
+def embed_texts(texts: list) -> list:
+    """Embeds in-process, or across the worker pool when INGEST_WORKERS > 1."""
+    if settings.INGEST_WORKERS > 1:
+        from .embedding_workers import get_embedding_pool
+        return get_embedding_pool(settings.INGEST_WORKERS).embed(texts).tolist()
+    return embeddings.embed_documents(texts)
+
+def embed_and_upsert(items: list, values: list = None):
     """
-    Synchronous worker for PDF processing.
-    We run this in a threadpool so it doesn't block the async event loop.
+    Embeds (vector_id, text, metadata) triples and upserts them to Pinecone in batches.
+    The chunk text is stored under metadata['text'] so PineconeVectorStore can read it back.
+    `values` skips the embedding step when the caller already has the vectors (same order).
+    """
+    if not items:
+        return 0
+    index = get_pinecone_index()
+    if values is None:
+        with timed("embed"):
+            values = embed_texts([text for _, text, _ in items])
+    for i in range(0, len(items), UPSERT_BATCH_SIZE):
+        with timed("vector_upsert"):
+            index.upsert(vectors=[
+                {"id": vector_id, "values": vector, "metadata": {**metadata, "text": text}}
+                for (vector_id, text, metadata), vector in zip(items[i : i + UPSERT_BATCH_SIZE], values[i : i + UPSERT_BATCH_SIZE])
+            ])
+    return len(items)
+
+def copy_vectors(id_pairs: list, metadata: dict) -> int:
+    """
+    Copies existing vectors to new ids without re-embedding: (source_id, target_id) pairs,
+    with `metadata` (file_id, user_id, ...) overriding the source's. Returns how many copied;
+    fewer than requested means some sources were missing.
+    """
+    index = get_pinecone_index()
+    copied = 0
+    for i in range(0, len(id_pairs), UPSERT_BATCH_SIZE):
+        batch = id_pairs[i : i + UPSERT_BATCH_SIZE]
+        found = index.fetch(ids=[source for source, _ in batch]).vectors
+        vectors = [
+            {"id": target, "values": found[source].values, "metadata": {**(found[source].metadata or {}), **metadata}}
+            for source, target in batch if source in found
+        ]
+        if vectors:
+            index.upsert(vectors=vectors)
+        copied += len(vectors)
+    return copied
+
+def delete_vectors(vector_ids: list, batch_size: int = 1000):
+    """Deletes vectors by id (Pinecone caps ids per delete call)."""
+    vector_ids = list(vector_ids)
+    if not vector_ids:
+        return 0
+    index = get_pinecone_index()
+    for i in range(0, len(vector_ids), batch_size):
+        index.delete(ids=vector_ids[i : i + batch_size])
+    return len(vector_ids)
+
+def _process_document_sync(file_path: str, file_id: int, user_id: int = None):
+    """
+    Synchronous worker for PDF processing, run in a threadpool so it doesn't block the event loop.
+    Streams: page iterator -> splitter -> batched embed -> batched upsert.
+
+    Vector ids are derived from the chunk content, so re-running a file overwrites the same
+    vectors instead of duplicating them.
+
+    This indexes every page unconditionally; background jobs use app.ingestion, which
+    diffs against the stored chunk manifest first.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    # 1. Load PDF
-    loader = PyPDFLoader(file_path)
-    docs = loader.load()
+    metadata = {"file_id": file_id, "source": "pdf_upload"}
+    if user_id is not None:
+        metadata["user_id"] = user_id
 
-    for doc in docs:
-        doc.metadata["file_id"] = file_id
-        doc.metadata["source"] = "pdf_upload"
+    buffer = []
+    total = 0
 
-    # 2. Split Text
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
+    print(f"🌲 Streaming {file_path} into Pinecone...")
+    for _, text in iter_pdf_pages(file_path):
+        for chunk in text_splitter.split_text(text):
+            buffer.append((chunk_vector_id(file_id, content_hash(chunk)), chunk, metadata))
+        if len(buffer) >= INGEST_FLUSH_SIZE:
+            total += embed_and_upsert(buffer)
+            buffer = []
 
-    # 3. Upload to Pinecone in Batches
-    batch_size = 50
-    print(f"🌲 Processing {len(splits)} vectors for Pinecone...")
-    
-    for i in range(0, len(splits), batch_size):
-        batch = splits[i : i + batch_size]
-        PineconeVectorStore.from_documents(
-            documents=batch,
-            embedding=embeddings,
-            index_name=settings.PINECONE_INDEX_NAME
-        )
-    
-    return len(splits)
+    total += embed_and_upsert(buffer)
+    return total
 
-async def process_document(file_path: str, file_id: int):
+async def process_document(file_path: str, file_id: int, user_id: int = None):
     """Async wrapper that pushes heavy PDF work to a background thread."""
-    return await run_in_threadpool(_process_document_sync, file_path, file_id)
+    return await run_in_threadpool(_process_document_sync, file_path, file_id, user_id)
 
 async def delete_document_vectors(file_id: int):
     """Deletes vectors associated with a specific PDF file."""
@@ -99,6 +196,16 @@ async def delete_document_vectors(file_id: int):
         print(f"Error deleting from Pinecone: {e}")
         # Log error but don't crash flow
 
+def delete_tenant_vectors(user_id: int, file_ids: list = ()):
+    """
+    Deletes every vector a tenant owns with one metadata-filter delete.
+    PDF vectors indexed before chunks carried user_id are matched by their file ids.
+    """
+    index = get_pinecone_index()
+    index.delete(filter={"user_id": {"$eq": user_id}})
+    if file_ids:
+        index.delete(filter={"file_id": {"$in": list(file_ids)}})
+
 # --- NEW: KNOWLEDGE BASE INDEXING (VOICE/TEXT) ---
 
 async def process_raw_text(text: str, user_id: int):
@@ -118,38 +225,43 @@ async def process_raw_text(text: str, user_id: int):
     await run_in_threadpool(_upload_sync)
     return len(splits)
 
+def business_row_vector_id(row_id: int) -> str:
+    return f"row-{row_id}"
+
+async def index_business_rows(rows: list, user_id: int, vectors: list = None):
+    """
+    Indexes many BusinessInfo rows at once: one embedding batch and one Pinecone upsert
+    for the whole list instead of a splitter run + round trip per fact.
+    `rows` is a list of (row_id, text); `vectors`, if given, are their embeddings (from
+    embed_texts). Vectors are keyed "row-{row_id}" so they can be deleted or reconciled by id later.
+    """
+    items = [
+        (business_row_vector_id(row_id), text, {
+            "row_id": row_id,       # <--- CRITICAL: Links to SQL Table
+            "user_id": user_id,
+            "source": "business_info"
+        })
+        for row_id, text in rows
+    ]
+    count = await run_in_threadpool(embed_and_upsert, items, vectors)
+    invalidate_lexical_index(user_id)
+    return count
+
 async def index_business_row(text: str, row_id: int, user_id: int):
     """
     Indexes a specific Fact/Row from the SQL table into Pinecone.
     We tag it with 'row_id' so we can find and delete it later.
     """
-    doc = Document(
-        page_content=text, 
-        metadata={
-            "row_id": row_id,       # <--- CRITICAL: Links to SQL Table
-            "user_id": user_id, 
-            "source": "business_info" 
-        }
-    )
-    
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents([doc])
-    
-    def _upload_sync():
-        PineconeVectorStore.from_documents(
-            documents=splits,
-            embedding=embeddings,
-            index_name=settings.PINECONE_INDEX_NAME
-        )
-    await run_in_threadpool(_upload_sync)
+    return await index_business_rows([(row_id, text)], user_id)
 
 async def delete_business_row_vectors(row_id: int):
     """
     Deletes vectors from Pinecone based on the SQL row_id.
+    Rows indexed before vectors were keyed by id are matched by metadata instead.
     """
     def _delete_sync():
-        pc = PineconeClient(api_key=settings.PINECONE_API_KEY)
-        index = pc.Index(settings.PINECONE_INDEX_NAME)
+        index = get_pinecone_index()
+        index.delete(ids=[business_row_vector_id(row_id)])
         index.delete(filter={"row_id": {"$eq": row_id}})
     
     try:
@@ -158,6 +270,60 @@ async def delete_business_row_vectors(row_id: int):
     except Exception as e:
         print(f"❌ Error deleting vectors: {e}")
 
+# --- HYBRID RETRIEVAL (BM25 + VECTOR) ---
+
+class SearchKnowledgeInput(BaseModel):
+    query: str = Field(description="What to look up, e.g. 'delivery to Ikeja', 'rice 50kg price', 'return policy'")
+
+def _vector_search_sync(query: str, user_id: int, k: int):
+    vectorstore = PineconeVectorStore(index_name=settings.PINECONE_INDEX_NAME, embedding=embeddings)
+    with timed("embed"):
+        vector = embeddings.embed_query(query)
+    with timed("vector_search"):
+        docs = vectorstore.similarity_search_by_vector_with_score(vector, k=k, filter={"user_id": user_id})
+    return [doc.page_content for doc, _ in docs]
+
+async def hybrid_search(query: str, user_id: int, k: int = 5):
+    """
+    Runs BM25 and vector search concurrently and fuses them with reciprocal-rank fusion.
+    Either side failing (e.g. Pinecone down) degrades to the other instead of erroring.
+    """
+    lexical, vector = await asyncio.gather(
+        run_in_threadpool(lexical_search, user_id, query, k * 2),
+        run_in_threadpool(_vector_search_sync, query, user_id, k * 2),
+        return_exceptions=True,
+    )
+    ranked_lists = []
+    for name, result in (("lexical", lexical), ("vector", vector)):
+        if isinstance(result, Exception):
+            print(f"⚠️ {name} retrieval failed: {result}")
+        else:
+            ranked_lists.append(result)
+    return reciprocal_rank_fusion(ranked_lists)[:k]
+
+def format_knowledge(texts: list) -> str:
+    if not texts:
+        return "No matching information in the knowledge base."
+    return "\n".join(f"- {text}" for text in texts)
+
+def make_search_knowledge_base_tool(user_id: int, results_cache: dict):
+    """
+    Builds the per-turn `search_knowledge_base` tool. `results_cache` maps query -> texts
+    and is pre-seeded with the prefetched results for the customer's message.
+    """
+    async def search_knowledge_base(query: str):
+        key = query.strip().lower()
+        if key not in results_cache:
+            results_cache[key] = await hybrid_search(query, user_id)
+        return format_knowledge(results_cache[key])
+
+    return StructuredTool.from_function(
+        coroutine=search_knowledge_base,
+        name="search_knowledge_base",
+        description="Searches the business's uploaded documents and taught facts (prices, policies, delivery, opening hours, product details).",
+        args_schema=SearchKnowledgeInput,
+    )
+
 # --- RAG ANSWER GENERATION ---
 
 @traceable
@@ -165,17 +331,13 @@ async def answer_from_rag(question: str, user_id: int = None, customer_phone: st
     """
     Runs the Customer Agent (Tool Calling).
     """
-    # Re-fetch user in a new session to avoid DetachedInstanceError
-    if user_id:
-        with Session(engine) as session:
-            user = session.get(User, user_id)
-            bot_name = user.bot_name if user else "Suzan"
-            business_name = user.business_name if user else "this business"
-            user_phone = user.phone_number if user else None
-    else:
-        bot_name = "Suzan"
-        business_name = "this business"
-        user_phone = None
+    # Retrieval for the incoming message starts now and overlaps with the DB work below
+    retrieval_task = asyncio.create_task(hybrid_search(question, user_id)) if user_id else None
+
+    user = await get_tenant_async(user_id) if user_id else None
+    bot_name = user.bot_name if user else "Suzan"
+    business_name = user.business_name if user else "this business"
+    user_phone = user.phone_number if user else None
 
     llm = ChatGroq(
         temperature=0,
@@ -183,24 +345,29 @@ async def answer_from_rag(question: str, user_id: int = None, customer_phone: st
         groq_api_key=settings.GROQ_API_KEY
     )
 
-    # Note: We configure the Retriever to filter by User ID to prevent data leaks
-    vectorstore = PineconeVectorStore(
-        index_name=settings.PINECONE_INDEX_NAME, 
-        embedding=embeddings
-    )
-    retriever = vectorstore.as_retriever(
-        search_kwargs={"filter": {"user_id": user_id}} if user_id else {}
-    )
+    session_history = await run_in_threadpool(load_customer_history, customer_phone)
+    store[customer_phone] = session_history
+
+    results_cache = {}
+    if retrieval_task:
+        try:
+            results_cache[question.strip().lower()] = await retrieval_task
+        except Exception as e:
+            print(f"⚠️ Knowledge prefetch failed: {e}")
+    knowledge_context = format_knowledge(results_cache.get(question.strip().lower(), []))
 
     # Customer Tools
-    tools = [check_item_stock, submit_order_request, get_current_time]
-    # You could also add a 'search_knowledge_base' tool using the retriever here if needed
-    
+    tools = [check_item_stock, quote_order, submit_order_request, get_current_time]
+    if user_id:
+        # The retriever is always scoped to this business's user_id to prevent data leaks
+        tools.append(make_search_knowledge_base_tool(user_id, results_cache))
+
     prompt = ChatPromptTemplate.from_messages([
         ("system", CUSTOMER_SYSTEM_PROMPT),
         ("system", "IMPORTANT: Check 'check_item_stock' for prices."),
+        ("system", "For policies, delivery, opening hours or details from the business's documents, use 'search_knowledge_base'."),
+        ("system", "Knowledge base results for the customer's latest message:\n{knowledge_context}"),
         ("system", "The business owner's phone number is: {user_phone}. Pass this to tools if needed."),
-        ("system", "Your customer's phone number is: {customer_phone}. Pass this to tools if needed."),
         ("placeholder", "{chat_history}"),
         ("human", "{input}"),
         ("placeholder", "{agent_scratchpad}"),
@@ -209,9 +376,6 @@ async def answer_from_rag(question: str, user_id: int = None, customer_phone: st
     agent = create_tool_calling_agent(llm, tools, prompt)
     agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
 
-    session_history = load_customer_history(customer_phone)
-    store[customer_phone] = session_history
-
     agent_with_chat_history = RunnableWithMessageHistory(
         agent_executor,
         get_session_history,
@@ -219,15 +383,22 @@ async def answer_from_rag(question: str, user_id: int = None, customer_phone: st
         history_messages_key="chat_history",
     )
 
-    response = await agent_with_chat_history.ainvoke(
-        {
-            "input": question,
-            "bot_name": bot_name,
-            "business_name": business_name,
-            "user_phone": user_phone,
-            "customer_phone": customer_phone
-        },
-        config={"configurable": {"session_id": customer_phone}}
-    )
+    # Tools resolve the business and the customer from these, not from what the model passes
+    token, customer_token = current_tenant.set(user), current_customer.set(customer_phone)
+    try:
+        with model_label(llm.model_name):
+            response = await agent_with_chat_history.ainvoke(
+                {
+                    "input": question,
+                    "bot_name": bot_name,
+                    "business_name": business_name,
+                    "user_phone": user_phone,
+                    "knowledge_context": knowledge_context
+                },
+                config={"configurable": {"session_id": customer_phone}, "callbacks": llm_callbacks}
+            )
+    finally:
+        current_tenant.reset(token)
+        current_customer.reset(customer_token)
 
-    return response["output"]
\ No newline at end of file
+    return response["output"]
@@ -0,0 +1,203 @@
+import argparse
+import json
+
+from sqlmodel import Session, select
+
+from .db import engine
+from .ingestion import UNFINISHED_STATUSES
+from .models import BusinessInfo, DocumentChunk, UploadedFile
+from .rag_engine import get_pinecone_index, embed_and_upsert, delete_vectors, business_row_vector_id
+from .retrieval import business_row_text, invalidate_lexical_index
+
+# --- SQL <-> VECTOR STORE RECONCILIATION ---
+# Finds drift between SQL and Pinecone in both directions, one page at a time so memory
+# stays flat no matter how big the index is:
+#   1. Orphans: vectors whose BusinessInfo row / DocumentChunk manifest entry is gone
+#      (deleted knowledge rows, deleted accounts, interrupted re-indexes). Deleted by id.
+#   2. Missing: SQL rows whose vector doesn't exist (failed upserts). Re-indexed from SQL,
+#      which already holds the fact text / chunk content, so no PDF is re-parsed.
+# Vectors written before ids were structured ("row-{id}" / "file-{id}-{hash}") are
+# classified by their row_id / file_id metadata instead. A live legacy vector is replaced,
+# not kept next to its successor: a fact's is deleted once "row-{id}" exists, a file's once
+# the file has been re-indexed (it has a DocumentChunk manifest).
+#
+# Chunk vectors of a file that is still being ingested are left alone: a job upserts a
+# batch before it commits the batch's manifest rows, so they look orphaned for a moment.
+#
+# Pinecone's list endpoint only exists on serverless indexes. The scheduler runs a pass
+# daily (job "vector_reconcile").
+#
+# Usage: python -m app.reconcile [--dry-run]
+
+PAGE_SIZE = 100
+
+def iter_vector_id_pages(prefix: str = None):
+    index = get_pinecone_index()
+    token = None
+    while True:
+        kwargs = {"limit": PAGE_SIZE}
+        if prefix:
+            kwargs["prefix"] = prefix
+        if token:
+            kwargs["pagination_token"] = token
+        page = index.list_paginated(**kwargs)
+        ids = [v.id for v in page.vectors]
+        if ids:
+            yield ids
+        token = page.pagination.next if page.pagination else None
+        if not token:
+            break
+
+def _fetch_existing_ids(ids: list) -> set:
+    if not ids:
+        return set()
+    return set(get_pinecone_index().fetch(ids=ids).vectors.keys())
+
+def _parse_row_id(vector_id: str):
+    try:
+        return int(vector_id.split("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def _find_orphans(session: Session, ids: list) -> dict:
+    """
+    Classifies one page of vector ids: {"rows": [...], "chunks": [...], "legacy": [...],
+    "legacy_rows": {row_id: [vector_id, ...]}} where legacy_rows are live facts' legacy vectors.
+    """
+    orphans = {"rows": [], "chunks": [], "legacy": [], "legacy_rows": {}}
+
+    row_ids = {vid: _parse_row_id(vid) for vid in ids if vid.startswith("row-")}
+    if row_ids:
+        live = set(session.exec(select(BusinessInfo.id).where(BusinessInfo.id.in_(
+            [rid for rid in row_ids.values() if rid is not None]
+        ))).all())
+        orphans["rows"] = [vid for vid, rid in row_ids.items() if rid not in live]
+
+    chunk_ids = [vid for vid in ids if vid.startswith("file-")]
+    if chunk_ids:
+        live = set(session.exec(select(DocumentChunk.vector_id).where(DocumentChunk.vector_id.in_(chunk_ids))).all())
+        file_ids = {vid: _parse_row_id(vid.rsplit("-", 1)[0]) for vid in chunk_ids}
+        in_flight = set(session.exec(select(UploadedFile.id).where(
+            UploadedFile.id.in_([fid for fid in file_ids.values() if fid is not None]),
+            UploadedFile.status.in_(UNFINISHED_STATUSES),
+        )).all())
+        orphans["chunks"] = [vid for vid in chunk_ids if vid not in live and file_ids[vid] not in in_flight]
+
+    legacy_ids = [vid for vid in ids if not vid.startswith(("row-", "file-"))]
+    if legacy_ids:
+        vectors = get_pinecone_index().fetch(ids=legacy_ids).vectors
+        metadata = {vid: (v.metadata or {}) for vid, v in vectors.items()}
+        row_refs = {vid: int(m["row_id"]) for vid, m in metadata.items() if "row_id" in m}
+        file_refs = {vid: int(m["file_id"]) for vid, m in metadata.items() if "file_id" in m}
+        live_rows = set(session.exec(select(BusinessInfo.id).where(BusinessInfo.id.in_(row_refs.values()))).all()) if row_refs else set()
+        live_files = set(session.exec(select(UploadedFile.id).where(UploadedFile.id.in_(file_refs.values()))).all()) if file_refs else set()
+        reindexed_files = set(session.exec(
+            select(DocumentChunk.file_id).where(DocumentChunk.file_id.in_(live_files)).distinct()
+        ).all()) if live_files else set()
+        orphans["legacy"] = (
+            [vid for vid, rid in row_refs.items() if rid not in live_rows]
+            + [vid for vid, fid in file_refs.items() if fid not in live_files or fid in reindexed_files]
+        )
+        for vid, rid in row_refs.items():
+            if rid in live_rows:
+                orphans["legacy_rows"].setdefault(rid, []).append(vid)
+
+    return orphans
+
+def _reindex_missing_rows(session: Session, report: dict, dry_run: bool, legacy_rows: dict):
+    """Re-indexes rows without a "row-{id}" vector, then drops the legacy vectors it replaces."""
+    last_id = 0
+    while True:
+        rows = session.exec(
+            select(BusinessInfo.id, BusinessInfo.user_id, BusinessInfo.category, BusinessInfo.topic, BusinessInfo.details)
+            .where(BusinessInfo.id > last_id)
+            .order_by(BusinessInfo.id)
+            .limit(PAGE_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+
+        existing = _fetch_existing_ids([business_row_vector_id(r[0]) for r in rows])
+        missing = [r for r in rows if business_row_vector_id(r[0]) not in existing]
+        report["missing_rows"] += len(missing)
+        if missing and not dry_run:
+            embed_and_upsert([
+                (business_row_vector_id(row_id), business_row_text(category, topic, details),
+                 {"row_id": row_id, "user_id": user_id, "source": "business_info"})
+                for row_id, user_id, category, topic, details in missing
+            ])
+            for user_id in {r[1] for r in missing}:
+                invalidate_lexical_index(user_id)
+            report["reindexed"] += len(missing)
+
+        replaced = [vid for r in rows for vid in legacy_rows.get(r[0], [])]
+        report["replaced_legacy"] += len(replaced)
+        if replaced and not dry_run:
+            report["deleted"] += delete_vectors(replaced)
+
+def _reindex_missing_chunks(session: Session, report: dict, dry_run: bool):
+    last_id = 0
+    while True:
+        rows = session.exec(
+            select(DocumentChunk.id, DocumentChunk.vector_id, DocumentChunk.content, DocumentChunk.file_id, UploadedFile.user_id)
+            .join(UploadedFile, UploadedFile.id == DocumentChunk.file_id)
+            .where(DocumentChunk.id > last_id, UploadedFile.status == "COMPLETED")
+            .order_by(DocumentChunk.id)
+            .limit(PAGE_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+
+        existing = _fetch_existing_ids(list({r[1] for r in rows}))
+        missing = {}
+        for _, vector_id, content, file_id, user_id in rows:
+            if vector_id not in existing:
+                missing[vector_id] = (vector_id, content, {"file_id": file_id, "user_id": user_id, "source": "pdf_upload"})
+        report["missing_chunks"] += len(missing)
+        if missing and not dry_run:
+            embed_and_upsert(list(missing.values()))
+            report["reindexed"] += len(missing)
+
+def reconcile(dry_run: bool = False) -> dict:
+    """Runs a full reconciliation pass and returns drift counts."""
+    report = {
+        "vectors_scanned": 0,
+        "orphan_rows": 0,
+        "orphan_chunks": 0,
+        "orphan_legacy": 0,
+        "replaced_legacy": 0,
+        "missing_rows": 0,
+        "missing_chunks": 0,
+        "deleted": 0,
+        "reindexed": 0,
+        "dry_run": dry_run,
+    }
+
+    legacy_rows = {}
+    with Session(engine) as session:
+        # 1. Vector -> SQL: orphans
+        for ids in iter_vector_id_pages():
+            report["vectors_scanned"] += len(ids)
+            orphans = _find_orphans(session, ids)
+            report["orphan_rows"] += len(orphans["rows"])
+            report["orphan_chunks"] += len(orphans["chunks"])
+            report["orphan_legacy"] += len(orphans["legacy"])
+            for row_id, vector_ids in orphans["legacy_rows"].items():
+                legacy_rows.setdefault(row_id, []).extend(vector_ids)
+            if not dry_run:
+                report["deleted"] += delete_vectors(orphans["rows"] + orphans["chunks"] + orphans["legacy"])
+
+        # 2. SQL -> Vector: missing
+        _reindex_missing_rows(session, report, dry_run, legacy_rows)
+        _reindex_missing_chunks(session, report, dry_run)
+
+    print(f"🧹 Reconciliation: {report}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile SQL knowledge rows with the vector store.")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without deleting or re-indexing")
+    args = parser.parse_args()
+    print(json.dumps(reconcile(dry_run=args.dry_run), indent=2))
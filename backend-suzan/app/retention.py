@@ -0,0 +1,129 @@
+import argparse
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import orjson
+import zstandard
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from .config import settings
+from .db import engine
+from .models import ChatLog
+
+# --- CHATLOG RETENTION & ARCHIVAL ---
+# Conversations older than CHAT_RETENTION_DAYS move out of the hot chatlog table into
+# per-tenant monthly archives: {CHAT_ARCHIVE_DIR}/chatlog/{tenant}/{YYYY-MM}.ndjson.zst
+# ("tenant" is the user id, or "unassigned" for rows without one; customer-side rows were
+# logged that way before migration 0014 attributed them to the business).
+#
+# Each batch is appended as its own zstd frame (concatenated frames decode as one stream),
+# fsynced, and only then deleted from SQL, one batch per transaction. If a run dies between
+# the two steps, the next run archives those rows again; readers drop the duplicates by id.
+#
+# Usage: python -m app.retention [--days N] [--dry-run]
+
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_FIELDS = ["id", "conversation_id", "timestamp", "sender", "message_text", "media_url", "user_id"]
+ZSTD_LEVEL = 10
+
+def _tenant_dir(user_id) -> str:
+    return os.path.join(settings.CHAT_ARCHIVE_DIR, "chatlog", str(user_id) if user_id is not None else "unassigned")
+
+def archive_path(user_id, month: str) -> str:
+    return os.path.join(_tenant_dir(user_id), f"{month}.ndjson.zst")
+
+def _append_frame(path: str, rows: list):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+    frame = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    with open(path, "ab") as f:
+        f.write(frame)
+        f.flush()
+        os.fsync(f.fileno())
+
+def archive_old_chats(days: int = None, dry_run: bool = False) -> dict:
+    """Moves chat logs older than `days` into the archives. Returns counts."""
+    days = settings.CHAT_RETENTION_DAYS if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    columns = [getattr(ChatLog, field) for field in ARCHIVE_FIELDS]
+    archived, files = 0, set()
+
+    with Session(engine) as session:
+        last_id = 0
+        while True:
+            # Walk by id so each batch is an index range scan, not an OFFSET
+            rows = session.exec(
+                select(*columns)
+                .where(ChatLog.timestamp < cutoff, ChatLog.id > last_id)
+                .order_by(ChatLog.id)
+                .limit(ARCHIVE_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            by_file = {}
+            for row in rows:
+                record = dict(zip(ARCHIVE_FIELDS, row))
+                by_file.setdefault(archive_path(record["user_id"], record["timestamp"].strftime("%Y-%m")), []).append(record)
+            files.update(by_file)
+            archived += len(rows)
+            if dry_run:
+                continue
+
+            for path, records in by_file.items():
+                _append_frame(path, records)
+            session.exec(delete(ChatLog).where(ChatLog.id.in_([row.id for row in rows])))
+            session.commit()
+
+    verb = "Would archive" if dry_run else "Archived"
+    print(f"🗄️ {verb} {archived} chat logs older than {days} days into {len(files)} monthly archive(s).")
+    return {"archived": archived, "files": len(files), "cutoff": cutoff.isoformat()}
+
+def delete_chat_archives(user_id: int) -> int:
+    """Removes a tenant's archives (account deletion). Returns how many monthly files went."""
+    months = archive_months(user_id)
+    shutil.rmtree(_tenant_dir(user_id), ignore_errors=True)
+    return len(months)
+
+# --- READING ARCHIVES ---
+
+def archive_months(user_id) -> list:
+    """Archived months for a tenant, oldest first."""
+    directory = _tenant_dir(user_id)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[: -len(".ndjson.zst")] for name in os.listdir(directory) if name.endswith(".ndjson.zst"))
+
+def iter_archived_chats(user_id, batch_size: int = 1000):
+    """Yields lists of archived rows (dicts, timestamps as ISO strings), oldest month first, streaming."""
+    for month in archive_months(user_id):
+        seen, batch = set(), []
+        with open(archive_path(user_id, month), "rb") as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            buffer = b""
+            for chunk in iter(lambda: reader.read(1 << 16), b""):
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if not line:
+                        continue
+                    record = orjson.loads(line)
+                    if record["id"] in seen:
+                        continue # re-archived after an interrupted run
+                    seen.add(record["id"])
+                    batch.append(record)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        if batch:
+            yield batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old chat logs to compressed monthly files.")
+    parser.add_argument("--days", type=int, default=None, help=f"Retention in days (default {settings.CHAT_RETENTION_DAYS})")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would be archived without writing")
+    args = parser.parse_args()
+    archive_old_chats(args.days, args.dry_run)
@@ -0,0 +1,116 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlmodel import Session, select
+
+from .db import engine
+from .metrics import timed
+from .models import BusinessInfo, DocumentChunk, UploadedFile
+
+# --- LEXICAL (BM25) RETRIEVAL ---
+# Vector search misses exact product names, sizes and prices ("50kg", "N15,000"),
+# so the customer agent fuses it with a per-tenant BM25 index over the same texts
+# that are in Pinecone: PDF chunks (from the DocumentChunk manifest) and BusinessInfo rows.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Safety net on top of explicit invalidation
+LEXICAL_INDEX_TTL_SECONDS = 300
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(text.lower())
+
+def business_row_text(category: str, topic: str, details: str) -> str:
+    """Same text that index_business_row embeds, so both retrievers agree on document keys."""
+    return f"{category} - {topic}: {details}"
+
+class BM25Index:
+    """Okapi BM25 over an in-memory inverted index."""
+
+    def __init__(self, docs: list, k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.doc_len = []
+        self.postings = {} # term -> [(doc_index, term_frequency), ...]
+
+        for i, doc in enumerate(docs):
+            counts = Counter(tokenize(doc))
+            self.doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((i, tf))
+
+        n = len(docs)
+        self.avgdl = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Returns [(doc_text, score), ...] best first; only docs sharing a term are scored."""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[i] / (self.avgdl or 1.0))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.docs[i], score) for i, score in best]
+
+def reciprocal_rank_fusion(ranked_lists: list, k: int = 60) -> list:
+    """
+    Fuses ranked lists of document keys: score = sum(1 / (k + rank)).
+    Rank-based, so BM25 scores and cosine similarities never have to be calibrated.
+    """
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, key in enumerate(ranked, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return [key for key, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+# --- PER-TENANT INDEX CACHE ---
+
+_indexes = {} # user_id -> (built_at, BM25Index)
+_lock = threading.Lock()
+
+def _load_corpus(user_id: int) -> list:
+    with Session(engine) as session:
+        chunks = session.exec(
+            select(DocumentChunk.content)
+            .join(UploadedFile, UploadedFile.id == DocumentChunk.file_id)
+            .where(UploadedFile.user_id == user_id)
+        ).all()
+        facts = session.exec(
+            select(BusinessInfo.category, BusinessInfo.topic, BusinessInfo.details)
+            .where(BusinessInfo.user_id == user_id)
+        ).all()
+
+    texts = list(chunks) + [business_row_text(*fact) for fact in facts]
+    return list(dict.fromkeys(texts)) # Dedupe, keep order
+
+def get_lexical_index(user_id: int) -> BM25Index:
+    with _lock:
+        cached = _indexes.get(user_id)
+        if cached and time.monotonic() - cached[0] < LEXICAL_INDEX_TTL_SECONDS:
+            return cached[1]
+
+    index = BM25Index(_load_corpus(user_id))
+    with _lock:
+        _indexes[user_id] = (time.monotonic(), index)
+    return index
+
+def invalidate_lexical_index(user_id: int):
+    """Call after a tenant's chunks or BusinessInfo rows change."""
+    with _lock:
+        _indexes.pop(user_id, None)
+
+def lexical_search(user_id: int, query: str, k: int = 10) -> list:
+    with timed("lexical_search"):
+        return [text for text, _ in get_lexical_index(user_id).search(query, k)]
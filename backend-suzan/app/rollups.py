@@ -0,0 +1,137 @@
+import argparse
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, cast, delete, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from .dashboard import touch_dashboard
+from .models import DailySalesRollup, SalesLedger
+
+# --- DAILY SALES ROLLUPS ---
+# DailySalesRollup keeps one row of totals per (tenant, day, status). Every SalesLedger write
+# applies its delta in the same session/transaction, so analytics read a handful of
+# pre-aggregated rows instead of scanning the ledger.
+#
+# Rebuild from the ledger (after manual SQL edits, or to backfill): python -m app.rollups [--user-id N]
+
+def _upsert(dialect: str):
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+def apply_rollup_delta(session: Session, user_id: int, day: date, status: str, revenue: float, count: int):
+    """Adds revenue/count to one rollup row, creating it if needed (atomic upsert)."""
+    dialect = session.get_bind().dialect.name
+    stmt = _upsert(dialect)(DailySalesRollup).values(
+        user_id=user_id, day=day, status=status, revenue=revenue, count=count
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "day", "status"],
+        set_={
+            "revenue": DailySalesRollup.revenue + stmt.excluded.revenue,
+            "count": DailySalesRollup.count + stmt.excluded.count,
+        },
+    )
+    session.exec(stmt)
+    touch_dashboard(session, user_id)
+
+def record_sale(session: Session, sale: SalesLedger):
+    """Call when adding a SalesLedger row, before committing."""
+    apply_rollup_delta(session, sale.user_id, sale.timestamp.date(), sale.status, sale.amount or 0.0, 1)
+
+def change_sale_status(session: Session, sale: SalesLedger, new_status: str, expected_status: str = None) -> bool:
+    """
+    Moves a sale to `new_status` and its totals between rollup buckets, only if the row is
+    still in `expected_status` (default: the status `sale` was loaded with). The conditional
+    UPDATE makes racing changes apply once. Returns False if nothing changed. Caller commits.
+    """
+    old_status = expected_status or sale.status
+    if old_status == new_status:
+        return False
+    result = session.exec(
+        update(SalesLedger)
+        .where(SalesLedger.id == sale.id, SalesLedger.status == old_status)
+        .values(status=new_status, expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+
+    day, amount = sale.timestamp.date(), sale.amount or 0.0
+    apply_rollup_delta(session, sale.user_id, day, old_status, -amount, -1)
+    apply_rollup_delta(session, sale.user_id, day, new_status, amount, 1)
+    sale.status, sale.expires_at = new_status, None
+    return True
+
+# --- READS ---
+
+def resolve_period(period: str, today: date = None) -> tuple:
+    """
+    Maps an analytics period to an inclusive (start_day, end_day) range.
+    Accepts today, yesterday, week, month, quarter, year, or a custom
+    'YYYY-MM-DD to YYYY-MM-DD' range. Raises ValueError for anything else.
+    """
+    today = today or datetime.now().date()
+    rolling = {"today": 0, "week": 6, "month": 29, "quarter": 89, "year": 364}
+    key = period.strip().lower()
+
+    if key in rolling:
+        return today - timedelta(days=rolling[key]), today
+    if key == "yesterday":
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday
+
+    for separator in (" to ", ".."):
+        if separator in key:
+            start_text, end_text = (part.strip() for part in key.split(separator, 1))
+            start, end = date.fromisoformat(start_text), date.fromisoformat(end_text)
+            if start > end:
+                raise ValueError(f"Start date {start} is after end date {end}")
+            return start, end
+    raise ValueError(f"Unknown period '{period}'")
+
+def sales_totals(session: Session, user_id: int, start: date, end: date) -> dict:
+    """{status: (revenue, count)} for an inclusive day range."""
+    rows = session.exec(
+        select(DailySalesRollup.status, func.sum(DailySalesRollup.revenue), func.sum(DailySalesRollup.count))
+        .where(
+            DailySalesRollup.user_id == user_id,
+            DailySalesRollup.day >= start,
+            DailySalesRollup.day <= end,
+        )
+        .group_by(DailySalesRollup.status)
+    ).all()
+    return {status: (revenue or 0.0, count or 0) for status, revenue, count in rows}
+
+# --- BACKFILL ---
+
+def rebuild_rollups(conn: Connection, user_id: int = None) -> int:
+    """Recomputes rollup rows from SalesLedger (all tenants, or one). Returns rows written."""
+    # SQLite stores DATE as 'YYYY-MM-DD' text, which is what date() returns
+    day = func.date(SalesLedger.timestamp) if conn.dialect.name == "sqlite" else cast(SalesLedger.timestamp, Date)
+
+    clear = delete(DailySalesRollup)
+    totals = select(
+        SalesLedger.user_id,
+        day,
+        SalesLedger.status,
+        func.coalesce(func.sum(SalesLedger.amount), 0.0),
+        func.count(SalesLedger.id),
+    ).group_by(SalesLedger.user_id, day, SalesLedger.status)
+    if user_id is not None:
+        clear = clear.where(DailySalesRollup.user_id == user_id)
+        totals = totals.where(SalesLedger.user_id == user_id)
+
+    conn.execute(clear)
+    result = conn.execute(insert(DailySalesRollup).from_select(["user_id", "day", "status", "revenue", "count"], totals))
+    return result.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild daily sales rollups from the ledger.")
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this tenant")
+    args = parser.parse_args()
+
+    from .db import engine
+    with engine.begin() as conn:
+        written = rebuild_rollups(conn, args.user_id)
+    print(f"✅ Rebuilt {written} daily rollup row(s).")
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from .db import engine
+from .account_deletion import resume_account_deletions
+from .digest import send_daily_digests
+from .ingestion import resume_ingestion_jobs
+from .media import prune_media_cache
+from .models import ScheduledJobRun
+from .orders import expire_pending_orders
+from .reconcile import reconcile
+from .retention import archive_old_chats
+
+# --- IN-PROCESS JOB SCHEDULER ---
+# One asyncio loop per web worker checks the JOBS table every SCHEDULER_TICK_SECONDS. A job is
+# due when its last start is older than its interval; the run is claimed with a conditional
+# UPDATE on scheduledjobrun.last_started_at, so with several workers (or after a restart)
+# each slot runs exactly once. Job functions are plain sync functions run in the threadpool.
+# A run that never recorded its finish (process killed) is considered dead after STALE_RUN.
+#
+# Usage: python -m app.scheduler [job-name]  (runs a job now; no name lists the jobs)
+
+SCHEDULER_TICK_SECONDS = 30
+STALE_RUN = timedelta(hours=1)
+
+@dataclass(frozen=True)
+class ScheduledJob:
+    name: str
+    func: Callable
+    every: timedelta
+
+JOBS = [
+    ScheduledJob("order_expiry", expire_pending_orders, timedelta(minutes=1)),
+    ScheduledJob("daily_digest", send_daily_digests, timedelta(minutes=1)),
+    ScheduledJob("chat_retention", archive_old_chats, timedelta(days=1)),
+    ScheduledJob("media_cache", prune_media_cache, timedelta(hours=6)),
+    ScheduledJob("vector_reconcile", reconcile, timedelta(days=1)),
+    ScheduledJob("ingestion_resume", resume_ingestion_jobs, timedelta(minutes=5)),
+    ScheduledJob("account_deletion_resume", resume_account_deletions, timedelta(minutes=5)),
+]
+
+def _upsert(dialect: str):
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+def claim_run(session: Session, job: ScheduledJob, now: datetime) -> bool:
+    """Starts a run of `job` if it is due and not already running elsewhere. Commits."""
+    insert = _upsert(session.get_bind().dialect.name)
+    session.exec(insert(ScheduledJobRun).values(name=job.name).on_conflict_do_nothing(index_elements=["name"]))
+
+    Run = ScheduledJobRun
+    not_running = or_(
+        Run.last_finished_at >= Run.last_started_at, # previous run finished
+        Run.last_started_at <= now - STALE_RUN, # previous run died
+    )
+    result = session.exec(
+        update(Run)
+        .where(
+            Run.name == job.name,
+            or_(Run.last_started_at == None, and_(Run.last_started_at <= now - job.every, not_running)), # noqa: E711
+        )
+        .values(last_started_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+def _finish_run(name: str, status: str, result=None, error: str = None):
+    with Session(engine) as session:
+        run = session.get(ScheduledJobRun, name)
+        run.last_finished_at = datetime.utcnow()
+        run.last_status = status
+        run.last_result = None if result is None else str(result)[:500]
+        run.last_error = error
+        session.add(run)
+        session.commit()
+
+def run_job(job: ScheduledJob):
+    """Runs a claimed job and records the outcome (never raises)."""
+    try:
+        result = job.func()
+    except Exception as e:
+        print(f"❌ Scheduled job {job.name} failed: {e}")
+        _finish_run(job.name, "FAILED", error=str(e))
+    else:
+        _finish_run(job.name, "COMPLETED", result=result)
+
+def due_jobs(now: datetime = None) -> list:
+    now = now or datetime.utcnow()
+    with Session(engine) as session:
+        return [job for job in JOBS if claim_run(session, job, now)]
+
+async def run_scheduler(tick: float = SCHEDULER_TICK_SECONDS):
+    running = set() # keeps references to in-flight job tasks
+    while True:
+        try:
+            for job in await run_in_threadpool(due_jobs):
+                task = asyncio.create_task(run_in_threadpool(run_job, job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        except Exception as e:
+            print(f"❌ Scheduler tick failed: {e}")
+        await asyncio.sleep(tick)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a scheduled job now.")
+    parser.add_argument("job", nargs="?", choices=[job.name for job in JOBS])
+    args = parser.parse_args()
+    if not args.job:
+        for job in JOBS:
+            print(f"{job.name}: every {job.every}")
+    else:
+        job = next(job for job in JOBS if job.name == args.job)
+        with Session(engine) as session:
+            claim_run(session, job, datetime.utcnow()) # creates the job's row; a manual run goes ahead either way
+        run_job(job)
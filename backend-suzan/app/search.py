@@ -0,0 +1,142 @@
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlmodel import Session, select, or_
+
+from .models import InventoryItem, BusinessInfo
+
+# --- PRODUCT & KNOWLEDGE SEARCH ---
+# Replaces `ilike '%query%'` scans with an index that also tolerates plurals and typos
+# ("sneaker" -> "Sneakers", "snaekers" -> "Sneakers").
+#
+# SQLite: an FTS5 trigram table (catalog_search) kept in sync by triggers on inventoryitem
+#         and businessinfo (migration 0004). Rowids are id*2 for items and id*2+1 for facts,
+#         so triggers touch exactly one row. Candidates come from an OR of the query's
+#         trigrams scoped to the tenant, then get re-ranked by trigram similarity.
+# Postgres: pg_trgm GIN indexes on the source columns (always in sync), queried with the
+#         word-similarity operator `<%` and ranked by word_similarity().
+#
+# Both backends keep matches whose trigram similarity is >= SIMILARITY_THRESHOLD. `<%` cuts
+# off at pg_trgm.word_similarity_threshold (default 0.6, too strict for typos like
+# "snaekers"), so it is set to SIMILARITY_THRESHOLD for the query's transaction first.
+# Without the index (migrations not run) it falls back to ilike.
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+SIMILARITY_THRESHOLD = 0.3
+CANDIDATE_LIMIT = 50
+
+def trigrams(value: str) -> set:
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing."""
+    grams = set()
+    for word in WORD_RE.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def similarity(query: str, value: str) -> float:
+    """Share of the query's trigrams found in value (like pg_trgm's word_similarity)."""
+    query_grams = trigrams(query)
+    if not query_grams:
+        return 0.0
+    return len(query_grams & trigrams(value)) / len(query_grams)
+
+def _fts_match_expression(user_id: int, query: str):
+    # FTS5's trigram tokenizer doesn't pad, so candidates are fetched with in-word trigrams only
+    grams = sorted({w[i : i + 3] for w in WORD_RE.findall(query.lower()) for i in range(len(w) - 2)})
+    if not grams:
+        return None
+    body = " OR ".join(f'"{g}"' for g in grams)
+    return f'tenant : "#{user_id}#" AND body : ({body})'
+
+def _sqlite_candidates(session: Session, user_id: int, query: str, parity: int) -> list:
+    match = _fts_match_expression(user_id, query)
+    if match is None:
+        return []
+    rows = session.exec(
+        text(
+            "SELECT rowid, body FROM catalog_search "
+            "WHERE catalog_search MATCH :match AND rowid % 2 = :parity "
+            "ORDER BY rank LIMIT :limit"
+        ),
+        params={"match": match, "parity": parity, "limit": CANDIDATE_LIMIT},
+    ).all()
+    scored = [(rowid // 2, similarity(query, body)) for rowid, body in rows]
+    scored = [(ref_id, score) for ref_id, score in scored if score >= SIMILARITY_THRESHOLD]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return [ref_id for ref_id, _ in scored]
+
+def _postgres_candidates(session: Session, user_id: int, query: str, table: str, document_sql: str) -> list:
+    session.exec(
+        text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+        params={"threshold": str(SIMILARITY_THRESHOLD)},
+    )
+    rows = session.exec(
+        text(
+            f"SELECT id FROM {table} "
+            f"WHERE user_id = :user_id AND lower(:query) <% {document_sql} "
+            f"ORDER BY word_similarity(lower(:query), {document_sql}) DESC LIMIT :limit"
+        ),
+        params={"user_id": user_id, "query": query, "limit": CANDIDATE_LIMIT},
+    ).all()
+    return [row[0] for row in rows]
+
+def _load_in_order(session: Session, model, ids: list, limit: int) -> list:
+    ids = ids[:limit]
+    if not ids:
+        return []
+    by_id = {obj.id: obj for obj in session.exec(select(model).where(model.id.in_(ids))).all()}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _indexed_ids(session: Session, user_id: int, query: str, kind: str):
+    """Ranked ids from the search index, or None if the index can't serve this query."""
+    dialect = session.get_bind().dialect.name
+    try:
+        if dialect == "sqlite":
+            if not _fts_match_expression(user_id, query):
+                return None
+            return _sqlite_candidates(session, user_id, query, 0 if kind == "item" else 1)
+        if dialect == "postgresql":
+            if kind == "item":
+                return _postgres_candidates(session, user_id, query, "inventoryitem", "lower(name)")
+            return _postgres_candidates(session, user_id, query, "businessinfo", "lower(topic || ' ' || details)")
+    except (OperationalError, ProgrammingError) as e:
+        print(f"⚠️ Search index unavailable, falling back to ilike: {e}")
+        session.rollback()
+    return None
+
+def refresh_search_index(session: Session):
+    """Compacts the index after bulk writes (FTS5 merge on SQLite, fresh planner stats on Postgres)."""
+    dialect = session.get_bind().dialect.name
+    try:
+        if dialect == "sqlite":
+            session.exec(text("INSERT INTO catalog_search(catalog_search) VALUES ('optimize')"))
+        elif dialect == "postgresql":
+            session.exec(text("ANALYZE inventoryitem"))
+        session.commit()
+    except (OperationalError, ProgrammingError) as e:
+        print(f"⚠️ Search index refresh skipped: {e}")
+        session.rollback()
+
+def search_inventory(session: Session, user_id: int, query: str, limit: int = 10) -> list:
+    """Ranked, typo-tolerant InventoryItem lookup for one tenant."""
+    ids = _indexed_ids(session, user_id, query, "item")
+    if ids is not None:
+        return _load_in_order(session, InventoryItem, ids, limit)
+    return session.exec(select(InventoryItem).where(
+        InventoryItem.user_id == user_id,
+        InventoryItem.name.ilike(f"%{query}%")
+    ).limit(limit)).all()
+
+def search_knowledge(session: Session, user_id: int, query: str, limit: int = 10) -> list:
+    """Ranked, typo-tolerant BusinessInfo lookup (topic + details) for one tenant."""
+    ids = _indexed_ids(session, user_id, query, "fact")
+    if ids is not None:
+        return _load_in_order(session, BusinessInfo, ids, limit)
+    return session.exec(select(BusinessInfo).where(
+        BusinessInfo.user_id == user_id,
+        or_(
+            BusinessInfo.topic.ilike(f"%{query}%"),
+            BusinessInfo.details.ilike(f"%{query}%")
+        )
+    ).limit(limit)).all()
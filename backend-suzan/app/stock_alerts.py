@@ -0,0 +1,80 @@
+from sqlalchemy import event, update
+from sqlmodel import Session
+
+from .config import settings
+from .dashboard import touch_dashboard
+from .models import Alert, InventoryItem
+from .tenants import get_tenant
+from .whatsapp import send_whatsapp
+
+# --- LOW-STOCK ALERTS ---
+# Called by every code path that changes InventoryItem.stock, with the ids it touched, in the
+# same transaction (no periodic inventory scan). An item raises one "Stock" Alert when it
+# drops to or below its low_stock_threshold; low_stock_alerted then suppresses repeats until
+# it is restocked above the threshold. Claiming the flag is a single conditional UPDATE, so
+# concurrent orders for the same item still produce one alert.
+#
+# With LOW_STOCK_WHATSAPP enabled, the owner is also messaged, but only once the transaction
+# that raised the alert has committed.
+
+PENDING_KEY = "low_stock_alerts" # session.info key: alerts to send after commit
+
+def check_low_stock(session: Session, item_ids) -> list:
+    """Raises alerts for items that just went low and re-arms restocked ones. Caller commits."""
+    item_ids = sorted({i for i in item_ids if i is not None})
+    if not item_ids:
+        return []
+
+    went_low = session.exec(
+        update(InventoryItem)
+        .where(
+            InventoryItem.id.in_(item_ids),
+            InventoryItem.stock <= InventoryItem.low_stock_threshold,
+            InventoryItem.low_stock_alerted == False, # noqa: E712 - SQL expression
+        )
+        .values(low_stock_alerted=True)
+        .returning(InventoryItem.user_id, InventoryItem.name, InventoryItem.stock)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    restocked = session.exec(
+        update(InventoryItem)
+        .where(
+            InventoryItem.id.in_(item_ids),
+            InventoryItem.stock > InventoryItem.low_stock_threshold,
+            InventoryItem.low_stock_alerted == True, # noqa: E712
+        )
+        .values(low_stock_alerted=False)
+        .returning(InventoryItem.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    # The flag flips exactly when an item enters/leaves the dashboard's low-stock count
+    for user_id in {row[0] for row in went_low} | set(restocked):
+        touch_dashboard(session, user_id)
+
+    alerts = [
+        Alert(type="Stock", user_id=user_id,
+              message=f"Out of stock: {name}" if stock <= 0 else f"Low stock: {name} has {stock} left")
+        for user_id, name, stock in went_low
+    ]
+    session.add_all(alerts)
+    if alerts and settings.LOW_STOCK_WHATSAPP:
+        session.info.setdefault(PENDING_KEY, []).extend((a.user_id, a.message) for a in alerts)
+    return alerts
+
+# --- OWNER NOTIFICATIONS ---
+
+@event.listens_for(Session, "after_commit")
+def _send_pending_alerts(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    for user_id, message in pending:
+        owner = get_tenant(user_id)
+        if owner:
+            send_whatsapp(owner.phone_number, f"⚠️ {message}")
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_alerts(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from uuid import uuid4
+
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .db import engine
+from .models import UploadedFile
+
+# --- CONTENT-ADDRESSED UPLOAD STORAGE ---
+# Uploads are copied off the request in UPLOAD_CHUNK_SIZE pieces on a worker thread (never
+# the whole file in memory, never on the event loop), hashed while they stream, and stored
+# once per content under {UPLOAD_DIR}/blobs/{sha[:2]}/{sha}{ext}. Identical uploads, from any
+# tenant, share one blob; UploadedFile.sha256 lets ingestion clone an existing index instead
+# of re-embedding (see app/ingestion.py).
+#
+# A blob can back several UploadedFile rows, so it is only removed from disk once no row
+# points at it any more (release_blob). Files stored before this layout keep their paths.
+
+UPLOAD_DIR = settings.UPLOAD_DIR
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+TMP_DIR = os.path.join(UPLOAD_DIR, "tmp")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+BLOB_GRACE_SECONDS = 300 # a blob just stored/reused may not have its UploadedFile row committed yet
+
+class UploadTooLarge(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class StoredFile:
+    path: str
+    sha256: str
+    size: int
+    deduplicated: bool # the content was already stored
+
+def blob_path(sha256: str, ext: str = "") -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], f"{sha256}{ext}")
+
+def write_stream(fileobj, path: str, max_bytes: int = None) -> tuple:
+    """
+    Copies a binary stream to `path` chunk by chunk, hashing as it goes. Sync.
+    Returns (sha256, size); raises UploadTooLarge past max_bytes (the partial file is left to the caller).
+    """
+    max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    digest, size = hashlib.sha256(), 0
+    with open(path, "wb") as out:
+        for chunk in iter(lambda: fileobj.read(UPLOAD_CHUNK_SIZE), b""):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File is larger than {max_bytes // (1024 * 1024)} MB")
+            digest.update(chunk)
+            out.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    return digest.hexdigest(), size
+
+def temp_path(suffix: str = "") -> str:
+    """A fresh path under the upload tmp dir (same filesystem as the blobs, so moves are atomic)."""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    return os.path.join(TMP_DIR, uuid4().hex + suffix)
+
+def store_stream(fileobj, filename: str = "", max_bytes: int = None) -> StoredFile:
+    """Copies a binary stream into the blob store. Sync; raises UploadTooLarge past max_bytes."""
+    tmp_path = temp_path()
+    try:
+        sha256, size = write_stream(fileobj, tmp_path, max_bytes)
+        path = blob_path(sha256, os.path.splitext(filename)[1].lower())
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path) # restarts the grace period, see release_blob
+            return StoredFile(path, sha256, size, deduplicated=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path) # atomic: readers never see a half-written blob
+        return StoredFile(path, sha256, size, deduplicated=False)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+async def store_upload(upload_file, max_bytes: int = None) -> StoredFile:
+    """Stores a FastAPI UploadFile without blocking the event loop."""
+    return await run_in_threadpool(store_stream, upload_file.file, upload_file.filename or "", max_bytes)
+
+def release_blob(path: str) -> bool:
+    """
+    Deletes `path` from disk unless an UploadedFile still uses it. Call once the row that
+    used it has been deleted or repointed (committed). Sync; returns whether it was removed.
+    """
+    with Session(engine) as session:
+        in_use = session.exec(select(UploadedFile.id).where(UploadedFile.filepath == path).limit(1)).first()
+    if in_use is not None or not os.path.exists(path) or blob_in_grace_period(path):
+        return False
+    os.remove(path)
+    return True
+
+def blob_in_grace_period(path: str) -> bool:
+    """
+    True for a blob stored or reused in the last BLOB_GRACE_SECONDS: an upload in flight may
+    be about to commit a row that points at it. Keep it; orphaned blobs are harmless.
+    """
+    try:
+        return os.path.dirname(os.path.dirname(path)) == BLOB_DIR and time.time() - os.path.getmtime(path) < BLOB_GRACE_SECONDS
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,132 @@
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from .cache import TTLCache, MISSING
+from .db import engine, AsyncSessionLocal
+from .metrics import timed
+from .models import User
+
+# --- TENANT IDENTITY ---
+# Phone numbers are stored and queried in one canonical E.164 form ("+2348012345678"),
+# whatever the client or WhatsApp sends ("2348012345678", "0801 234 5678", ...).
+#
+# resolve_tenant() / get_tenant() return a small immutable Tenant snapshot from a per-process
+# TTL cache, so an agent turn that calls several tools hits the database once. Misses are
+# cached too (most webhook senders are customers, not owners). Anything that creates,
+# updates or deletes a User must call invalidate_tenant().
+#
+# Agents set `current_tenant` (and, for customer turns, `current_customer`) for the duration
+# of a turn; tools use them instead of trusting the phone numbers the model passes back.
+#
+# Lookups that reach the database are timed as the "tenant_lookup" stage (app/metrics.py).
+
+DEFAULT_COUNTRY_CODE = "234" # Nigeria: local numbers are written 0801 234 5678
+TENANT_CACHE_TTL_SECONDS = 60
+
+NON_DIGITS_RE = re.compile(r"\D")
+
+def normalize_phone(raw: str, default_country_code: str = DEFAULT_COUNTRY_CODE) -> str:
+    """'0801 234 5678', '2348012345678', '+234 (0)801-234-5678' -> '+2348012345678'. Raises ValueError."""
+    value = str(raw or "").strip()
+    digits = NON_DIGITS_RE.sub("", value)
+    if not value.startswith("+"):
+        if digits.startswith("00"): # international dialing prefix
+            digits = digits[2:]
+        elif digits.startswith("0"): # local trunk prefix
+            digits = default_country_code + digits[1:]
+    if digits.startswith(default_country_code + "0"): # "+234 0801...": trunk zero kept by mistake
+        digits = default_country_code + digits[len(default_country_code) + 1:]
+    if not 8 <= len(digits) <= 15:
+        raise ValueError(f"Invalid phone number: {raw!r}")
+    return f"+{digits}"
+
+@dataclass(frozen=True)
+class Tenant:
+    id: int
+    phone_number: str
+    business_name: str
+    bot_name: str
+    bot_phone_number: str
+
+    @classmethod
+    def from_user(cls, user: User) -> "Tenant":
+        return cls(user.id, user.phone_number, user.business_name, user.bot_name, user.bot_phone_number)
+
+_cache = TTLCache(TENANT_CACHE_TTL_SECONDS)
+
+current_tenant: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+current_customer: ContextVar[Optional[str]] = ContextVar("current_customer", default=None) # the customer's WhatsApp number
+
+def _phone_key(phone: str):
+    try:
+        return ("phone", normalize_phone(phone))
+    except ValueError:
+        return None
+
+def _remember(key, tenant: Optional[Tenant]) -> Optional[Tenant]:
+    _cache.set(key, tenant)
+    if tenant:
+        _cache.set(("id", tenant.id), tenant)
+        _cache.set(("phone", tenant.phone_number), tenant)
+    return tenant
+
+def resolve_tenant(phone: str) -> Optional[Tenant]:
+    """Business owner for a phone number in any common format, or None."""
+    key = _phone_key(phone)
+    if key is None:
+        return None
+    cached = _cache.get(key)
+    if cached is not MISSING:
+        return cached
+    with timed("tenant_lookup"), Session(engine) as session:
+        user = session.exec(select(User).where(User.phone_number == key[1])).first()
+        return _remember(key, Tenant.from_user(user) if user else None)
+
+async def resolve_tenant_async(phone: str) -> Optional[Tenant]:
+    key = _phone_key(phone)
+    if key is None:
+        return None
+    cached = _cache.get(key)
+    if cached is not MISSING:
+        return cached
+    with timed("tenant_lookup"):
+        async with AsyncSessionLocal() as session:
+            user = (await session.exec(select(User).where(User.phone_number == key[1]))).first()
+        return _remember(key, Tenant.from_user(user) if user else None)
+
+def get_tenant(user_id: int) -> Optional[Tenant]:
+    cached = _cache.get(("id", user_id))
+    if cached is not MISSING:
+        return cached
+    with timed("tenant_lookup"), Session(engine) as session:
+        user = session.get(User, user_id)
+        return _remember(("id", user_id), Tenant.from_user(user) if user else None)
+
+async def get_tenant_async(user_id: int) -> Optional[Tenant]:
+    cached = _cache.get(("id", user_id))
+    if cached is not MISSING:
+        return cached
+    with timed("tenant_lookup"):
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, user_id)
+        return _remember(("id", user_id), Tenant.from_user(user) if user else None)
+
+def invalidate_tenant(user_id: int = None, phone: str = None):
+    """Call after a User row is created, updated or deleted."""
+    if user_id is not None:
+        cached = _cache.get(("id", user_id))
+        if cached not in (MISSING, None):
+            _cache.pop(("phone", cached.phone_number))
+        _cache.pop(("id", user_id))
+    if phone is not None:
+        key = _phone_key(phone)
+        if key:
+            _cache.pop(key)
+
+def tenant_for_tool(user_phone: str = None) -> Optional[Tenant]:
+    """The tenant of the running agent turn, falling back to the phone the model passed."""
+    return current_tenant.get() or (resolve_tenant(user_phone) if user_phone else None)
@@ -1,10 +1,15 @@
 from langchain_core.tools import tool
 from langchain_core.pydantic_v1 import BaseModel, Field
-from sqlmodel import Session, select, func, or_
+from sqlmodel import Session, select
 from .db import engine
-from .models import SalesLedger, InventoryItem, User, BusinessInfo
+from .models import SalesLedger, InventoryItem
+from .tenants import tenant_for_tool, current_customer
+from .search import search_inventory, search_knowledge
+from .rollups import record_sale, resolve_period, sales_totals
+from .orders import place_order, save_quote
+from .stock_alerts import check_low_stock
 from uuid import uuid4
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional
 
 # --- INPUT SCHEMAS ---
@@ -17,11 +22,15 @@ class SubmitOrderInput(BaseModel):
     item_name: str = Field(description="Name of the item requested")
     # Adding a clear description helps the AI choose the right format
     quantity: int = Field(description="Quantity requested. Must be a whole number/integer.")
-    customer_phone: str = Field(description="The customer's phone number")
+    user_phone: Optional[str] = Field(default=None, description="The business owner's phone number")
+
+class QuoteOrderInput(BaseModel):
+    item_name: str = Field(description="Name of the item the customer wants")
+    quantity: int = Field(description="Quantity the customer wants. Must be a whole number/integer.")
     user_phone: Optional[str] = Field(default=None, description="The business owner's phone number")
 
 class AnalyticsInput(BaseModel):
-    period: str = Field(description="Time period: 'today', 'yesterday', 'week', 'month'")
+    period: str = Field(description="Time period: 'today', 'yesterday', 'week', 'month', 'quarter', 'year', or a custom range 'YYYY-MM-DD to YYYY-MM-DD'")
     user_phone: Optional[str] = Field(default=None, description="The business owner's phone number")
 
 class LogSaleInput(BaseModel):
@@ -34,6 +43,7 @@ class ManageInventoryInput(BaseModel):
     name: str = Field(description="Product name")
     price: float = Field(default=0.0, description="Price of the product")
     stock: int = Field(default=0, description="Quantity in stock")
+    low_stock_threshold: Optional[int] = Field(default=None, description="Alert the owner when stock falls to this level")
     user_phone: Optional[str] = Field(default=None, description="The business owner's phone number")
 
 class GetCurrentTimeInput(BaseModel):
@@ -47,30 +57,21 @@ def check_item_stock(query: str, user_phone: str = None):
     Searches for products in BOTH the formal Inventory AND the Knowledge Base (taught facts).
     Returns price, stock status, and details.
     """
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == user_phone)).first()
-        if not user: return "Error: User not found."
+    user = tenant_for_tool(user_phone)
+    if not user: return "Error: User not found."
 
+    with Session(engine) as session:
         results = []
 
-        # 1. Search Formal Inventory (InventoryItem)
-        inventory_items = session.exec(select(InventoryItem).where(
-            InventoryItem.user_id == user.id,
-            InventoryItem.name.ilike(f"%{query}%")
-        )).all()
+        # 1. Search Formal Inventory (InventoryItem), ranked & typo-tolerant
+        inventory_items = search_inventory(session, user.id, query)
 
         for p in inventory_items:
             stock_status = f"{p.stock} left" if p.stock > 0 else "Out of Stock"
             results.append(f"📦 [INVENTORY] {p.name}: ₦{p.price:,.2f} ({stock_status})")
 
         # 2. Search Knowledge Base (BusinessInfo) - The "Teach Suzan" data
-        knowledge_items = session.exec(select(BusinessInfo).where(
-            BusinessInfo.user_id == user.id,
-            or_(
-                BusinessInfo.topic.ilike(f"%{query}%"),
-                BusinessInfo.details.ilike(f"%{query}%")
-            )
-        )).all()
+        knowledge_items = search_knowledge(session, user.id, query)
 
         for k in knowledge_items:
             results.append(f"🧠 [KNOWLEDGE] {k.topic}: {k.details}")
@@ -81,35 +82,52 @@ def check_item_stock(query: str, user_phone: str = None):
 
         return "\n".join(results)
 
-@tool(args_schema=SubmitOrderInput)
-def submit_order_request(item_name: str, quantity: int, customer_phone: str, user_phone: str = None):
+@tool(args_schema=QuoteOrderInput)
+def quote_order(item_name: str, quantity: int, user_phone: str = None):
     """
-    Creates a record in SalesLedger with status='PENDING'.
+    Quotes the price for a quantity of an item and remembers it, so that when the customer
+    confirms, exactly this item and quantity are ordered. Use before asking them to buy.
     """
+    user = tenant_for_tool(user_phone)
+    if not user: return "Error: User not found."
+    customer_phone = current_customer.get() # the customer of this turn, never a number from the model
+    if not customer_phone: return "Error: No customer in this conversation."
+    if quantity < 1: return "Error: Quantity must be at least 1."
+
     with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == user_phone)).first()
-        if not user: return "Error: User not found."
+        matches = search_inventory(session, user.id, item_name, limit=1)
+        if not matches:
+            return f"I couldn't find '{item_name}' in the inventory."
+        item = matches[0]
+        if item.stock < quantity:
+            return f"Only {item.stock} x {item.name} left in stock."
+
+        save_quote(session, user.id, customer_phone, item, quantity)
+        session.commit()
+        return f"Quote: {quantity} x {item.name} at ₦{item.price:,.2f} each = ₦{item.price * quantity:,.2f}."
 
-        # Find item in inventory to get price
-        item = session.exec(select(InventoryItem).where(
-            InventoryItem.user_id == user.id,
-            InventoryItem.name.ilike(f"%{item_name}%")
-        )).first()
+@tool(args_schema=SubmitOrderInput)
+def submit_order_request(item_name: str, quantity: int, user_phone: str = None):
+    """
+    Reserves the stock and creates a record in SalesLedger with status='PENDING'.
+    """
+    user = tenant_for_tool(user_phone)
+    if not user: return "Error: User not found."
+    customer_phone = current_customer.get()
+    if not customer_phone: return "Error: No customer in this conversation."
+    if quantity < 1: return "Error: Quantity must be at least 1."
 
-        amount = (item.price * quantity) if item else 0.0
+    with Session(engine) as session:
+        # Best match first; the reservation itself re-checks stock atomically
+        matches = search_inventory(session, user.id, item_name, limit=1)
+        if not matches:
+            return f"I couldn't find '{item_name}' in the inventory."
+        item = matches[0]
 
-        sale = SalesLedger(
-            transaction_id=str(uuid4()),
-            item_description=f"{quantity} x {item_name}",
-            amount=amount,
-            customer_name=f"Customer {customer_phone}",
-            logged_by=customer_phone,
-            user_id=user.id,
-            status="PENDING",
-            timestamp=datetime.now()
-        )
-        session.add(sale)
+        sale = place_order(session, user.id, customer_phone, item, quantity)
         session.commit()
+        if not sale:
+            return f"Sorry, there isn't enough {item.name} in stock for {quantity} unit(s)."
 
     return "✅ Order submitted! Waiting for confirmation."
 
@@ -120,47 +138,35 @@ def get_sales_analytics(period: str, user_phone: str = None):
     """
     Returns pre-calculated SQL sums for the period.
     """
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == user_phone)).first()
-        if not user: return "Error: User not found."
-
-        now = datetime.now()
-        start_date = now
-
-        if period == "today":
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == "yesterday":
-            start_date = (now - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == "week":
-            start_date = now - timedelta(days=7)
-        elif period == "month":
-            start_date = now - timedelta(days=30)
-
-        query = select(func.sum(SalesLedger.amount), func.count(SalesLedger.id)).where(
-            SalesLedger.user_id == user.id,
-            SalesLedger.timestamp >= start_date,
-            SalesLedger.status == "COMPLETED"
-        )
+    try:
+        start_day, end_day = resolve_period(period)
+    except ValueError:
+        return f"Error: Unknown period '{period}'. Use today, yesterday, week, month, quarter, year, or 'YYYY-MM-DD to YYYY-MM-DD'."
 
-        if period == "yesterday":
-             query = query.where(SalesLedger.timestamp < end_date)
+    user = tenant_for_tool(user_phone)
+    if not user: return "Error: User not found."
 
-        result = session.exec(query).first()
-        total_revenue = result[0] if result[0] else 0.0
-        total_count = result[1] if result[1] else 0
+    with Session(engine) as session:
+        # Reads the daily rollups, so cost doesn't grow with the ledger
+        totals = sales_totals(session, user.id, start_day, end_day)
+
+    total_revenue, total_count = totals.get("COMPLETED", (0.0, 0))
+    report = f"Sales Analytics ({period}):\n💰 Total Revenue: ₦{total_revenue:,.2f}\n📦 Transactions: {total_count}"
 
-        return f"Sales Analytics ({period}):\n💰 Total Revenue: ₦{total_revenue:,.2f}\n📦 Transactions: {total_count}"
+    _, pending_count = totals.get("PENDING", (0.0, 0))
+    if pending_count:
+        report += f"\n⏳ Pending Orders: {pending_count}"
+    return report
 
 @tool(args_schema=LogSaleInput)
 def log_offline_sale(item: str, amount: float, user_phone: str = None):
     """
     Logs a confirmed sale for walk-in customers.
     """
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == user_phone)).first()
-        if not user: return "Error: User not found."
+    user = tenant_for_tool(user_phone)
+    if not user: return "Error: User not found."
 
+    with Session(engine) as session:
         sale = SalesLedger(
             transaction_id=str(uuid4()),
             item_description=item,
@@ -172,24 +178,28 @@ def log_offline_sale(item: str, amount: float, user_phone: str = None):
             timestamp=datetime.now()
         )
         session.add(sale)
+        record_sale(session, sale)
         session.commit()
     return f"✅ Recorded offline sale: {item} for ₦{amount:,.2f}."
 
 @tool(args_schema=ManageInventoryInput)
-def manage_inventory(action: str, name: str, price: float = 0, stock: int = 0, user_phone: str = None):
+def manage_inventory(action: str, name: str, price: float = 0, stock: int = 0, low_stock_threshold: int = None, user_phone: str = None):
     """
     Adds or updates a product in the inventory.
     """
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.phone_number == user_phone)).first()
-        if not user: return "Error: User not found."
+    user = tenant_for_tool(user_phone)
+    if not user: return "Error: User not found."
 
+    with Session(engine) as session:
         if action.upper() == "ADD":
             existing = session.exec(select(InventoryItem).where(InventoryItem.user_id == user.id, InventoryItem.name == name)).first()
             if existing: return f"Product '{name}' already exists. Use update."
 
             prod = InventoryItem(user_id=user.id, name=name, price=price, stock=stock)
+            if low_stock_threshold is not None: prod.low_stock_threshold = low_stock_threshold
             session.add(prod)
+            session.flush()
+            check_low_stock(session, [prod.id])
             session.commit()
             return f"✅ Added {name} (Price: {price}, Stock: {stock})."
 
@@ -199,7 +209,10 @@ def manage_inventory(action: str, name: str, price: float = 0, stock: int = 0, u
 
             if price > 0: prod.price = price
             if stock > 0: prod.stock = stock
+            if low_stock_threshold is not None: prod.low_stock_threshold = low_stock_threshold
             session.add(prod)
+            session.flush()
+            check_low_stock(session, [prod.id])
             session.commit()
             return f"✅ Updated {name}."
 
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+
+from groq import AsyncGroq
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache, MISSING
+from .config import settings
+from .storage import UPLOAD_CHUNK_SIZE, temp_path, write_stream
+
+# --- VOICE NOTE TRANSCRIPTION ---
+# Nothing here runs on the event loop except the Whisper calls themselves (AsyncGroq):
+# saving the upload, hashing, decoding and splitting happen in the threadpool.
+#
+# Recordings longer than SEGMENT_MAX_MS are cut at pauses (pydub silence detection) into
+# roughly SEGMENT_TARGET_MS pieces, transcribed concurrently (at most VOICE_MAX_PARALLEL
+# Whisper calls per worker) and joined back in order, so a long note takes about as long as
+# its longest piece. Transcripts are cached by audio hash: the same note sent twice, or a
+# retried request, is not transcribed again.
+#
+# Anything but WAV is decoded by ffmpeg: the one on PATH, else the static build pinned in
+# requirements.txt (imageio-ffmpeg), since Render's Python runtime has none. ffmpeg writes
+# WAV to a pipe and pydub reads that, so ffprobe isn't needed. Audio that can't be decoded
+# is sent to Whisper whole, as before.
+
+WHISPER_MODEL = "whisper-large-v3"
+SEGMENT_TARGET_MS = 30_000
+SEGMENT_MAX_MS = 60_000 # shorter recordings are sent whole
+MIN_SILENCE_MS = 400
+SILENCE_BELOW_AVERAGE_DB = 16 # quieter than the recording's average loudness by this much
+SEGMENT_FRAME_RATE = 16_000 # what Whisper resamples to anyway; keeps segment uploads small
+TRANSCRIPT_CACHE_SECONDS = 24 * 3600
+
+_transcripts = TTLCache(TRANSCRIPT_CACHE_SECONDS, max_entries=2000)
+_whisper_slots = asyncio.Semaphore(settings.VOICE_MAX_PARALLEL)
+_client = None
+
+def _groq() -> AsyncGroq:
+    global _client
+    if _client is None:
+        _client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+    return _client
+
+# --- SPLITTING ---
+
+def plan_cuts(duration_ms: int, silences: list, target_ms: int = SEGMENT_TARGET_MS, max_ms: int = SEGMENT_MAX_MS) -> list:
+    """
+    [(start_ms, end_ms)] covering the recording. Each cut is made in the middle of the pause
+    closest to `target_ms` into the current segment; with no pause within `max_ms`, it is cut hard.
+    """
+    pauses = [(start + end) // 2 for start, end in silences]
+    segments, start = [], 0
+    while duration_ms - start > max_ms:
+        candidates = [p for p in pauses if start < p <= start + max_ms]
+        cut = min(candidates, key=lambda p: abs(p - start - target_ms)) if candidates else start + max_ms
+        segments.append((start, cut))
+        start = cut
+    segments.append((start, duration_ms))
+    return segments
+
+def _read(path: str) -> tuple:
+    with open(path, "rb") as f:
+        return os.path.basename(path), f.read()
+
+def _ffmpeg() -> str:
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def decode_audio(path: str):
+    """The recording as a mono SEGMENT_FRAME_RATE AudioSegment. Raises if it can't be decoded."""
+    from pydub import AudioSegment
+    from pydub.audio_segment import fix_wav_headers
+    if path.lower().endswith(".wav"):
+        return AudioSegment.from_file(path, format="wav").set_channels(1).set_frame_rate(SEGMENT_FRAME_RATE)
+    result = subprocess.run(
+        [_ffmpeg(), "-nostdin", "-loglevel", "error", "-i", path,
+         "-vn", "-ac", "1", "-ar", str(SEGMENT_FRAME_RATE), "-f", "wav", "-"],
+        capture_output=True, check=True,
+    )
+    wav = bytearray(result.stdout)
+    fix_wav_headers(wav) # a piped WAV header has no length
+    return AudioSegment(data=bytes(wav))
+
+def split_audio(path: str) -> list:
+    """The [(filename, bytes)] to transcribe, in order. Sync (decodes the whole recording)."""
+    try:
+        from pydub.silence import detect_silence
+        audio = decode_audio(path)
+    except Exception as e:
+        print(f"⚠️ Can't decode {os.path.basename(path)} for splitting ({e}); transcribing it whole.")
+        return [_read(path)]
+    if len(audio) <= SEGMENT_MAX_MS:
+        return [_read(path)]
+
+    silences = detect_silence(
+        audio, min_silence_len=MIN_SILENCE_MS, silence_thresh=audio.dBFS - SILENCE_BELOW_AVERAGE_DB, seek_step=10
+    )
+    segments = []
+    for i, (start, end) in enumerate(plan_cuts(len(audio), silences)):
+        buffer = io.BytesIO()
+        audio[start:end].export(buffer, format="wav")
+        segments.append((f"segment_{i}.wav", buffer.getvalue()))
+    return segments
+
+# --- TRANSCRIPTION ---
+
+async def _transcribe_segment(filename: str, data: bytes) -> str:
+    async with _whisper_slots:
+        transcription = await _groq().audio.transcriptions.create(
+            file=(filename, data),
+            model=WHISPER_MODEL,
+            response_format="json",
+            language="en",
+            temperature=0.0
+        )
+    return transcription.text.strip()
+
+def stitch(texts: list) -> str:
+    return " ".join(text for text in texts if text)
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def transcribe_file(path: str, sha256: str = None) -> str:
+    """Transcribes an audio file (any length) with Groq Whisper; cached by content hash."""
+    sha256 = sha256 or await run_in_threadpool(file_sha256, path)
+    text = _transcripts.get(sha256)
+    if text is not MISSING:
+        return text
+
+    segments = await run_in_threadpool(split_audio, path)
+    if len(segments) > 1:
+        print(f"🎙️ Transcribing {len(segments)} segments of {os.path.basename(path)} in parallel...")
+    text = stitch(await asyncio.gather(*(_transcribe_segment(name, data) for name, data in segments)))
+    _transcripts.set(sha256, text)
+    return text
+
+# --- UPLOADS ---
+
+async def save_audio_upload(upload_file, default_ext: str = ".webm") -> tuple:
+    """Writes an UploadFile to a temp file off the event loop. Returns (path, sha256); caller removes it."""
+    path = temp_path(os.path.splitext(upload_file.filename or "")[1].lower() or default_ext)
+    try:
+        sha256, _ = await run_in_threadpool(write_stream, upload_file.file, path)
+    except BaseException:
+        await run_in_threadpool(remove_quietly, path)
+        raise
+    return path, sha256
+
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,9 +1,34 @@
+import threading
+import time
 import requests
 from .config import settings
+from .metrics import timed
+from .tenants import normalize_phone
+
+class RateLimiter:
+    """Spaces out calls to at most `per_second` (shared by every thread using it)."""
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def whatsapp_number(phone: str) -> str:
+    """The Cloud API wants the E.164 digits without '+'."""
+    try:
+        return normalize_phone(phone).lstrip("+")
+    except ValueError:
+        return phone.replace("+", "").replace(" ", "").strip()
 
 def send_whatsapp(to: str, text: str):
-    # Sanitize phone number (remove + and spaces)
-    clean_to = to.replace("+", "").replace(" ", "").strip()
+    clean_to = whatsapp_number(to)
     
     # 1. FIXED: Changed to 'WHATSAPP_PHONE_ID' to match your Config & .env
     # 2. FIXED: Changed version to 'v22.0' to match your working CURL
@@ -26,7 +51,8 @@ def send_whatsapp(to: str, text: str):
     }
     
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        with timed("whatsapp_send"):
+            response = requests.post(url, json=payload, headers=headers)
         if response.status_code in [200, 201]:
             print(f"✅ SENT to {clean_to}")
         else:
@@ -34,4 +60,11 @@ def send_whatsapp(to: str, text: str):
         return response.json()
     except Exception as e:
         print(f"❌ ERROR: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+# Bulk/scheduled messages (digests) share this so they stay well under the Cloud API throughput limit
+bulk_send_limiter = RateLimiter(settings.WHATSAPP_BULK_SENDS_PER_SECOND)
+
+def send_whatsapp_throttled(to: str, text: str):
+    bulk_send_limiter.wait()
+    return send_whatsapp(to, text)
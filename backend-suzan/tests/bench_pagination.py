@@ -0,0 +1,92 @@
+"""
+Benchmark: /sales-style listing at 100k ledger rows, full load vs one keyset page.
+Usage (from backend-suzan/): python -m tests.bench_pagination [--rows 100000] [--limit 100]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine, insert
+from sqlmodel import Session, select
+
+from app.migrations import run_migrations
+from app.models import User, SalesLedger
+from app.pagination import fetch_page, page_response
+
+def seed(engine, rows: int):
+    with Session(engine) as session:
+        session.add(User(business_name="Bench", phone_number="1", password_hash="x"))
+        session.commit()
+    start = datetime(2024, 1, 1)
+    values = [
+        {
+            "transaction_id": f"t{i}", "item_description": f"{i % 7 + 1} x Item {i % 500}", "amount": 1000.0 + i % 97,
+            "customer_name": f"Customer {i % 3000}", "timestamp": start + timedelta(minutes=i), "logged_by": "1",
+            "status": "COMPLETED", "user_id": 1,
+        }
+        for i in range(rows)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(SalesLedger), values)
+
+def full_listing(engine):
+    # What /sales did before: every row as an ORM object, formatted, then jsonable_encoder + json
+    with Session(engine) as session:
+        sales = session.exec(select(SalesLedger).where(SalesLedger.user_id == 1).order_by(SalesLedger.timestamp.desc())).all()
+        body = [
+            {
+                "id": s.id,
+                "item": s.item_description,
+                "amount": f"₦{s.amount:,.2f}" if s.amount else "₦0.00",
+                "customer": s.customer_name or "Unknown",
+                "date": s.timestamp.strftime("%Y-%m-%d %H:%M")
+            } for s in sales
+        ]
+    return JSONResponse(content=jsonable_encoder(body))
+
+def keyset_page(engine, after_id, limit):
+    with Session(engine) as session:
+        columns = [SalesLedger.id, SalesLedger.item_description, SalesLedger.amount, SalesLedger.customer_name, SalesLedger.timestamp]
+        sales, next_after_id = fetch_page(session, SalesLedger, columns, 1, after_id, limit)
+    return page_response([
+        {
+            "id": s["id"],
+            "item": s["item_description"],
+            "amount": f"₦{s['amount']:,.2f}" if s["amount"] else "₦0.00",
+            "customer": s["customer_name"] or "Unknown",
+            "date": s["timestamp"].strftime("%Y-%m-%d %H:%M")
+        } for s in sales
+    ], next_after_id)
+
+def measure(label, fn, repeats=3):
+    tracemalloc.start()
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = fn()
+        best = min(best, time.perf_counter() - started)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<32} {best * 1000:>9.1f} ms  peak {peak / 1e6:>7.1f} MB  body {len(response.body) / 1e3:>9.1f} kB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        run_migrations(engine)
+        seed(engine, args.rows)
+        print(f"📊 {args.rows:,} ledger rows, page size {args.limit}")
+
+        measure("full listing (before)", lambda: full_listing(engine), repeats=1)
+        measure("first page", lambda: keyset_page(engine, None, args.limit))
+        measure("page at row ~90%", lambda: keyset_page(engine, args.rows // 10, args.limit))
+        engine.dispose()
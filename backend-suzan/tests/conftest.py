@@ -0,0 +1,79 @@
+import asyncio
+import os
+import tempfile
+
+# Importing app.main runs init_db() against DATABASE_URL: point it somewhere disposable
+# before any app module reads the settings.
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='suzan-tests-'), 'app.db')}"
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db import _set_sqlite_pragmas, to_async_url
+from app.migrations import run_migrations
+from app.models import User
+
+# Shared database fixtures. Every test gets its own migrated SQLite file under tmp_path;
+# the `db` marker says which app modules should use it and what to seed:
+#
+#   pytestmark = pytest.mark.db(patch=[orders, dashboard], owners=1, wal=True)
+#
+#   patch   modules whose module-level `engine` is pointed at the test database
+#   owners  how many business owners to create (ids 1..n, phones OWNER_PHONES), default 2
+#   wal     apply the production SQLite pragmas (WAL, busy_timeout), for concurrency tests
+
+OWNER_PHONES = ("+2348000000001", "+2348000000002")
+OWNER_NAMES = ("Shop", "Other")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "db(patch=(), owners=2, wal=False): options for the `engine` fixture")
+
+@pytest.fixture(name="engine")
+def engine_fixture(request, tmp_path, monkeypatch):
+    marker = request.node.get_closest_marker("db")
+    options = {"patch": (), "owners": 2, "wal": False, **(marker.kwargs if marker else {})}
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    if options["wal"]:
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    run_migrations(engine)
+    for module in options["patch"]:
+        monkeypatch.setattr(module, "engine", engine)
+
+    with Session(engine) as session:
+        for phone, name in list(zip(OWNER_PHONES, OWNER_NAMES))[:options["owners"]]:
+            session.add(User(business_name=name, phone_number=phone, password_hash="x"))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
+    with Session(engine) as session:
+        yield session
+
+@pytest.fixture(name="async_sessions")
+def async_sessions_fixture(engine):
+    """An AsyncSessionLocal-style factory on the same database file (aiosqlite)."""
+    async_engine = create_async_engine(to_async_url(str(engine.url)))
+    yield async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
+
+@pytest.fixture(name="write_pdf")
+def write_pdf_fixture():
+    """write_pdf(path, ["page 1 text", ...]): a small text PDF, one line per page."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    def write_pdf(path, pages):
+        c = canvas.Canvas(str(path), pagesize=letter)
+        for text in pages:
+            c.drawString(100, 750, text)
+            c.showPage()
+        c.save()
+        return path
+
+    return write_pdf
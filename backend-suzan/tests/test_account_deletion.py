@@ -0,0 +1,113 @@
+import os
+
+import pytest
+from datetime import datetime
+from sqlmodel import Session, select, func
+
+from app import account_deletion
+from app.config import settings
+from app.retention import archive_months, archive_path
+from app.account_deletion import queue_account_deletion, run_account_deletion_job, deletion_status
+from app.models import (
+    AccountDeletionJob, User, UploadedFile, DocumentChunk, SalesLedger, InventoryItem, ChatLog, Alert, BusinessInfo,
+)
+
+pytestmark = pytest.mark.db(patch=[account_deletion], owners=0)
+
+@pytest.fixture(name="vector_deletes")
+def vector_deletes_fixture(monkeypatch, tmp_path):
+    monkeypatch.setattr(account_deletion, "invalidate_lexical_index", lambda user_id: None)
+    monkeypatch.setattr(settings, "CHAT_ARCHIVE_DIR", str(tmp_path / "archives"))
+    calls = []
+    monkeypatch.setattr(account_deletion, "delete_tenant_vectors", lambda user_id, file_ids: calls.append((user_id, file_ids)))
+    return calls
+
+def seed_account(session, tmp_path, phone: str) -> int:
+    user = User(business_name="Shop", phone_number=phone, password_hash="x")
+    session.add(user)
+    session.commit()
+    path = tmp_path / f"{phone}.pdf"
+    path.write_bytes(b"%PDF")
+    upload = UploadedFile(filename="c.pdf", filepath=str(path), user_id=user.id, status="COMPLETED")
+    session.add(upload)
+    session.commit()
+    session.add_all([
+        DocumentChunk(file_id=upload.id, page_number=0, page_hash="p", chunk_hash="c", vector_id="v", content="x"),
+        SalesLedger(transaction_id="t", item_description="x", amount=1, customer_name="c", logged_by=phone, user_id=user.id),
+        InventoryItem(name="Rice", price=1, user_id=user.id),
+        ChatLog(conversation_id="c", sender=phone, message_text="hi", user_id=user.id),
+        Alert(type="System", message="m", user_id=user.id),
+        BusinessInfo(category="Policy", topic="t", details="d", user_id=user.id, created_at=datetime.utcnow()),
+    ])
+    session.commit()
+    for month in ("2024-01", "2024-02"):
+        path = archive_path(user.id, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+    return user.id
+
+def count(session, model, **filters):
+    stmt = select(func.count()).select_from(model)
+    for column, value in filters.items():
+        stmt = stmt.where(getattr(model, column) == value)
+    return session.exec(stmt).one()
+
+def test_deletes_everything_the_tenant_owns(engine, vector_deletes, tmp_path):
+    with Session(engine) as session:
+        doomed = seed_account(session, tmp_path, "1")
+        kept = seed_account(session, tmp_path, "2")
+
+    job = queue_account_deletion(doomed)
+    run_account_deletion_job(job.id)
+
+    with Session(engine) as session:
+        status = deletion_status(session.get(AccountDeletionJob, job.id))
+        assert status["status"] == "COMPLETED" and status["progress"] == 1.0
+        assert status["rows_deleted"] == 8 and status["files_removed"] == 3 # the upload and two archived months
+        assert status["step"] == "done"
+        assert session.get(User, doomed) is None
+        for model in [UploadedFile, SalesLedger, InventoryItem, ChatLog, Alert, BusinessInfo]:
+            assert count(session, model, user_id=doomed) == 0
+            assert count(session, model, user_id=kept) == 1
+        assert count(session, DocumentChunk) == 1
+    assert vector_deletes == [(doomed, [1])]
+    assert not (tmp_path / "1.pdf").exists() and (tmp_path / "2.pdf").exists()
+    assert archive_months(doomed) == [] and archive_months(kept) == ["2024-01", "2024-02"]
+
+def test_queue_reuses_unfinished_job_and_failed_job_can_rerun(engine, vector_deletes, tmp_path, monkeypatch):
+    with Session(engine) as session:
+        user_id = seed_account(session, tmp_path, "1")
+
+    job = queue_account_deletion(user_id)
+    assert queue_account_deletion(user_id).id == job.id
+
+    remove_file = account_deletion._remove_file
+    monkeypatch.setattr(account_deletion, "_remove_file", lambda path: 1 / 0)
+    run_account_deletion_job(job.id)
+    with Session(engine) as session:
+        failed = session.get(AccountDeletionJob, job.id)
+        assert failed.status == "FAILED" and "division by zero" in failed.error
+        assert session.get(User, user_id) is not None
+
+    monkeypatch.setattr(account_deletion, "_remove_file", remove_file)
+    run_account_deletion_job(job.id)
+    with Session(engine) as session:
+        assert session.get(AccountDeletionJob, job.id).status == "COMPLETED"
+        assert session.get(User, user_id) is None
+
+def test_a_job_queued_twice_runs_once(engine, vector_deletes, tmp_path, monkeypatch):
+    with Session(engine) as session:
+        user_id = seed_account(session, tmp_path, "1")
+    job = queue_account_deletion(user_id)
+
+    # A second run starts mid-way (the background task plus the startup sweep)
+    def delete_and_start_another(user_id, file_ids):
+        vector_deletes.append((user_id, file_ids))
+        run_account_deletion_job(job.id)
+    monkeypatch.setattr(account_deletion, "delete_tenant_vectors", delete_and_start_another)
+    run_account_deletion_job(job.id)
+
+    assert vector_deletes == [(user_id, [1])]
+    with Session(engine) as session:
+        status = deletion_status(session.get(AccountDeletionJob, job.id))
+        assert status["status"] == "COMPLETED" and status["rows_deleted"] == 8
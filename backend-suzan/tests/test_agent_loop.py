@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from sqlalchemy import event
+
+from app import agents, rag_engine, tenants
+from app.cache import TTLCache
+
+pytestmark = pytest.mark.db(patch=[agents, rag_engine, tenants], owners=1)
+
+class FakeGroq(FakeListChatModel):
+    """Answers without calling a tool; stands in for ChatGroq."""
+    model_name: str = "fake-llama"
+
+    def __init__(self, **kwargs):
+        super().__init__(responses=["Noted."])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+@pytest.fixture(name="loop_watch")
+def loop_watch_fixture(engine, async_sessions, monkeypatch):
+    """Records the thread of every sync engine checkout, so a test can tell if the event loop ran one."""
+    for module in (agents, rag_engine):
+        monkeypatch.setattr(module, "ChatGroq", FakeGroq)
+    monkeypatch.setattr(tenants, "AsyncSessionLocal", async_sessions)
+    monkeypatch.setattr(tenants, "_cache", TTLCache(60))
+    threads = []
+    listener = lambda *args: threads.append(threading.current_thread())
+    event.listen(engine, "checkout", listener)
+    yield threads
+    event.remove(engine, "checkout", listener)
+
+def test_admin_agent_keeps_db_work_off_the_event_loop(loop_watch):
+    async def turn():
+        return await agents.run_admin_agent("+2348000000001", "How did we do today?", "Suzan", "Shop"), threading.current_thread()
+
+    reply, loop_thread = asyncio.run(turn())
+    assert reply == "Noted."
+    assert loop_watch and loop_thread not in loop_watch
+
+def test_customer_agent_keeps_db_work_off_the_event_loop(loop_watch, monkeypatch):
+    async def no_results(query, user_id):
+        return []
+    monkeypatch.setattr(rag_engine, "hybrid_search", no_results)
+
+    async def turn():
+        return await rag_engine.answer_from_rag("Do you deliver?", user_id=1, customer_phone="+2348011111111"), threading.current_thread()
+
+    reply, loop_thread = asyncio.run(turn())
+    assert reply == "Noted."
+    assert loop_watch and loop_thread not in loop_watch
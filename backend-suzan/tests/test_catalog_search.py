@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import InventoryItem, BusinessInfo
+from app.search import SIMILARITY_THRESHOLD, search_inventory, search_knowledge
+
+@pytest.fixture(autouse=True)
+def catalog(session):
+    session.add_all([
+        InventoryItem(user_id=1, name="Sneakers", price=15000, stock=4),
+        InventoryItem(user_id=1, name="Stickers", price=500, stock=100),
+        InventoryItem(user_id=1, name="Rice (50kg)", price=60000, stock=2),
+        InventoryItem(user_id=2, name="Sneakers", price=9999, stock=1),
+        BusinessInfo(user_id=1, category="Policy", topic="Delivery", details="We deliver within Lagos in 2 days"),
+    ])
+    session.commit()
+
+def names(items):
+    return [(item.user_id, item.name) for item in items]
+
+@pytest.mark.parametrize("query", ["sneaker", "Sneakers", "snaekers", "sneakrs"])
+def test_plurals_and_typos_rank_the_right_item_first(session, query):
+    results = search_inventory(session, 1, query)
+    assert names(results)[0] == (1, "Sneakers")
+
+def test_results_are_scoped_to_the_tenant(session):
+    assert names(search_inventory(session, 2, "sneakers")) == [(2, "Sneakers")]
+    assert search_inventory(session, 2, "rice") == []
+
+def test_unrelated_queries_return_nothing(session):
+    assert search_inventory(session, 1, "laptop") == []
+
+def test_index_follows_updates_and_deletes(session):
+    item = session.get(InventoryItem, 2)
+    item.name = "Bottled Water"
+    session.add(item)
+    session.commit()
+    assert names(search_inventory(session, 1, "water")) == [(1, "Bottled Water")]
+    assert all(i.name != "Stickers" for i in search_inventory(session, 1, "stickers"))
+
+    session.delete(item)
+    session.commit()
+    assert search_inventory(session, 1, "water") == []
+
+def test_knowledge_search_matches_topic_and_details(session):
+    assert [k.topic for k in search_knowledge(session, 1, "delivery")] == ["Delivery"]
+    assert [k.topic for k in search_knowledge(session, 1, "lagos")] == ["Delivery"]
+    assert search_knowledge(session, 2, "delivery") == []
+
+def test_short_queries_fall_back_to_ilike(session):
+    # "50" has no trigram, so the lookup falls back to a substring match
+    assert names(search_inventory(session, 1, "50")) == [(1, "Rice (50kg)")]
+
+class RecordingSession:
+    """Captures the SQL the Postgres path sends (no Postgres in the test environment)."""
+    def __init__(self):
+        self.statements = []
+
+    def get_bind(self):
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    def exec(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return SimpleNamespace(all=lambda: [])
+
+def test_postgres_lowers_the_word_similarity_cutoff_before_filtering():
+    session = RecordingSession()
+    search_inventory(session, 1, "snaekers")
+
+    (set_sql, set_params), (query_sql, query_params) = session.statements[:2]
+    assert "set_config('pg_trgm.word_similarity_threshold'" in set_sql and ", true)" in set_sql # transaction-local
+    assert set_params == {"threshold": str(SIMILARITY_THRESHOLD)}
+    assert "lower(:query) <% lower(name)" in query_sql
+    assert query_params["query"] == "snaekers" and query_params["user_id"] == 1
@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app import chat_logger as chat_logger_module
+from app.chat_logger import ChatLogWriter, merge_pending
+from app.models import ChatLog
+
+@pytest.fixture(autouse=True)
+def async_db(async_sessions, monkeypatch):
+    monkeypatch.setattr(chat_logger_module, "AsyncSessionLocal", async_sessions)
+
+def stored(engine):
+    with Session(engine) as session:
+        return [log.message_text for log in session.exec(select(ChatLog).order_by(ChatLog.id)).all()]
+
+def test_burst_is_written_in_one_insert(engine):
+    writer = ChatLogWriter(interval=60, max_rows=1000)
+    inserts = []
+
+    async def scenario():
+        event.listen(chat_logger_module.AsyncSessionLocal.kw["bind"].sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *rest: inserts.append(statement) if statement.startswith("INSERT") else None)
+        for i in range(25):
+            writer.log(sender="2348099999999", message_text=f"msg {i}")
+        assert stored(engine) == [] # still buffered
+        assert await writer.flush() == 25
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert len(inserts) == 1
+    assert stored(engine) == [f"msg {i}" for i in range(25)]
+
+def test_max_rows_triggers_flush(engine):
+    writer = ChatLogWriter(interval=60, max_rows=3)
+
+    async def scenario():
+        for i in range(3):
+            writer.log(sender="a", message_text=f"msg {i}")
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if not writer.pending_logs():
+                break
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert stored(engine) == ["msg 0", "msg 1", "msg 2"]
+
+def test_stop_flushes_buffered_rows(engine):
+    writer = ChatLogWriter(interval=60)
+
+    async def scenario():
+        writer.log(sender="a", message_text="last words", user_id=1)
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert stored(engine) == ["last words"]
+
+def test_pending_logs_are_visible_before_flush(engine):
+    writer = ChatLogWriter(interval=60)
+
+    async def scenario():
+        writer.log(sender="cust", message_text="hello", conversation_id="wamid.1")
+        writer.log(sender="owner", message_text="restock", user_id=1)
+        pending = writer.pending_logs(sender="cust")
+        assert [log.message_text for log in pending] == ["hello"]
+        assert [log.message_text for log in writer.pending_logs(user_id=1)] == ["restock"]
+        await writer.stop()
+        assert writer.pending_logs() == []
+
+    asyncio.run(scenario())
+
+def test_rejected_rows_are_dropped_after_retries(engine, monkeypatch):
+    writer = ChatLogWriter(interval=60)
+    real_insert = writer._insert
+    async def insert(rows):
+        if any(row["message_text"] == "bad" for row in rows):
+            raise ValueError("value too long")
+        await real_insert(rows)
+    monkeypatch.setattr(writer, "_insert", insert)
+
+    async def scenario():
+        for text in ["one", "bad", "two", "three", "four"]:
+            writer.log(sender="a", message_text=text)
+        for _ in range(chat_logger_module.MAX_FLUSH_ATTEMPTS):
+            assert await writer.flush() == 0
+            assert len(writer.pending_logs()) == 5
+        assert await writer.flush() == 5 # split down to the bad row, which is dropped
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert stored(engine) == ["one", "two", "three", "four"]
+    assert writer.dropped == 1
+
+def test_database_outage_retries_without_dropping(engine, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    writer = ChatLogWriter(interval=60)
+    real_insert, down = writer._insert, [True]
+    async def insert(rows):
+        if down[0]:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        await real_insert(rows)
+    monkeypatch.setattr(writer, "_insert", insert)
+
+    async def scenario():
+        writer.log(sender="a", message_text="kept")
+        for _ in range(chat_logger_module.MAX_FLUSH_ATTEMPTS + 2):
+            assert await writer.flush() == 0
+        down[0] = False
+        assert await writer.flush() == 1
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert stored(engine) == ["kept"] and writer.dropped == 0
+
+def test_buffer_is_bounded(engine):
+    writer = ChatLogWriter(interval=60, max_buffered=3)
+
+    async def scenario():
+        for i in range(5):
+            writer.log(sender="a", message_text=f"msg {i}")
+        assert [log.message_text for log in writer.pending_logs()] == ["msg 2", "msg 3", "msg 4"]
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.dropped == 2
+
+def test_merge_pending_dedupes_and_limits():
+    now = datetime.utcnow()
+    committed = [ChatLog(conversation_id="b", sender="c", message_text="two", timestamp=now - timedelta(seconds=1)),
+                 ChatLog(conversation_id="a", sender="c", message_text="one", timestamp=now - timedelta(seconds=2))]
+    pending = [ChatLog(conversation_id="b", sender="c", message_text="two", timestamp=now - timedelta(seconds=1)),
+               ChatLog(conversation_id="c", sender="c", message_text="three", timestamp=now)]
+    assert [log.message_text for log in merge_pending(committed, pending, 10)] == ["three", "two", "one"]
+    assert [log.message_text for log in merge_pending(committed, pending, 2)] == ["three", "two"]
+
+@pytest.mark.db(wal=True)
+def test_sqlite_pragmas_enable_wal(engine):
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1 # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
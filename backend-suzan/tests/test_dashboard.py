@@ -0,0 +1,81 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app import dashboard, orders
+from app.dashboard import dashboard_summary, get_dashboard_summary, invalidate_dashboard
+from app.models import InventoryItem, SalesLedger, Alert, BusinessInfo
+from app.orders import place_order, confirm_order
+from app.rollups import record_sale
+
+NOW = datetime.now()
+
+pytestmark = pytest.mark.db(patch=[dashboard, orders])
+
+@pytest.fixture(autouse=True)
+def catalog(engine):
+    invalidate_dashboard()
+    with Session(engine) as session:
+        session.add(InventoryItem(user_id=1, name="Rice 50kg", price=100, stock=20))
+        session.add(InventoryItem(user_id=1, name="Beans", price=10, stock=1))
+        session.add(InventoryItem(user_id=2, name="Rice 50kg", price=100, stock=0))
+        session.add(Alert(type="Stock", message="Low stock: Beans", user_id=1))
+        session.add(Alert(type="Stock", message="old", user_id=1, is_read=True))
+        session.add(BusinessInfo(category="Policy", topic="Delivery", details="Free in Lagos", user_id=1))
+        session.commit()
+
+def walk_in(session, item, amount, when, user_id=1):
+    sale = SalesLedger(transaction_id=f"w-{item}-{when}", item_description=item, amount=amount,
+                       customer_name="Walk-in", logged_by="x", user_id=user_id, status="COMPLETED", timestamp=when)
+    session.add(sale)
+    record_sale(session, sale)
+
+def test_summary_aggregates(engine):
+    with Session(engine) as session:
+        walk_in(session, "Gift wrap", 50, NOW)
+        walk_in(session, "Gift wrap", 30, NOW - timedelta(days=5))
+        walk_in(session, "Gift wrap", 999, NOW - timedelta(days=9)) # outside the week
+        walk_in(session, "Gift wrap", 1, NOW - timedelta(days=40)) # outside the top-items window
+        walk_in(session, "Other shop", 500, NOW, user_id=2)
+        rice = session.get(InventoryItem, 1)
+        kept = place_order(session, 1, "2348099999999", rice, 3)
+        place_order(session, 1, "2348099999998", rice, 1)
+        session.commit()
+        confirm_order(session, kept)
+        session.commit()
+
+        summary = dashboard_summary(session, 1, today=kept.timestamp.date())
+
+    assert summary["revenue"] == {"today": 350.0, "week": 380.0}
+    assert summary["pending_orders"] == 1
+    assert summary["low_stock_items"] == 1 # Beans (1 <= default threshold 5)
+    assert summary["unread_alerts"] == 1
+    assert summary["knowledge_rows"] == 1
+    assert summary["top_items"] == [
+        {"name": "Gift wrap", "quantity": 3, "revenue": 1079.0},
+        {"name": "Rice 50kg", "quantity": 3, "revenue": 300.0},
+    ]
+
+def test_summary_is_cached_until_a_write_commits(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    first = get_dashboard_summary(1)
+    queries = len(statements)
+    assert get_dashboard_summary(1) is first
+    assert len(statements) == queries # served from cache
+
+    with Session(engine) as session:
+        place_order(session, 1, "2348099999999", session.get(InventoryItem, 1), 1)
+        assert get_dashboard_summary(1) is first # not committed yet
+        session.commit()
+
+    assert get_dashboard_summary(1)["pending_orders"] == first["pending_orders"] + 1
+
+def test_rolled_back_write_keeps_cache(engine):
+    first = get_dashboard_summary(1)
+    with Session(engine) as session:
+        place_order(session, 1, "2348099999999", session.get(InventoryItem, 1), 1)
+        session.rollback()
+    assert get_dashboard_summary(1) is first
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import db, main, tenants
+from app.cache import TTLCache
+from app.db import _pool_options, to_async_url
+from app.models import BusinessInfo
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./backend.db", "sqlite+aiosqlite:///./backend.db"),
+    ("sqlite:////var/data/app.db", "sqlite+aiosqlite:////var/data/app.db"),
+    ("postgresql://u:p@db.internal:5432/suzan", "postgresql+asyncpg://u:p@db.internal:5432/suzan"),
+    ("postgresql+psycopg2://u:p@db/suzan?sslmode=require", "postgresql+asyncpg://u:p@db/suzan?ssl=require"),
+    ("mysql://u:p@db/suzan", "mysql://u:p@db/suzan"), # unknown drivers pass through
+])
+def test_async_url_swaps_in_the_async_driver(url, expected):
+    assert to_async_url(url) == expected
+
+def test_only_server_databases_get_a_bounded_pool(monkeypatch):
+    monkeypatch.setattr(db, "IS_SQLITE", True)
+    assert _pool_options() == {}
+
+    monkeypatch.setattr(db, "IS_SQLITE", False)
+    monkeypatch.setattr(db.settings, "DB_POOL_SIZE", 3)
+    monkeypatch.setattr(db.settings, "DB_MAX_OVERFLOW", 7)
+    options = _pool_options()
+    assert (options["pool_size"], options["max_overflow"]) == (3, 7)
+    assert options["pool_pre_ping"] and options["pool_recycle"] < 3600
+
+@pytest.mark.db(owners=2)
+def test_async_endpoint_runs_on_the_async_session(engine, async_sessions, monkeypatch):
+    with Session(engine) as session:
+        row = BusinessInfo(category="Policy", topic="Delivery", details="Free within Lagos", user_id=1)
+        session.add(row)
+        session.commit()
+        row_id = row.id
+
+    for module in (main, tenants):
+        monkeypatch.setattr(module, "AsyncSessionLocal", async_sessions)
+    monkeypatch.setattr(tenants, "_cache", TTLCache(60))
+    deleted = []
+    async def fake_delete_vectors(row_id):
+        deleted.append(row_id)
+    monkeypatch.setattr(main, "delete_business_row_vectors", fake_delete_vectors)
+    client = TestClient(main.app)
+
+    # Another tenant can't delete it
+    assert client.delete(f"/knowledge/{row_id}", params={"phone": "+2348000000002"}).status_code == 404
+    assert client.delete(f"/knowledge/{row_id}", params={"phone": "+2348000000001"}).json() == {"ok": True}
+    assert deleted == [row_id]
+    with Session(engine) as session:
+        assert session.get(BusinessInfo, row_id) is None
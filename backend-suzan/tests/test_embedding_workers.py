@@ -0,0 +1,66 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app import embedding_workers, rag_engine
+from app.embedding_workers import EmbeddingPool, get_embedding_pool, shutdown_embedding_pool
+
+class FakeModel:
+    """Row i encodes texts[i] as [len, checksum, 0, ...], so results can be matched to inputs."""
+    def encode(self, texts, batch_size, convert_to_numpy):
+        rows = np.zeros((len(texts), embedding_workers.EMBEDDING_DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            rows[i, :2] = len(text), sum(map(ord, text))
+        return rows
+
+def fake_init_worker(model_name):
+    # Runs in the spawned worker, which imports this module to find it
+    embedding_workers._model = FakeModel()
+
+def expected(texts):
+    return FakeModel().encode(texts, None, True)
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    monkeypatch.setattr(embedding_workers, "_init_worker", fake_init_worker)
+    yield
+    shutdown_embedding_pool()
+
+def test_two_workers_fill_shared_memory_in_input_order():
+    pool = EmbeddingPool(workers=2, shard_size=3)
+    try:
+        texts = [f"chunk {i} " + "x" * i for i in range(10)]
+        vectors = pool.embed(texts)
+        assert vectors.dtype == np.float32 and vectors.shape == (10, embedding_workers.EMBEDDING_DIM)
+        np.testing.assert_array_equal(vectors, expected(texts))
+        assert pool.embed([]).shape == (0, embedding_workers.EMBEDDING_DIM)
+    finally:
+        pool.shutdown()
+
+def test_embed_texts_uses_the_pool_when_workers_are_configured(monkeypatch):
+    monkeypatch.setattr(rag_engine.settings, "INGEST_WORKERS", 2)
+    texts = ["Rice 50kg - N50,000", "Beans", "Sneakers - N15,000"]
+    vectors = rag_engine.embed_texts(texts)
+    assert isinstance(vectors, list) and len(vectors) == 3
+    np.testing.assert_array_equal(np.array(vectors, dtype=np.float32), expected(texts))
+    assert embedding_workers._pool.workers == 2
+
+def test_concurrent_callers_share_one_pool(monkeypatch):
+    created = []
+    class SlowPool:
+        def __init__(self, workers):
+            time.sleep(0.05) # widen the race window
+            created.append(self)
+        def shutdown(self):
+            pass
+    monkeypatch.setattr(embedding_workers, "EmbeddingPool", SlowPool)
+
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(get_embedding_pool(2))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(pool is created[0] for pool in pools)
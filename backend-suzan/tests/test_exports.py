@@ -0,0 +1,87 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import pytest
+from datetime import datetime
+
+from app import exports
+from app.models import SalesLedger, ChatLog
+
+pytestmark = pytest.mark.db(patch=[exports])
+
+@pytest.fixture(autouse=True)
+def export_db(session, monkeypatch):
+    for i in range(25):
+        session.add(SalesLedger(transaction_id=f"t{i}", item_description=f"Item, {i}", amount=100.0 + i,
+                                customer_name="Walk-in", logged_by="1", user_id=1 + i % 2,
+                                timestamp=datetime(2024, 1, 1, 12, i)))
+    session.add(ChatLog(conversation_id="c", sender="234", message_text='He said "hi"\nthen left', user_id=1,
+                        timestamp=datetime(2024, 1, 2, 9, 30)))
+    session.commit()
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 4) # several cursor batches
+
+def body(response) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(collect())
+
+def test_sales_csv_streams_every_row_for_the_tenant():
+    response = exports.stream_export(exports.sales_export_query(1), exports.SALES_COLUMNS, "csv", "sales")
+    assert response.headers["content-disposition"] == 'attachment; filename="sales.csv"'
+    rows = list(csv.DictReader(io.StringIO(body(response).decode())))
+    assert len(rows) == 13
+    assert rows[0]["item_description"] == "Item, 0"
+    assert rows[0]["timestamp"] == "2024-01-01T12:00:00"
+    assert [int(r["id"]) for r in rows] == sorted(int(r["id"]) for r in rows)
+
+def test_chat_ndjson_is_gzipped_on_request():
+    response = exports.stream_export(exports.chat_export_query(1), exports.CHAT_COLUMNS, "ndjson", "chats", gzip=True)
+    assert response.media_type == "application/gzip"
+    lines = gzip.decompress(body(response)).decode().splitlines()
+    assert [json.loads(line)["message_text"] for line in lines] == ['He said "hi"\nthen left']
+
+def test_empty_export_still_has_a_header():
+    response = exports.stream_export(exports.chat_export_query(2), exports.CHAT_COLUMNS, "csv", "chats")
+    assert body(response).decode().strip() == "id,conversation_id,timestamp,sender,message_text,media_url"
+
+def test_customer_side_of_the_conversation_is_exported(async_sessions, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main, tenants, chat_logger as chat_logger_module
+    from app.cache import TTLCache
+    from app.chat_logger import ChatLogWriter
+
+    writer = ChatLogWriter(interval=60)
+    for module in (main, tenants, chat_logger_module):
+        monkeypatch.setattr(module, "AsyncSessionLocal", async_sessions)
+    monkeypatch.setattr(tenants, "_cache", TTLCache(60))
+    monkeypatch.setattr(main, "chat_logger", writer)
+    sent = []
+    async def answer(text, user_id, customer_phone):
+        return f"Yes, we deliver ({text})"
+    monkeypatch.setattr(main, "answer_from_rag", answer)
+    monkeypatch.setattr(main, "send_whatsapp", lambda to, text: sent.append(to))
+
+    message = {"from": "2348099999999", "id": "wamid.1", "type": "text", "text": {"body": "do you deliver?"}}
+    response = TestClient(main.app).post("/webhook", json={"entry": [{"changes": [{"value": {"messages": [message]}}]}]})
+    assert response.json() == {"mode": "customer"} and sent == ["2348099999999"]
+    asyncio.run(writer.flush())
+
+    response = exports.stream_export(exports.chat_export_query(1), exports.CHAT_COLUMNS, "ndjson", "chats")
+    lines = [json.loads(line) for line in body(response).decode().splitlines()]
+    assert [(line["sender"], line["message_text"]) for line in lines[1:]] == [
+        ("2348099999999", "do you deliver?"), ("Suzan", "Yes, we deliver (do you deliver?)"),
+    ]
+
+def test_migration_attributes_old_customer_logs_to_the_business(engine, session):
+    from sqlalchemy import text
+    from app.migrations import run_migrations
+
+    session.add(ChatLog(conversation_id="old", sender="2348099999999", message_text="legacy", user_id=None))
+    session.commit()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_migrations WHERE version = 14"))
+    assert run_migrations(engine) == [14]
+    response = exports.stream_export(exports.chat_export_query(1), exports.CHAT_COLUMNS, "ndjson", "chats")
+    assert "legacy" in body(response).decode()
@@ -0,0 +1,37 @@
+from app.retrieval import BM25Index, reciprocal_rank_fusion, business_row_text
+
+DOCS = [
+    business_row_text("Product", "Rice", "We sell 50kg for N50,000"),
+    business_row_text("Policy", "Delivery", "Free delivery within Lagos"),
+    "Shoes (Sneakers) - N15,000. Sizes 38 to 45.",
+    "Opening hours: Monday to Saturday, 8am to 6pm.",
+]
+
+def test_bm25_ranks_exact_terms_first():
+    index = BM25Index(DOCS)
+
+    results = index.search("50kg rice", k=2)
+
+    assert results[0][0] == DOCS[0]
+    assert all(score > 0 for _, score in results)
+
+def test_bm25_ignores_docs_without_query_terms():
+    index = BM25Index(DOCS)
+
+    assert index.search("laptop repair") == []
+    assert [text for text, _ in index.search("delivery")] == [DOCS[1]]
+
+def test_rrf_rewards_agreement_between_retrievers():
+    lexical = ["a", "b", "c"]
+    vector = ["c", "d", "a"]
+
+    fused = reciprocal_rank_fusion([lexical, vector])
+
+    # "a" and "c" are in both lists so they beat docs found by only one retriever
+    assert set(fused[:2]) == {"a", "c"}
+    assert fused[0] == "a"
+    assert set(fused) == {"a", "b", "c", "d"}
+
+def test_rrf_handles_a_failed_retriever():
+    assert reciprocal_rank_fusion([["x", "y"]]) == ["x", "y"]
+    assert reciprocal_rank_fusion([]) == []
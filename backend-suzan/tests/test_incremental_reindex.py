@@ -0,0 +1,116 @@
+import pytest
+from sqlmodel import Session, select
+
+from app import ingestion
+from app.jobs import STALE_CLAIM
+from app.models import UploadedFile, DocumentChunk
+
+pytestmark = pytest.mark.db(patch=[ingestion], owners=1)
+
+@pytest.fixture(name="vector_store")
+def vector_store_fixture(monkeypatch):
+    calls = {"embedded": [], "deleted": []}
+
+    def fake_embed_and_upsert(items):
+        calls["embedded"].extend(vector_id for vector_id, _, _ in items)
+        return len(items)
+
+    def fake_delete_vectors(vector_ids):
+        calls["deleted"].extend(vector_ids)
+        return len(vector_ids)
+
+    monkeypatch.setattr(ingestion, "embed_and_upsert", fake_embed_and_upsert)
+    monkeypatch.setattr(ingestion, "delete_vectors", fake_delete_vectors)
+    return calls
+
+@pytest.fixture(name="uploaded")
+def uploaded_fixture(engine, tmp_path, write_pdf):
+    pdf_path = tmp_path / "catalog.pdf"
+    write_pdf(pdf_path, ["Rice 50kg - N50,000", "Beans 10kg - N12,000", "Sneakers - N15,000"])
+
+    with Session(engine) as session:
+        record = UploadedFile(filename="catalog.pdf", filepath=str(pdf_path), user_id=1)
+        session.add(record)
+        session.commit()
+        return record.id, tmp_path
+
+def test_first_upload_embeds_every_chunk(engine, vector_store, uploaded):
+    file_id, _ = uploaded
+    ingestion.run_ingestion_job(file_id)
+
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        assert record.status == "COMPLETED"
+        assert record.pages_done == 3
+        assert record.chunks_indexed == 3
+    assert len(vector_store["embedded"]) == 3
+    assert vector_store["deleted"] == []
+
+def test_reupload_only_embeds_the_edit(engine, vector_store, uploaded, write_pdf):
+    file_id, tmp_path = uploaded
+    ingestion.run_ingestion_job(file_id)
+    vector_store["embedded"].clear()
+
+    # Page 2 changes, page 3 disappears
+    new_path = tmp_path / "catalog_v2.pdf"
+    write_pdf(new_path, ["Rice 50kg - N50,000", "Beans 10kg - N14,000"])
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        old_ids = set(session.exec(select(DocumentChunk.vector_id).where(DocumentChunk.file_id == file_id)).all())
+        ingestion.reset_for_reindex(record, "catalog_v2.pdf", str(new_path))
+        session.add(record)
+        session.commit()
+
+    ingestion.run_ingestion_job(file_id)
+
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        live_ids = set(session.exec(select(DocumentChunk.vector_id).where(DocumentChunk.file_id == file_id)).all())
+        assert record.status == "COMPLETED"
+        assert record.chunks_embedded == 1
+        assert record.chunks_deleted == 2
+        assert record.chunks_indexed == 2
+
+    assert len(vector_store["embedded"]) == 1
+    assert set(vector_store["deleted"]) == old_ids - live_ids
+
+def test_resumed_reindex_still_deletes_vectors_replaced_before_the_crash(engine, vector_store, uploaded, write_pdf, monkeypatch):
+    file_id, tmp_path = uploaded
+    ingestion.run_ingestion_job(file_id)
+    with Session(engine) as session:
+        old_ids = set(session.exec(select(DocumentChunk.vector_id).where(DocumentChunk.file_id == file_id)).all())
+
+    new_path = tmp_path / "catalog_v2.pdf"
+    write_pdf(new_path, ["Rice 50kg - N55,000", "Beans 10kg - N14,000", "Sneakers - N16,000"])
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        ingestion.reset_for_reindex(record, "catalog_v2.pdf", str(new_path))
+        session.add(record)
+        session.commit()
+
+    # Checkpoint after every page; the process dies while embedding the second one
+    monkeypatch.setattr(ingestion, "INGEST_FLUSH_SIZE", 1)
+    embed = ingestion.embed_and_upsert
+    def dying_embed(items):
+        if len(vector_store["embedded"]) >= 4:
+            raise KeyboardInterrupt("deploy")
+        return embed(items)
+    monkeypatch.setattr(ingestion, "embed_and_upsert", dying_embed)
+    with pytest.raises(KeyboardInterrupt):
+        ingestion.run_ingestion_job(file_id)
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        assert record.pages_done == 1
+        record.heartbeat_at -= STALE_CLAIM # the dead run's claim lapses
+        session.add(record)
+        session.commit()
+
+    monkeypatch.setattr(ingestion, "embed_and_upsert", embed)
+    ingestion.run_ingestion_job(file_id)
+
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        live_ids = set(session.exec(select(DocumentChunk.vector_id).where(DocumentChunk.file_id == file_id)).all())
+        assert record.status == "COMPLETED" and record.chunks_indexed == 3
+    assert set(vector_store["deleted"]) == old_ids # including page 1's, replaced before the crash
+    assert not live_ids & old_ids
@@ -0,0 +1,150 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app import ingestion, main
+from app.jobs import STALE_CLAIM
+from app.models import DocumentChunk, UploadedFile
+
+pytestmark = pytest.mark.db(patch=[ingestion, main], owners=1)
+
+PAGES = ["Rice 50kg - N50,000", "Beans 10kg - N12,000", "Sneakers - N15,000"]
+
+@pytest.fixture(name="embedded")
+def embedded_fixture(monkeypatch):
+    embedded = []
+
+    def fake_embed_and_upsert(items):
+        embedded.extend(text for _, text, _ in items)
+        return len(items)
+
+    monkeypatch.setattr(ingestion, "embed_and_upsert", fake_embed_and_upsert)
+    monkeypatch.setattr(ingestion, "delete_vectors", lambda ids: len(ids))
+    monkeypatch.setattr(ingestion, "INGEST_FLUSH_SIZE", 1) # checkpoint after every page
+    return embedded
+
+@pytest.fixture(name="file_id")
+def file_id_fixture(engine, tmp_path, write_pdf):
+    pdf_path = write_pdf(tmp_path / "catalog.pdf", PAGES)
+    with Session(engine) as session:
+        record = UploadedFile(filename="catalog.pdf", filepath=str(pdf_path), user_id=1)
+        session.add(record)
+        session.commit()
+        return record.id
+
+def go_stale(engine, file_id):
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        record.heartbeat_at = datetime.utcnow() - STALE_CLAIM
+        session.add(record)
+        session.commit()
+
+def crash_after(monkeypatch, embedded, pages, error):
+    embed = ingestion.embed_and_upsert
+    def dying_embed(items):
+        if len(embedded) >= pages:
+            raise error
+        return embed(items)
+    monkeypatch.setattr(ingestion, "embed_and_upsert", dying_embed)
+    return embed
+
+def test_interrupted_job_resumes_from_its_checkpoint(engine, embedded, file_id, monkeypatch):
+    embed = crash_after(monkeypatch, embedded, 2, KeyboardInterrupt("deploy"))
+    with pytest.raises(KeyboardInterrupt):
+        ingestion.run_ingestion_job(file_id)
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        assert (record.status, record.pages_done, record.pages_total) == ("PROCESSING", 2, 3)
+
+    monkeypatch.setattr(ingestion, "embed_and_upsert", embed)
+    starts = []
+    iter_pages = ingestion.iter_pdf_pages
+    monkeypatch.setattr(ingestion, "iter_pdf_pages", lambda path, start_page=0: starts.append(start_page) or iter_pages(path, start_page))
+    # Still claimed by the dead run until its heartbeat goes stale
+    assert ingestion.resume_ingestion_jobs() == 0
+    go_stale(engine, file_id)
+    assert ingestion.resume_ingestion_jobs() == 1
+
+    assert starts == [2] # read from the checkpoint, not page 1
+    assert embedded == PAGES # pages 1-2 weren't embedded twice
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        assert (record.status, record.pages_done, record.chunks_embedded, record.chunks_indexed) == ("COMPLETED", 3, 3, 3)
+
+def test_failed_job_records_the_error_and_is_not_resumed(engine, embedded, file_id, monkeypatch):
+    crash_after(monkeypatch, embedded, 1, RuntimeError("Pinecone unavailable"))
+    ingestion.run_ingestion_job(file_id)
+
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        assert record.status == "FAILED" and record.error == "Pinecone unavailable"
+        assert record.pages_done == 1 # the last checkpoint survives the rollback
+
+    assert ingestion.resume_ingestion_jobs() == 0
+    assert embedded == PAGES[:1]
+
+def test_a_job_queued_twice_runs_once(engine, embedded, file_id, monkeypatch):
+    # The second run starts while the first is mid-way (e.g. a replace plus the startup sweep)
+    embed = ingestion.embed_and_upsert
+    def embed_and_start_another(items):
+        if not embedded:
+            ingestion.run_ingestion_job(file_id)
+        return embed(items)
+    monkeypatch.setattr(ingestion, "embed_and_upsert", embed_and_start_another)
+    ingestion.run_ingestion_job(file_id)
+
+    assert embedded == PAGES
+    with Session(engine) as session:
+        record = session.get(UploadedFile, file_id)
+        assert (record.status, record.chunks_indexed) == ("COMPLETED", 3)
+        assert len(session.exec(select(DocumentChunk).where(DocumentChunk.file_id == file_id)).all()) == 3
+
+def test_status_endpoint_reports_progress(engine, embedded, file_id):
+    client = TestClient(main.app)
+    response = client.get(f"/files/{file_id}/status")
+    assert response.status_code == 200
+    assert response.json()["status"] == "PENDING" and response.json()["progress"] == 0.0
+
+    ingestion.run_ingestion_job(file_id)
+    body = client.get(f"/files/{file_id}/status").json()
+    assert body == {
+        "id": file_id, "filename": "catalog.pdf", "status": "COMPLETED",
+        "pages_done": 3, "pages_total": 3, "chunks_indexed": 3, "chunks_embedded": 3, "chunks_deleted": 0,
+        "progress": 1.0, "error": None,
+    }
+
+    assert client.get("/files/999/status").status_code == 404
+
+def test_replacing_a_file_still_queued_is_refused(engine, async_sessions, file_id, monkeypatch):
+    monkeypatch.setattr(main, "AsyncSessionLocal", async_sessions)
+    queued = []
+    monkeypatch.setattr(main, "run_ingestion_job", queued.append)
+    response = TestClient(main.app).put(f"/files/{file_id}", files={"file": ("catalog_v2.pdf", b"%PDF-1.4", "application/pdf")})
+    assert response.status_code == 409 and queued == []
+
+def test_uploads_from_before_the_manifest_are_reindexed(engine, embedded, file_id):
+    from sqlalchemy import text
+    from app.migrations import run_migrations
+
+    with Session(engine) as session:
+        legacy = session.get(UploadedFile, file_id)
+        legacy.status = "COMPLETED" # what migration 0002 gave existing rows
+        session.add(legacy)
+        session.commit()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_migrations WHERE version = 16"))
+    assert run_migrations(engine) == [16]
+
+    assert ingestion.resume_ingestion_jobs() == 1
+    assert embedded == PAGES
+    with Session(engine) as session:
+        assert session.get(UploadedFile, file_id).status == "COMPLETED"
+        assert len(session.exec(select(DocumentChunk).where(DocumentChunk.file_id == file_id)).all()) == 3
+
+    with engine.begin() as conn: # a file with a manifest isn't queued again
+        conn.execute(text("DELETE FROM schema_migrations WHERE version = 16"))
+    run_migrations(engine)
+    with Session(engine) as session:
+        assert session.get(UploadedFile, file_id).status == "COMPLETED"
@@ -0,0 +1,116 @@
+import io
+from datetime import datetime
+import pytest
+from sqlmodel import select
+
+from app import inventory_import
+from app.inventory_import import iter_import_rows, import_inventory, ImportFormatError
+from app.models import InventoryItem
+from app.search import search_inventory
+
+@pytest.fixture(autouse=True)
+def catalog(session):
+    session.add(InventoryItem(user_id=1, name="Sneakers", price=10000, stock=1, description="Canvas"))
+    session.add(InventoryItem(user_id=2, name="Sneakers", price=1, stock=1))
+    session.commit()
+
+def csv_rows(text: str):
+    return iter_import_rows("stock.csv", io.BytesIO(text.encode("utf-8-sig")))
+
+def items(session, user_id):
+    rows = session.exec(select(InventoryItem).where(InventoryItem.user_id == user_id).order_by(InventoryItem.name)).all()
+    return [(i.name, i.price, i.stock, i.description) for i in rows]
+
+def test_csv_import_upserts_and_reports_bad_rows(session, monkeypatch):
+    monkeypatch.setattr(inventory_import, "IMPORT_BATCH_SIZE", 2)
+    report = import_inventory(session, 1, csv_rows(
+        "Product Name,Price,Qty\n"
+        "Sneakers,\"₦15,000\",4\n"
+        "Rice (50kg),60000,2\n"
+        ",100,1\n"
+        "\n"
+        "Beans,abc,1\n"
+        "Garri,500,2.5\n"
+        "Stickers,500,100\n"
+    ))
+    assert report["imported"] == 3
+    assert report["errors"] == [
+        {"row": 4, "error": "name is required"},
+        {"row": 6, "error": "price 'abc' is not a number"},
+        {"row": 7, "error": "stock '2.5' must be a whole number >= 0"},
+    ]
+    # Existing product updated in place (description kept), others created, other tenant untouched
+    assert items(session, 1) == [
+        ("Rice (50kg)", 60000.0, 2, None),
+        ("Sneakers", 15000.0, 4, "Canvas"),
+        ("Stickers", 500.0, 100, None),
+    ]
+    assert items(session, 2) == [("Sneakers", 1.0, 1, None)]
+    assert search_inventory(session, 1, "stickers")[0].name == "Stickers"
+
+def test_xlsx_import(session):
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    workbook.active.append(["name", "price", "stock", "description"])
+    workbook.active.append(["Bottled Water", 200, 24, "Pack of 12"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+
+    report = import_inventory(session, 1, iter_import_rows("stock.xlsx", buffer))
+    assert report == {"imported": 1, "errors": []}
+    assert ("Bottled Water", 200.0, 24, "Pack of 12") in items(session, 1)
+
+def test_rejects_files_without_required_columns(session):
+    with pytest.raises(ImportFormatError):
+        import_inventory(session, 1, csv_rows("sku,qty\nA1,3\n"))
+    with pytest.raises(ImportFormatError):
+        iter_import_rows("stock.pdf", io.BytesIO(b""))
+
+def test_a_name_repeated_in_the_file_is_one_product(session):
+    report = import_inventory(session, 1, csv_rows("name,price,stock\nGarri,500,2\nGarri,450,3\n"))
+    assert report == {"imported": 1, "errors": []}
+    assert ("Garri", 450.0, 3, None) in items(session, 1)
+
+def test_corrupt_xlsx_is_a_format_error(session):
+    pytest.importorskip("openpyxl")
+    with pytest.raises(ImportFormatError):
+        import_inventory(session, 1, iter_import_rows("stock.xlsx", io.BytesIO(b"PK\x03\x04 not really a workbook")))
+
+def test_unique_names_migration_merges_duplicates(engine, session):
+    from sqlalchemy import text
+    from app.migrations import run_migrations
+    from app.models import OrderQuote, SalesLedger
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_inventoryitem_user_id_name"))
+        conn.execute(text("DELETE FROM schema_migrations WHERE version = 7"))
+    session.add_all([InventoryItem(user_id=1, name="Sneakers", price=12000, stock=3, description="Suede"),
+                     InventoryItem(user_id=1, name="Sneakers", price=11000, stock=2)])
+    session.commit()
+    duplicate_ids = session.exec(select(InventoryItem.id).where(InventoryItem.user_id == 1, InventoryItem.name == "Sneakers")).all()
+    session.add(SalesLedger(transaction_id="t1", item_description="Sneakers", amount=12000, logged_by="bot", user_id=1,
+                            inventory_item_id=duplicate_ids[-1]))
+    session.add(OrderQuote(user_id=1, customer_phone="2348099999999", inventory_item_id=duplicate_ids[1],
+                           item_name="Sneakers", quantity=1, unit_price=12000, expires_at=datetime(2030, 1, 1)))
+    session.commit()
+
+    assert run_migrations(engine) == [7]
+    session.expire_all()
+    assert items(session, 1) == [("Sneakers", 10000.0, 6, "Canvas")]
+    kept = duplicate_ids[0]
+    assert session.exec(select(SalesLedger.inventory_item_id)).all() == [kept]
+    assert session.exec(select(OrderQuote.inventory_item_id)).all() == [kept]
+
+def test_import_endpoint_rejects_a_corrupt_xlsx_with_400(engine, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main, tenants
+    from app.cache import TTLCache
+
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(tenants, "engine", engine)
+    monkeypatch.setattr(tenants, "_cache", TTLCache(60))
+    response = TestClient(main.app).post("/inventory/import", data={"phone": "+2348000000001"},
+                                         files={"file": ("stock.xlsx", b"PK\x03\x04 not really a workbook")})
+    assert response.status_code == 400
+    assert "xlsx" in response.json()["detail"]
@@ -0,0 +1,107 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from app import knowledge, rag_engine
+from app.knowledge import save_business_facts
+from app.models import BusinessInfo
+
+pytestmark = pytest.mark.db(owners=1)
+
+FACTS = [
+    SimpleNamespace(category="Product", topic="Rice", details="50kg for 50k"),
+    SimpleNamespace(category="Policy", topic="Delivery", details="Free within Lagos"),
+    SimpleNamespace(category="Service", topic="Opening Hours", details="8am to 6pm"),
+]
+
+class FakeIndex:
+    def __init__(self):
+        self.upserts = []
+        self.embed_calls = []
+        self.timeline = [] # "embed", "upsert" and SQL statements, in order
+
+    def upsert(self, vectors):
+        self.timeline.append("upsert")
+        self.upserts.append(vectors)
+
+@pytest.fixture(name="index")
+def index_fixture(monkeypatch):
+    index = FakeIndex()
+
+    def fake_embed_texts(texts):
+        index.timeline.append("embed")
+        index.embed_calls.append(list(texts))
+        return [[float(i)] for i in range(len(texts))]
+
+    monkeypatch.setattr(rag_engine, "get_pinecone_index", lambda: index)
+    for module in (rag_engine, knowledge):
+        monkeypatch.setattr(module, "embed_texts", fake_embed_texts)
+    return index
+
+@pytest.fixture(name="statements")
+def statements_fixture(async_sessions, index):
+    statements = []
+    sync_engine = async_sessions.kw["bind"].sync_engine
+    def listener(conn, cursor, statement, params, context, executemany):
+        statements.append(statement)
+        index.timeline.append(statement)
+    event.listen(sync_engine, "before_cursor_execute", listener)
+    yield statements
+    event.remove(sync_engine, "before_cursor_execute", listener)
+
+def save(async_sessions, facts, commit=True):
+    async def scenario():
+        async with async_sessions() as session:
+            count = await save_business_facts(session, 1, facts)
+            if commit:
+                await session.commit()
+            return count
+    return asyncio.run(scenario())
+
+def test_facts_are_saved_with_one_insert_and_indexed_in_one_batch(async_sessions, session, index, statements):
+    executes = []
+    listener = lambda state: executes.append(state.statement)
+    event.listen(Session, "do_orm_execute", listener)
+    try:
+        assert save(async_sessions, FACTS) == 3
+    finally:
+        event.remove(Session, "do_orm_execute", listener)
+    assert len(executes) == 1 and executes[0]._sort_by_parameter_order # RETURNING ids come back in input order
+
+    # One executemany of INSERT ... RETURNING. PostgreSQL sends it as one statement; SQLite
+    # can't promise RETURNING order across a multi-row VALUES, so SQLAlchemy sends one per row
+    # there to honour sort_by_parameter_order.
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO BUSINESSINFO")]
+    assert inserts and all("RETURNING" in s.upper() for s in inserts)
+    assert len(index.embed_calls) == 1 and len(index.upserts) == 1
+    # Embedding happens before the INSERT opens the write transaction; only the upsert is inside it
+    first_insert = index.timeline.index(inserts[0])
+    assert index.timeline.index("embed") < first_insert < index.timeline.index("upsert")
+
+    rows = session.exec(select(BusinessInfo).order_by(BusinessInfo.id)).all()
+    assert [row.topic for row in rows] == ["Rice", "Delivery", "Opening Hours"]
+    vectors = {v["id"]: v for v in index.upserts[0]}
+    assert set(vectors) == {f"row-{row.id}" for row in rows}
+    for i, row in enumerate(rows): # each vector carries its own row's id, text and embedding
+        metadata = vectors[f"row-{row.id}"]["metadata"]
+        assert vectors[f"row-{row.id}"]["values"] == [float(i)]
+        assert metadata["row_id"] == row.id and metadata["user_id"] == 1
+        assert metadata["text"] == f"{row.category} - {row.topic}: {row.details}"
+    assert index.embed_calls[0] == [vectors[f"row-{row.id}"]["metadata"]["text"] for row in rows]
+
+def test_a_failed_upsert_leaves_no_rows(async_sessions, session, index, monkeypatch):
+    def down(vectors):
+        raise RuntimeError("Pinecone unavailable")
+    monkeypatch.setattr(index, "upsert", down)
+
+    with pytest.raises(RuntimeError):
+        save(async_sessions, FACTS)
+    assert session.exec(select(BusinessInfo)).all() == []
+
+def test_no_facts_is_a_no_op(async_sessions, index, statements):
+    assert save(async_sessions, []) == 0
+    assert statements == [] and index.embed_calls == []
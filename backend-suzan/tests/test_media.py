@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+
+from app import media, storage
+from app.media import MediaDownloadError, fetch_media, graph_media_url, media_path, prune_media_cache
+
+class FakeGraph:
+    """Graph API stand-in: media id -> download URL -> bytes, counting requests."""
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def __call__(self, request: httpx.Request):
+        self.requests.append(request.url.path)
+        assert request.headers["Authorization"].startswith("Bearer ")
+        if request.url.host == "graph.facebook.com":
+            media_id = request.url.path.rsplit("/", 1)[-1]
+            if media_id not in self.files:
+                return httpx.Response(404, json={"error": {"message": "Unknown media"}})
+            return httpx.Response(200, json={"url": f"https://lookaside.fbsbx.com/media/{media_id}", "id": media_id})
+        return httpx.Response(200, content=self.files[request.url.path.rsplit("/", 1)[-1]])
+
+@pytest.fixture(name="graph")
+def graph_fixture(tmp_path, monkeypatch):
+    graph = FakeGraph({"111": b"OggS voice note", "222": b"\xff\xd8 jpeg"})
+    monkeypatch.setattr(media, "MEDIA_DIR", str(tmp_path / "media"))
+    monkeypatch.setattr(storage, "TMP_DIR", str(tmp_path / "tmp"))
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_SIZE", 4) # many reads per download
+    monkeypatch.setattr(media, "_client", httpx.AsyncClient(transport=httpx.MockTransport(graph)))
+    monkeypatch.setattr(media, "_download_slots", asyncio.Semaphore(2))
+    return graph
+
+def test_media_path_uses_the_mime_type():
+    assert media_path("111", "audio/ogg; codecs=opus").endswith(os.path.join("media", "111.ogg"))
+    assert media_path("222", "image/jpeg").endswith("222.jpg")
+    assert media_path("333", None).endswith("333.bin")
+
+def test_media_is_downloaded_once_and_cached_on_disk(graph):
+    path = asyncio.run(fetch_media("111", "audio/ogg; codecs=opus"))
+    assert open(path, "rb").read() == b"OggS voice note"
+    assert graph.requests == ["/v22.0/111", "/media/111"]
+
+    assert asyncio.run(fetch_media("111", "audio/ogg; codecs=opus")) == path
+    assert len(graph.requests) == 2
+
+def test_concurrent_fetches_of_one_id_share_a_download(graph):
+    async def scenario():
+        return await asyncio.gather(*(fetch_media("222", "image/jpeg") for _ in range(5)))
+    paths = asyncio.run(scenario())
+    assert len(set(paths)) == 1
+    assert graph.requests == ["/v22.0/222", "/media/222"]
+
+def test_failed_download_raises_and_leaves_nothing(graph, tmp_path):
+    with pytest.raises(MediaDownloadError):
+        asyncio.run(fetch_media("999", "audio/ogg"))
+    assert not os.path.exists(tmp_path / "media" / "999.ogg")
+
+def test_oversized_media_is_rejected(graph, monkeypatch, tmp_path):
+    monkeypatch.setattr(media.settings, "MAX_UPLOAD_MB", 0)
+    with pytest.raises(MediaDownloadError):
+        asyncio.run(fetch_media("111", "audio/ogg"))
+    assert os.listdir(tmp_path / "tmp") == [] # the partial download is cleaned up
+    assert not os.path.exists(media_path("111", "audio/ogg"))
+
+def test_graph_media_url_is_what_chat_logs_keep():
+    assert graph_media_url("111") == "https://graph.facebook.com/v22.0/111"
+
+def test_prune_removes_only_old_files(graph, tmp_path):
+    old = asyncio.run(fetch_media("111", "audio/ogg"))
+    new = asyncio.run(fetch_media("222", "image/jpeg"))
+    week_ago = time.time() - 8 * 86400
+    os.utime(old, (week_ago, week_ago))
+    assert prune_media_cache(max_age_days=7) == 1
+    assert not os.path.exists(old) and os.path.exists(new)
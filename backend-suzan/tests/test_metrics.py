@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.tools import tool
+from prometheus_client import REGISTRY
+
+from app import metrics
+from app.metrics import llm_callbacks, model_label, request_timer, set_tenant, timed, timed_message
+
+def stage_count(stage, tier="-", model="-"):
+    return REGISTRY.get_sample_value("suzan_stage_seconds_count", {"stage": stage, "tier": tier, "model": model}) or 0
+
+def error_count(stage, tier="-", model="-"):
+    return REGISTRY.get_sample_value("suzan_stage_errors_total", {"stage": stage, "tier": tier, "model": model}) or 0
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(metrics.settings, "TENANT_TIERS", {"7": "premium"})
+    monkeypatch.setattr(metrics.settings, "SLOW_REQUEST_MS", 0)
+    return metrics.settings
+
+def test_stages_are_labelled_by_tier_and_model():
+    async def turn():
+        set_tenant(7)
+        with model_label("llama-test"):
+            with timed("history_load"):
+                pass
+        with pytest.raises(RuntimeError), timed("whatsapp_send"):
+            raise RuntimeError("Graph API down")
+
+    before = stage_count("history_load", "premium", "llama-test"), error_count("whatsapp_send", "premium")
+    asyncio.run(turn())
+    assert stage_count("history_load", "premium", "llama-test") == before[0] + 1
+    assert error_count("whatsapp_send", "premium") == before[1] + 1
+    assert metrics.tenant_tier(8) == "standard" and metrics.tenant_tier(None) == "-"
+
+def test_llm_calls_and_tools_are_timed_through_the_callback():
+    @tool
+    def check_stock(item: str) -> str:
+        """Looks up stock."""
+        return f"{item}: 3 left"
+
+    async def turn():
+        set_tenant(8)
+        with model_label("llama-test"):
+            await FakeListChatModel(responses=["one", "two"]).abatch(["hi", "there"], config={"callbacks": llm_callbacks})
+            await check_stock.ainvoke({"item": "rice"}, config={"callbacks": llm_callbacks})
+
+    llm_before, tool_before = stage_count("llm", "standard", "llama-test"), stage_count("tool:check_stock", "standard", "llama-test")
+    asyncio.run(turn())
+    assert stage_count("llm", "standard", "llama-test") == llm_before + 2 # one per call
+    assert stage_count("tool:check_stock", "standard", "llama-test") == tool_before + 1
+    assert not llm_callbacks[0]._runs
+
+def test_slow_requests_print_their_stage_breakdown(capsys, settings):
+    with request_timer("POST /webhook"):
+        with timed("webhook_parse"):
+            pass
+        with request_timer("customer message"): # nested: collects into the outer one
+            with timed("llm"):
+                pass
+    out = capsys.readouterr().out
+    assert out.count("🐢") == 1
+    assert "POST /webhook took" in out and "webhook_parse=" in out and "llm=" in out
+
+    settings.SLOW_REQUEST_MS = 60_000
+    with request_timer("GET /dashboard/summary"):
+        pass
+    assert capsys.readouterr().out == ""
+
+def test_background_work_after_the_request_gets_its_own_breakdown(capsys):
+    @timed_message("customer message")
+    async def handle():
+        with timed("vector_search"):
+            pass
+
+    async def scenario():
+        with request_timer("POST /webhook"):
+            task = asyncio.create_task(handle()) # inherits the request's context
+        await task
+
+    asyncio.run(scenario())
+    lines = capsys.readouterr().out.splitlines()
+    assert any("POST /webhook" in line and "vector_search" not in line for line in lines)
+    assert any("customer message" in line and "vector_search=" in line for line in lines)
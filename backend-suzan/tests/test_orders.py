@@ -0,0 +1,117 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlmodel import Session, select
+
+from app import orders, tools
+from app.models import InventoryItem, SalesLedger, OrderQuote
+from app.orders import place_order, confirm_order, cancel_order, expire_pending_orders, save_quote, place_quoted_order
+from app.rollups import sales_totals
+
+pytestmark = pytest.mark.db(patch=[orders, tools], owners=1, wal=True) # WAL + busy_timeout, as in production
+
+@pytest.fixture(autouse=True)
+def catalog(engine):
+    with Session(engine) as session:
+        session.add(InventoryItem(user_id=1, name="Rice 50kg", price=50000, stock=5))
+        session.commit()
+
+def stock(engine):
+    with Session(engine) as session:
+        return session.get(InventoryItem, 1).stock
+
+def order(engine, quantity, customer="2348099999999"):
+    with Session(engine) as session:
+        sale = place_order(session, 1, customer, session.get(InventoryItem, 1), quantity)
+        session.commit()
+        return sale.id if sale else None
+
+def test_parallel_orders_never_oversell(engine):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: order(engine, 1, f"23480999999{i:02d}"), range(20)))
+
+    assert sum(r is not None for r in results) == 5
+    assert stock(engine) == 0
+    with Session(engine) as session:
+        assert len(session.exec(select(SalesLedger).where(SalesLedger.status == "PENDING")).all()) == 5
+
+def test_order_larger_than_stock_is_refused(engine):
+    assert order(engine, 6) is None
+    assert stock(engine) == 5
+    assert order(engine, 5) is not None
+    assert stock(engine) == 0
+
+def test_expiry_releases_stock_and_moves_rollups(engine):
+    sale_id = order(engine, 2)
+    assert stock(engine) == 3
+
+    assert expire_pending_orders(now=datetime.utcnow()) == 0
+    assert expire_pending_orders(now=datetime.utcnow() + timedelta(hours=1)) == 1
+    assert stock(engine) == 5
+
+    with Session(engine) as session:
+        sale = session.get(SalesLedger, sale_id)
+        assert sale.status == "EXPIRED"
+        assert confirm_order(session, sale) is False # too late
+        today = sale.timestamp.date()
+        assert sales_totals(session, 1, today, today) == {"PENDING": (0.0, 0), "EXPIRED": (100000.0, 1)}
+
+def test_confirm_keeps_stock_and_cancel_releases_once(engine):
+    kept, cancelled = order(engine, 1), order(engine, 2)
+    with Session(engine) as session:
+        assert confirm_order(session, session.get(SalesLedger, kept))
+        sale = session.get(SalesLedger, cancelled)
+        assert cancel_order(session, sale)
+        assert not cancel_order(session, sale)
+        session.commit()
+    assert stock(engine) == 4
+    assert expire_pending_orders(now=datetime.utcnow() + timedelta(days=1)) == 0
+
+def test_button_orders_the_quoted_item_once(engine):
+    with Session(engine) as session:
+        save_quote(session, 1, "+234 809 999 9999", session.get(InventoryItem, 1), 3)
+        session.commit()
+
+    sale, reply = place_quoted_order(1, "2348099999999")
+    assert sale.item_description == "3 x Rice 50kg" and sale.amount == 150000
+    assert "Order placed" in reply
+    assert stock(engine) == 2
+
+    again, reply = place_quoted_order(1, "2348099999999")
+    assert again is None and "couldn't find a recent quote" in reply
+    assert stock(engine) == 2
+
+def test_requote_replaces_and_stale_quote_is_refused(engine):
+    with Session(engine) as session:
+        item = session.get(InventoryItem, 1)
+        save_quote(session, 1, "2348099999999", item, 1)
+        save_quote(session, 1, "2348099999999", item, 2)
+        session.commit()
+        quotes = session.exec(select(OrderQuote)).all()
+        assert [q.quantity for q in quotes] == [2]
+        quotes[0].expires_at = datetime.utcnow() - timedelta(minutes=1)
+        session.add(quotes[0])
+        session.commit()
+
+    sale, _ = place_quoted_order(1, "2348099999999")
+    assert sale is None
+    assert stock(engine) == 5
+
+def test_quote_tool_uses_the_turn_customer_not_the_model(engine):
+    from app.models import User
+    from app.tenants import Tenant, current_customer, current_tenant
+
+    with Session(engine) as session:
+        tenant = Tenant.from_user(session.get(User, 1))
+    tenant_token, customer_token = current_tenant.set(tenant), current_customer.set("2348099999999")
+    try:
+        # A prompt-injected customer number in the tool call is ignored
+        reply = tools.quote_order.invoke({"item_name": "rice", "quantity": 2, "customer_phone": "2348011111111"})
+    finally:
+        current_tenant.reset(tenant_token)
+        current_customer.reset(customer_token)
+    assert reply.startswith("Quote: 2 x Rice 50kg")
+
+    assert place_quoted_order(1, "2348011111111")[0] is None
+    sale, _ = place_quoted_order(1, "2348099999999")
+    assert sale.item_description == "2 x Rice 50kg"
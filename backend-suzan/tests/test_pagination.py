@@ -0,0 +1,63 @@
+import json
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+
+from app import main, tenants
+from app.cache import TTLCache
+from app.models import Alert
+from app.pagination import fetch_page, page_response, DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER
+
+@pytest.fixture(autouse=True)
+def alerts(session):
+    session.add_all([Alert(type="System", message=f"m{i}", user_id=1 + i % 2, created_at=datetime(2024, 1, 1)) for i in range(25)])
+    session.commit()
+
+COLUMNS = [Alert.id, Alert.message, Alert.created_at]
+
+def test_pages_walk_the_tenant_newest_first(session):
+    seen, after_id = [], None
+    while True:
+        rows, after_id = fetch_page(session, Alert, COLUMNS + [Alert.user_id], 1, after_id, limit=5)
+        seen.extend(rows)
+        if after_id is None:
+            break
+    ids = [row["id"] for row in seen]
+    assert len(ids) == 13
+    assert ids == sorted(ids, reverse=True)
+    assert {row["user_id"] for row in seen} == {1}
+
+def test_only_selected_columns_are_returned(session):
+    rows, _ = fetch_page(session, Alert, COLUMNS, 1, limit=1)
+    assert set(rows[0]) == {"id", "message", "created_at"}
+
+def test_last_page_has_no_cursor(session):
+    rows, after_id = fetch_page(session, Alert, COLUMNS, 2, limit=12)
+    assert len(rows) == 12 and after_id is None
+
+def test_page_response_serializes_rows_and_cursor(session):
+    rows, after_id = fetch_page(session, Alert, COLUMNS, 1, limit=2)
+    response = page_response(rows, after_id)
+    body = json.loads(response.body)
+    assert body[0]["created_at"] == "2024-01-01T00:00:00"
+    assert response.headers[NEXT_CURSOR_HEADER] == str(rows[-1]["id"])
+
+def test_without_limit_or_cursor_every_row_is_returned(session, monkeypatch):
+    monkeypatch.setattr("app.pagination.DEFAULT_PAGE_SIZE", 5)
+    rows, after_id = fetch_page(session, Alert, COLUMNS, 1)
+    assert len(rows) == 13 and after_id is None
+    rows, after_id = fetch_page(session, Alert, COLUMNS, 1, after_id=rows[0]["id"] + 1)
+    assert len(rows) == 5 and after_id == rows[-1]["id"] # a cursor alone pages at the default size
+
+@pytest.mark.db(patch=[main, tenants])
+def test_list_endpoint_paginates_only_when_asked(session, monkeypatch):
+    monkeypatch.setattr(tenants, "_cache", TTLCache(60))
+    session.add_all([Alert(type="System", message=f"x{i}", user_id=1) for i in range(DEFAULT_PAGE_SIZE)])
+    session.commit()
+    client = TestClient(main.app)
+
+    response = client.get("/alerts", params={"phone": "+2348000000001"})
+    assert len(response.json()) == DEFAULT_PAGE_SIZE + 13 and NEXT_CURSOR_HEADER not in response.headers
+
+    response = client.get("/alerts", params={"phone": "+2348000000001", "limit": 10})
+    assert len(response.json()) == 10 and response.headers[NEXT_CURSOR_HEADER] == str(response.json()[-1]["id"])
@@ -0,0 +1,63 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import text
+from sqlmodel import select, func
+
+from app.migrations import run_migrations, MIGRATIONS
+from app.models import ChatLog, SalesLedger, InventoryItem, BusinessInfo, Alert, UploadedFile
+
+# Keeps the hot queries on their indexes: if a query or an index changes shape,
+# SQLite falls back to "SCAN <table>" and the matching test fails.
+
+def query_plan(engine, statement) -> str:
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+def test_migrations_are_recorded_and_idempotent(engine):
+    with engine.connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()
+    assert versions == [version for version, _, _ in MIGRATIONS]
+    assert run_migrations(engine) == []
+
+def test_customer_history_uses_sender_timestamp_index(engine):
+    stmt = select(ChatLog).where(ChatLog.sender == "2348012345678").order_by(ChatLog.timestamp.desc()).limit(10)
+    plan = query_plan(engine, stmt)
+    assert "ix_chatlog_sender_timestamp" in plan
+    assert "TEMP B-TREE" not in plan # ORDER BY is served by the index
+
+def test_admin_history_uses_user_timestamp_index(engine):
+    stmt = select(ChatLog).where(ChatLog.user_id == 1).order_by(ChatLog.timestamp.desc()).limit(10)
+    plan = query_plan(engine, stmt)
+    assert "ix_chatlog_user_id_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_sales_analytics_uses_ledger_index(engine):
+    stmt = select(func.sum(SalesLedger.amount), func.count(SalesLedger.id)).where(
+        SalesLedger.user_id == 1,
+        SalesLedger.timestamp >= datetime(2024, 1, 1),
+        SalesLedger.status == "COMPLETED",
+    )
+    assert "ix_salesledger_user_id_status_timestamp" in query_plan(engine, stmt)
+
+def test_inventory_lookup_uses_user_name_index(engine):
+    stmt = select(InventoryItem).where(InventoryItem.user_id == 1, InventoryItem.name == "Rice")
+    assert "ix_inventoryitem_user_id_name" in query_plan(engine, stmt)
+
+def test_knowledge_list_uses_user_index(engine):
+    stmt = select(BusinessInfo).where(BusinessInfo.user_id == 1)
+    assert "ix_businessinfo_user_id_id" in query_plan(engine, stmt)
+
+def test_alerts_list_uses_user_created_index(engine):
+    stmt = select(Alert).where(Alert.user_id == 1).order_by(Alert.created_at.desc())
+    plan = query_plan(engine, stmt)
+    assert "ix_alert_user_id_created_at" in plan
+    assert "TEMP B-TREE" not in plan
+
+@pytest.mark.parametrize("model", [SalesLedger, InventoryItem, Alert, BusinessInfo, UploadedFile])
+def test_list_pages_use_keyset_index(engine, model):
+    stmt = select(model.id).where(model.user_id == 1, model.id < 5000).order_by(model.id.desc()).limit(101)
+    plan = query_plan(engine, stmt)
+    assert f"ix_{model.__tablename__}_user_id_id" in plan
+    assert "TEMP B-TREE" not in plan
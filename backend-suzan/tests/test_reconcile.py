@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import Session
+
+from app import reconcile as reconcile_module, scheduler
+from app.models import BusinessInfo, DocumentChunk, UploadedFile
+from app.reconcile import reconcile
+
+pytestmark = pytest.mark.db(patch=[reconcile_module], owners=1)
+
+class FakeIndex:
+    """The slice of the Pinecone index API reconcile uses: list_paginated, fetch, delete."""
+    def __init__(self, vectors):
+        self.vectors = dict(vectors) # id -> metadata
+        self.pages_listed = 0
+
+    def list_paginated(self, limit, prefix=None, pagination_token=None):
+        ids = sorted(vid for vid in self.vectors if vid.startswith(prefix or "") and vid > (pagination_token or ""))
+        self.pages_listed += 1
+        page = ids[:limit]
+        return SimpleNamespace( # the token is a cursor, so deletes between pages don't skip ids
+            vectors=[SimpleNamespace(id=vid) for vid in page],
+            pagination=SimpleNamespace(next=page[-1]) if len(ids) > limit else None,
+        )
+
+    def fetch(self, ids):
+        return SimpleNamespace(vectors={
+            vid: SimpleNamespace(id=vid, metadata=self.vectors[vid]) for vid in ids if vid in self.vectors
+        })
+
+    def delete(self, ids):
+        for vid in ids:
+            self.vectors.pop(vid, None)
+
+@pytest.fixture(name="index")
+def index_fixture(engine, monkeypatch):
+    with Session(engine) as session:
+        session.add(BusinessInfo(id=1, category="Product", topic="Rice", details="50kg for 50k", user_id=1))
+        session.add(BusinessInfo(id=2, category="Policy", topic="Delivery", details="Free within Lagos", user_id=1))
+        session.add(UploadedFile(id=10, filename="menu.pdf", filepath="x", status="COMPLETED", user_id=1))
+        session.add(UploadedFile(id=11, filename="new.pdf", filepath="y", status="PROCESSING", user_id=1))
+        session.add(DocumentChunk(file_id=10, page_number=0, page_hash="p", chunk_hash="a", vector_id="file-10-a", content="Jollof rice"))
+        session.add(DocumentChunk(file_id=10, page_number=0, page_hash="p", chunk_hash="b", vector_id="file-10-b", content="Fried rice"))
+        session.commit()
+
+    index = FakeIndex({
+        "row-1": {"row_id": 1},            # live
+        "row-9": {"row_id": 9},            # orphan: the fact was deleted
+        "file-10-a": {"file_id": 10},      # live
+        "file-10-old": {"file_id": 10},    # orphan: replaced chunk
+        "file-11-new": {"file_id": 11},    # in-flight ingestion, manifest not committed yet
+        "legacy-x": {"file_id": 99},       # pre-structured id of a deleted file
+        "legacy-y": {"row_id": 2},         # pre-structured id of a live fact: replaced by row-2
+        "legacy-z": {"file_id": 10},       # pre-structured id of a file re-indexed since
+        "legacy-w": {"file_id": 11},       # pre-structured id of a file not re-indexed yet
+        # missing: row-2 and file-10-b
+    })
+    upserted, invalidated = [], []
+
+    def fake_embed_and_upsert(items):
+        for vector_id, text, metadata in items:
+            upserted.append((vector_id, text))
+            index.vectors[vector_id] = metadata
+        return len(items)
+
+    monkeypatch.setattr(reconcile_module, "PAGE_SIZE", 3) # several list pages
+    monkeypatch.setattr(reconcile_module, "get_pinecone_index", lambda: index)
+    monkeypatch.setattr(reconcile_module, "delete_vectors", lambda ids: index.delete(ids) or len(ids))
+    monkeypatch.setattr(reconcile_module, "embed_and_upsert", fake_embed_and_upsert)
+    monkeypatch.setattr(reconcile_module, "invalidate_lexical_index", invalidated.append)
+    index.upserted, index.invalidated = upserted, invalidated
+    return index
+
+def test_dry_run_reports_drift_without_touching_the_index(index):
+    before = dict(index.vectors)
+    report = reconcile(dry_run=True)
+
+    assert report["vectors_scanned"] == 9 and index.pages_listed == 3
+    assert (report["orphan_rows"], report["orphan_chunks"], report["orphan_legacy"]) == (1, 1, 2)
+    assert (report["missing_rows"], report["missing_chunks"], report["replaced_legacy"]) == (1, 1, 1)
+    assert report["deleted"] == report["reindexed"] == 0
+    assert index.vectors == before and index.upserted == []
+
+def test_real_run_deletes_orphans_and_reindexes_missing_vectors(index):
+    report = reconcile()
+
+    assert report["deleted"] == 5 and report["reindexed"] == 2
+    # One vector per fact: legacy-y made way for row-2
+    assert set(index.vectors) == {"row-1", "row-2", "file-10-a", "file-10-b", "file-11-new", "legacy-w"}
+    assert ("row-2", "Policy - Delivery: Free within Lagos") in index.upserted
+    assert ("file-10-b", "Fried rice") in index.upserted
+    assert index.vectors["file-10-b"] == {"file_id": 10, "user_id": 1, "source": "pdf_upload"}
+    assert index.invalidated == [1]
+
+    again = reconcile(dry_run=True) # converged
+    assert again["orphan_rows"] + again["orphan_chunks"] + again["orphan_legacy"] == 0
+    assert again["missing_rows"] + again["missing_chunks"] + again["replaced_legacy"] == 0
+
+def test_reconciliation_is_a_scheduled_job():
+    assert any(job.name == "vector_reconcile" and job.func is reconcile for job in scheduler.JOBS)
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timedelta
+from sqlmodel import Session, select
+
+from app import retention, exports
+from app.config import settings
+from app.models import ChatLog
+from app.retention import archive_old_chats, archive_months, iter_archived_chats
+
+pytestmark = pytest.mark.db(patch=[retention, exports], owners=1)
+
+@pytest.fixture(autouse=True)
+def chats(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_ARCHIVE_DIR", str(tmp_path / "archives"))
+    monkeypatch.setattr(retention, "ARCHIVE_BATCH_SIZE", 3)
+
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        for i, when in enumerate([datetime(2024, 1, 5), datetime(2024, 1, 20), datetime(2024, 2, 3), now - timedelta(days=1)]):
+            session.add(ChatLog(conversation_id=f"c{i}", sender="+2348000000001", message_text=f"owner {i}", user_id=1, timestamp=when))
+        session.add(ChatLog(conversation_id="x", sender="2348099999999", message_text="customer", user_id=None, timestamp=datetime(2024, 1, 7)))
+        session.commit()
+
+def archived(user_id):
+    return [record for batch in iter_archived_chats(user_id) for record in batch]
+
+def test_old_logs_move_to_monthly_archives(engine):
+    result = archive_old_chats(days=90)
+    assert result["archived"] == 4 and result["files"] == 3
+
+    with Session(engine) as session:
+        assert [log.message_text for log in session.exec(select(ChatLog)).all()] == ["owner 3"]
+    assert archive_months(1) == ["2024-01", "2024-02"]
+    assert [r["message_text"] for r in archived(1)] == ["owner 0", "owner 1", "owner 2"]
+    assert archived(1)[0]["timestamp"] == "2024-01-05T00:00:00"
+    assert [r["message_text"] for r in archived(None)] == ["customer"]
+
+def test_dry_run_changes_nothing(engine, tmp_path):
+    assert archive_old_chats(days=90, dry_run=True)["archived"] == 4
+    with Session(engine) as session:
+        assert len(session.exec(select(ChatLog)).all()) == 5
+    assert archive_months(1) == []
+
+def test_rerun_after_interrupted_delete_does_not_duplicate(engine, monkeypatch):
+    # Simulate a crash after the archive write but before the DELETE committed
+    real_delete = retention.delete
+    monkeypatch.setattr(retention, "delete", lambda model: (_ for _ in ()).throw(RuntimeError("crash")))
+    with pytest.raises(RuntimeError):
+        archive_old_chats(days=90)
+    monkeypatch.setattr(retention, "delete", real_delete) # only this; the archive dir stays under tmp_path
+
+    archive_old_chats(days=90)
+    assert [r["message_text"] for r in archived(1)] == ["owner 0", "owner 1", "owner 2"]
+
+def test_chat_export_includes_archived_history(engine):
+    archive_old_chats(days=90)
+    response = exports.stream_export(exports.chat_export_query(1), exports.CHAT_COLUMNS, "ndjson", "chats",
+                                     archived_batches=iter_archived_chats(1))
+
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    lines = [json.loads(line) for line in asyncio.run(collect()).decode().splitlines()]
+    assert [line["message_text"] for line in lines] == ["owner 0", "owner 1", "owner 2", "owner 3"]
+    assert "user_id" not in lines[0]
@@ -0,0 +1,67 @@
+import pytest
+from datetime import date, datetime
+from sqlmodel import Session, select
+
+from app.models import SalesLedger, DailySalesRollup
+from app.rollups import record_sale, change_sale_status, sales_totals, resolve_period, rebuild_rollups
+
+def log_sale(session, amount, when, status="COMPLETED", user_id=1):
+    sale = SalesLedger(transaction_id=f"t-{amount}-{when}", item_description="item", amount=amount,
+                       customer_name="Walk-in", logged_by="x", user_id=user_id, status=status, timestamp=when)
+    session.add(sale)
+    record_sale(session, sale)
+    session.commit()
+    return sale
+
+def rollup_rows(session):
+    rows = session.exec(select(DailySalesRollup).order_by(DailySalesRollup.user_id, DailySalesRollup.day, DailySalesRollup.status)).all()
+    return [(r.user_id, r.day, r.status, r.revenue, r.count) for r in rows]
+
+def test_sales_update_rollups_incrementally(engine):
+    with Session(engine) as session:
+        log_sale(session, 1000, datetime(2024, 3, 1, 9))
+        log_sale(session, 500, datetime(2024, 3, 1, 18))
+        log_sale(session, 200, datetime(2024, 3, 2, 12))
+        log_sale(session, 50, datetime(2024, 3, 2, 12), user_id=2)
+
+        totals = sales_totals(session, 1, date(2024, 3, 1), date(2024, 3, 1))
+        assert totals == {"COMPLETED": (1500.0, 2)}
+        assert sales_totals(session, 1, date(2024, 3, 1), date(2024, 3, 31))["COMPLETED"] == (1700.0, 3)
+        assert sales_totals(session, 2, date(2024, 3, 1), date(2024, 3, 31))["COMPLETED"] == (50.0, 1)
+
+def test_status_change_moves_totals(engine):
+    with Session(engine) as session:
+        sale = log_sale(session, 800, datetime(2024, 3, 5, 10), status="PENDING")
+        change_sale_status(session, sale, "COMPLETED")
+        session.commit()
+
+        totals = sales_totals(session, 1, date(2024, 3, 5), date(2024, 3, 5))
+        assert totals["COMPLETED"] == (800.0, 1)
+        assert totals["PENDING"] == (0.0, 0)
+        assert session.get(SalesLedger, sale.id).status == "COMPLETED"
+
+def test_rebuild_matches_incremental_rollups(engine):
+    with Session(engine) as session:
+        log_sale(session, 1000, datetime(2024, 3, 1, 9))
+        sale = log_sale(session, 300, datetime(2024, 3, 2, 9), status="PENDING")
+        change_sale_status(session, sale, "CANCELLED")
+        session.commit()
+        log_sale(session, 50, datetime(2024, 3, 2, 12), user_id=2)
+        incremental = [row for row in rollup_rows(session) if row[4] != 0]
+
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+    with Session(engine) as session:
+        assert rollup_rows(session) == incremental
+
+def test_resolve_period():
+    today = date(2024, 6, 15)
+    assert resolve_period("today", today) == (today, today)
+    assert resolve_period("yesterday", today) == (date(2024, 6, 14), date(2024, 6, 14))
+    assert resolve_period("week", today) == (date(2024, 6, 9), today)
+    assert resolve_period("Year", today) == (date(2023, 6, 17), today)
+    assert resolve_period("2024-01-01 to 2024-03-31", today) == (date(2024, 1, 1), date(2024, 3, 31))
+    with pytest.raises(ValueError):
+        resolve_period("fortnight", today)
+    with pytest.raises(ValueError):
+        resolve_period("2024-03-31 to 2024-01-01", today)
@@ -0,0 +1,96 @@
+import pytest
+from datetime import datetime, time, timedelta
+from sqlmodel import Session
+
+from app import digest, scheduler
+from app.digest import send_daily_digests, daily_stats, render_digest
+from app.models import User, InventoryItem, SalesLedger, ScheduledJobRun
+from app.rollups import record_sale
+from app.scheduler import ScheduledJob, claim_run, run_job
+
+NOW = datetime(2024, 3, 10, 20, 30)
+
+pytestmark = pytest.mark.db(patch=[scheduler, digest], owners=0)
+
+@pytest.fixture(name="sent")
+def sent_fixture(monkeypatch):
+    sent = []
+    monkeypatch.setattr(digest, "send_whatsapp_throttled", lambda to, text: sent.append((to, text)) or {"messages": []})
+    return sent
+
+def add_owner(session, phone, enabled=True, at=time(20, 0)):
+    user = User(business_name=f"Shop {phone[-1]}", phone_number=phone, password_hash="x", digest_enabled=enabled, digest_time=at)
+    session.add(user)
+    session.commit()
+    return user.id
+
+def sale(session, user_id, amount, status="COMPLETED", when=NOW):
+    row = SalesLedger(transaction_id=f"t{user_id}-{amount}-{status}", item_description="x", amount=amount,
+                      customer_name="Walk-in", logged_by="x", user_id=user_id, status=status, timestamp=when)
+    session.add(row)
+    record_sale(session, row)
+    session.commit()
+
+# --- SCHEDULER ---
+
+def test_job_runs_once_per_interval(engine):
+    calls = []
+    job = ScheduledJob("tick", lambda: calls.append(1) or len(calls), timedelta(minutes=5))
+    with Session(engine) as session:
+        assert claim_run(session, job, NOW)
+        assert not claim_run(session, job, NOW) # a second worker in the same tick
+        run_job(job)
+        assert not claim_run(session, job, NOW + timedelta(minutes=4))
+        assert claim_run(session, job, NOW + timedelta(minutes=5))
+
+        run = session.get(ScheduledJobRun, "tick")
+        assert (run.last_status, run.last_result) == ("COMPLETED", "1")
+
+def test_unfinished_run_blocks_until_stale(engine):
+    job = ScheduledJob("slow", lambda: None, timedelta(minutes=1))
+    with Session(engine) as session:
+        assert claim_run(session, job, NOW)
+        assert not claim_run(session, job, NOW + timedelta(minutes=10)) # still running
+        assert claim_run(session, job, NOW + scheduler.STALE_RUN) # presumed dead
+
+def test_failed_job_is_recorded(engine):
+    job = ScheduledJob("broken", lambda: 1 / 0, timedelta(minutes=1))
+    with Session(engine) as session:
+        claim_run(session, job, NOW)
+    run_job(job)
+    with Session(engine) as session:
+        run = session.get(ScheduledJobRun, "broken")
+        assert run.last_status == "FAILED" and "division by zero" in run.last_error
+
+# --- DIGEST ---
+
+def test_daily_stats_for_many_tenants(engine):
+    with Session(engine) as session:
+        a, b = add_owner(session, "+2348000000001"), add_owner(session, "+2348000000002")
+        sale(session, a, 1000)
+        sale(session, a, 500)
+        sale(session, a, 200, status="PENDING")
+        sale(session, a, 999, when=NOW - timedelta(days=1))
+        session.add(InventoryItem(user_id=b, name="Rice", price=1, stock=0))
+        session.commit()
+
+        stats = daily_stats(session, [a, b], NOW.date())
+    assert stats[a] == {"revenue": 1500.0, "sales": 2, "pending": 1, "low_stock": 0}
+    assert stats[b] == {"revenue": 0.0, "sales": 0, "pending": 0, "low_stock": 1}
+    assert "₦1,500.00 from 2 sale(s)" in render_digest("Shop", NOW.date(), stats[a])
+
+def test_digest_goes_to_due_opted_in_owners_once_a_day(engine, sent):
+    with Session(engine) as session:
+        add_owner(session, "+2348000000001")
+        add_owner(session, "+2348000000002", enabled=False)
+        add_owner(session, "+2348000000003", at=time(21, 0))
+
+    assert send_daily_digests(NOW) == {"sent": 1, "failed": 0}
+    assert [to for to, _ in sent] == ["+2348000000001"]
+    assert send_daily_digests(NOW + timedelta(minutes=1))["sent"] == 0
+
+    send_daily_digests(NOW.replace(hour=21, minute=5))
+    assert [to for to, _ in sent] == ["+2348000000001", "+2348000000003"]
+
+    send_daily_digests(NOW + timedelta(days=1)) # next day, 20:30: only the 20:00 owner is due yet
+    assert [to for to, _ in sent][2:] == ["+2348000000001"]
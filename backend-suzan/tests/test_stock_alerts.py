@@ -0,0 +1,68 @@
+import io
+import pytest
+from sqlmodel import Session, select
+
+from app import orders, stock_alerts
+from app.config import settings
+from app.inventory_import import import_inventory, iter_import_rows
+from app.models import InventoryItem, Alert, SalesLedger
+from app.orders import place_order, cancel_order
+from app.stock_alerts import check_low_stock
+from app.tenants import Tenant
+
+pytestmark = pytest.mark.db(patch=[orders], owners=1)
+
+@pytest.fixture(autouse=True)
+def catalog(engine):
+    with Session(engine) as session:
+        session.add(InventoryItem(user_id=1, name="Rice 50kg", price=50000, stock=4, low_stock_threshold=2))
+        session.commit()
+
+@pytest.fixture(name="sent")
+def sent_fixture(monkeypatch):
+    sent = []
+    monkeypatch.setattr(settings, "LOW_STOCK_WHATSAPP", True)
+    monkeypatch.setattr(stock_alerts, "get_tenant", lambda user_id: Tenant(user_id, "+2348000000001", "Shop", "Suzan", "+1"))
+    monkeypatch.setattr(stock_alerts, "send_whatsapp", lambda to, text: sent.append((to, text)))
+    return sent
+
+def alerts(engine):
+    with Session(engine) as session:
+        return [a.message for a in session.exec(select(Alert).where(Alert.type == "Stock").order_by(Alert.id)).all()]
+
+def order(engine, quantity):
+    with Session(engine) as session:
+        sale = place_order(session, 1, "2348099999999", session.get(InventoryItem, 1), quantity)
+        session.commit()
+        return sale.id if sale else None
+
+def test_crossing_threshold_alerts_once(engine, sent):
+    order(engine, 1) # 3 left: above threshold
+    assert alerts(engine) == [] and sent == []
+
+    order(engine, 1) # 2 left: low
+    order(engine, 1) # 1 left: still low, no repeat
+    assert alerts(engine) == ["Low stock: Rice 50kg has 2 left"]
+    assert sent == [("+2348000000001", "⚠️ Low stock: Rice 50kg has 2 left")]
+
+def test_restock_rearms_the_alert(engine, sent):
+    first = order(engine, 2)
+    with Session(engine) as session:
+        cancel_order(session, session.get(SalesLedger, first)) # back to 4
+        session.commit()
+    order(engine, 4)
+    assert alerts(engine) == ["Low stock: Rice 50kg has 2 left", "Out of stock: Rice 50kg"]
+
+def test_rolled_back_alert_is_not_sent(engine, sent):
+    with Session(engine) as session:
+        session.get(InventoryItem, 1).stock = 0
+        session.flush()
+        assert len(check_low_stock(session, [1])) == 1
+        session.rollback()
+    assert sent == [] and alerts(engine) == []
+
+def test_import_checks_touched_items(engine):
+    rows = iter_import_rows("stock.csv", io.BytesIO(b"name,price,stock\nRice 50kg,50000,1\nBeans,2000,40\n"))
+    with Session(engine) as session:
+        import_inventory(session, 1, rows)
+    assert alerts(engine) == ["Low stock: Rice 50kg has 1 left"]
@@ -0,0 +1,110 @@
+import io
+import os
+import pytest
+from sqlmodel import Session, select
+
+from app import account_deletion, ingestion, storage
+from app.models import UploadedFile, DocumentChunk
+from app.storage import store_stream, release_blob, UploadTooLarge
+
+pytestmark = pytest.mark.db(patch=[storage, ingestion, account_deletion])
+
+@pytest.fixture(autouse=True)
+def blob_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "BLOB_DIR", str(tmp_path / "uploads" / "blobs"))
+    monkeypatch.setattr(storage, "TMP_DIR", str(tmp_path / "uploads" / "tmp"))
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_SIZE", 4) # many chunks even for tiny files
+
+def add_file(engine, stored, user_id, status="PENDING"):
+    with Session(engine) as session:
+        record = UploadedFile(filename="catalog.pdf", filepath=stored.path, sha256=stored.sha256,
+                              size_bytes=stored.size, user_id=user_id, status=status)
+        session.add(record)
+        session.commit()
+        return record.id
+
+def test_identical_uploads_share_one_blob(engine, tmp_path):
+    first = store_stream(io.BytesIO(b"%PDF catalog v1"), "Catalog.PDF")
+    second = store_stream(io.BytesIO(b"%PDF catalog v1"), "copy.pdf")
+    other = store_stream(io.BytesIO(b"%PDF catalog v2"), "catalog.pdf")
+
+    assert first.path == second.path and first.path.endswith(f"{first.sha256}.pdf")
+    assert (first.deduplicated, second.deduplicated) == (False, True)
+    assert other.path != first.path
+    assert open(first.path, "rb").read() == b"%PDF catalog v1"
+    assert first.size == 15
+    assert os.listdir(tmp_path / "uploads" / "tmp") == []
+
+def test_size_limit_is_enforced_while_streaming(engine, tmp_path):
+    with pytest.raises(UploadTooLarge):
+        store_stream(io.BytesIO(b"x" * 100), "big.pdf", max_bytes=10)
+    assert os.listdir(tmp_path / "uploads" / "tmp") == []
+    assert not os.path.exists(tmp_path / "uploads" / "blobs")
+
+def test_blob_is_kept_while_another_file_uses_it(engine, monkeypatch):
+    monkeypatch.setattr(storage, "BLOB_GRACE_SECONDS", 0)
+    stored = store_stream(io.BytesIO(b"%PDF shared"), "a.pdf")
+    first, second = add_file(engine, stored, 1), add_file(engine, stored, 2)
+
+    with Session(engine) as session:
+        session.delete(session.get(UploadedFile, first))
+        session.commit()
+    assert release_blob(stored.path) is False
+    assert os.path.exists(stored.path)
+
+    with Session(engine) as session:
+        session.delete(session.get(UploadedFile, second))
+        session.commit()
+    assert release_blob(stored.path) is True
+    assert not os.path.exists(stored.path)
+
+def test_account_deletion_keeps_blobs_other_tenants_share(engine, monkeypatch):
+    monkeypatch.setattr(account_deletion, "delete_tenant_vectors", lambda user_id, file_ids: None)
+    monkeypatch.setattr(account_deletion, "invalidate_lexical_index", lambda user_id: None)
+    shared = store_stream(io.BytesIO(b"%PDF shared"), "a.pdf")
+    private = store_stream(io.BytesIO(b"%PDF private"), "b.pdf")
+    add_file(engine, shared, 1)
+    add_file(engine, private, 1)
+    add_file(engine, shared, 2)
+
+    monkeypatch.setattr(storage, "BLOB_GRACE_SECONDS", 0)
+    job = account_deletion.queue_account_deletion(1)
+    account_deletion.run_account_deletion_job(job.id)
+    assert os.path.exists(shared.path) and not os.path.exists(private.path)
+
+def test_account_deletion_keeps_a_blob_another_upload_just_reused(engine, monkeypatch):
+    monkeypatch.setattr(account_deletion, "delete_tenant_vectors", lambda user_id, file_ids: None)
+    monkeypatch.setattr(account_deletion, "invalidate_lexical_index", lambda user_id: None)
+    stored = store_stream(io.BytesIO(b"%PDF catalog"), "a.pdf")
+    add_file(engine, stored, 1)
+    store_stream(io.BytesIO(b"%PDF catalog"), "same.pdf") # tenant 2's row isn't committed yet
+
+    job = account_deletion.queue_account_deletion(1)
+    account_deletion.run_account_deletion_job(job.id)
+    assert os.path.exists(stored.path)
+
+def test_duplicate_content_clones_the_index(engine, tmp_path, monkeypatch, write_pdf):
+    embedded, copied = [], []
+    monkeypatch.setattr(ingestion, "embed_and_upsert", lambda items: embedded.extend(items) or len(items))
+    monkeypatch.setattr(ingestion, "copy_vectors", lambda pairs, metadata: copied.extend(pairs) or len(pairs))
+    monkeypatch.setattr(ingestion, "invalidate_lexical_index", lambda user_id: None)
+
+    pdf = tmp_path / "catalog.pdf"
+    write_pdf(pdf, ["Rice 50kg - N50,000", "Beans 10kg - N12,000"])
+    with open(pdf, "rb") as f:
+        stored = store_stream(f, "catalog.pdf")
+    first = add_file(engine, stored, 1)
+    ingestion.run_ingestion_job(first)
+    assert len(embedded) == 2
+
+    second = add_file(engine, stored, 2)
+    ingestion.run_ingestion_job(second)
+    assert len(embedded) == 2 # nothing re-embedded
+    assert len(copied) == 2
+    assert all(target == source.replace(f"file-{first}-", f"file-{second}-") != source for source, target in copied)
+
+    with Session(engine) as session:
+        record = session.get(UploadedFile, second)
+        assert (record.status, record.chunks_indexed, record.chunks_embedded, record.pages_done) == ("COMPLETED", 2, 0, 2)
+        vector_ids = session.exec(select(DocumentChunk.vector_id).where(DocumentChunk.file_id == second)).all()
+        assert sorted(vector_ids) == sorted(target for _, target in copied)
@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import event, text
+from sqlmodel import Session
+
+from app import tenants
+from app.cache import TTLCache, MISSING
+from app.migrations import run_migrations
+from app.models import User
+from app.tenants import normalize_phone, resolve_tenant, get_tenant, invalidate_tenant, tenant_for_tool, current_tenant
+
+pytestmark = pytest.mark.db(patch=[tenants], owners=0)
+
+@pytest.mark.parametrize("raw", [
+    "+2348012345678", "2348012345678", "08012345678", "0801 234 5678",
+    "+234 (0)801-234-5678", "002348012345678", " +234 801 234 5678 ",
+])
+def test_normalize_phone_to_e164(raw):
+    assert normalize_phone(raw) == "+2348012345678"
+
+def test_normalize_phone_keeps_other_countries_and_rejects_junk():
+    assert normalize_phone("+1 (555) 194-0685") == "+15551940685"
+    for junk in ["", "abc", "12345", "+1234567890123456"]:
+        with pytest.raises(ValueError):
+            normalize_phone(junk)
+
+def test_ttl_cache_expiry_and_eviction(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: clock[0])
+    cache = TTLCache(ttl_seconds=10, max_entries=2)
+    cache.set("a", None)
+    assert cache.get("a") is None # a cached None is a hit
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is MISSING # evicted, oldest first
+    clock[0] += 11
+    assert cache.get("b") is MISSING
+
+@pytest.fixture(name="queries")
+def queries_fixture(engine, session, monkeypatch):
+    session.add(User(business_name="Shop", phone_number="+2348012345678", password_hash="x"))
+    session.commit()
+    monkeypatch.setattr(tenants, "_cache", TTLCache(60))
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+def test_resolver_caches_every_phone_format(queries):
+    first = resolve_tenant("2348012345678") # WhatsApp sends digits only
+    assert first.business_name == "Shop"
+    assert resolve_tenant("0801 234 5678") is first
+    assert get_tenant(first.id) is first
+    assert len(queries) == 1
+
+def test_misses_are_cached_until_invalidated(queries):
+    assert resolve_tenant("+2348099999999") is None
+    assert resolve_tenant("08099999999") is None
+    assert len(queries) == 1
+    invalidate_tenant(phone="+2348099999999")
+    resolve_tenant("+2348099999999")
+    assert len(queries) == 2
+
+def test_updates_invalidate_by_id(queries):
+    tenant = resolve_tenant("+2348012345678")
+    with Session(tenants.engine) as session:
+        user = session.get(User, tenant.id)
+        user.bot_name = "Ada"
+        session.add(user)
+        session.commit()
+    invalidate_tenant(tenant.id)
+    assert resolve_tenant("+2348012345678").bot_name == "Ada"
+
+def test_tools_prefer_the_turn_tenant(queries):
+    turn_tenant = resolve_tenant("+2348012345678")
+    token = current_tenant.set(turn_tenant)
+    try:
+        assert tenant_for_tool("+2348000000000") is turn_tenant
+    finally:
+        current_tenant.reset(token)
+    assert tenant_for_tool("+2348000000000") is None
+
+def test_migration_normalizes_stored_phones(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_migrations WHERE version = 9"))
+        for phone in ["2348012345678", "08011111111", "+2348011111111", "not a phone"]:
+            conn.execute(text(
+                "INSERT INTO \"user\" (business_name, phone_number, password_hash, bot_name, bot_phone_number, created_at) "
+                "VALUES ('S', :phone, 'x', 'Suzan', '', '2024-01-01')"
+            ), {"phone": phone})
+
+    # A collision and an unparseable number stop the migration; nothing is changed
+    with pytest.raises(RuntimeError) as error:
+        run_migrations(engine)
+    assert "user 2: '08011111111' normalizes to +2348011111111, which user 3 has" in str(error.value)
+    assert "user 4: 'not a phone'" in str(error.value)
+    with engine.begin() as conn:
+        assert conn.execute(text('SELECT phone_number FROM "user" WHERE id = 1')).scalar() == "2348012345678"
+        conn.execute(text('DELETE FROM "user" WHERE id IN (2, 4)')) # the owner cleans up by hand
+
+    assert run_migrations(engine) == [9]
+    with engine.connect() as conn:
+        phones = conn.execute(text('SELECT phone_number FROM "user" ORDER BY id')).scalars().all()
+    assert phones == ["+2348012345678", "+2348011111111"]
@@ -0,0 +1,95 @@
+import asyncio
+import io
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import voice
+from app.voice import plan_cuts, split_audio, transcribe_file
+
+pydub = pytest.importorskip("pydub")
+
+class FakeWhisper:
+    """Stands in for AsyncGroq: each call takes `delay` seconds and returns a canned text."""
+    def __init__(self, delay=0.5):
+        self.delay = delay
+        self.calls = []
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create))
+
+    async def create(self, file, **kwargs):
+        self.calls.append(file[0])
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(text=f" words of {file[0]} ")
+
+@pytest.fixture(name="whisper")
+def whisper_fixture(monkeypatch):
+    client = FakeWhisper()
+    monkeypatch.setattr(voice, "_client", client)
+    monkeypatch.setattr(voice, "_whisper_slots", asyncio.Semaphore(4))
+    monkeypatch.setattr(voice, "_transcripts", voice.TTLCache(60))
+    return client
+
+def write_wav(path, *pieces_ms):
+    """Alternating tone/silence pieces, e.g. (25000, 1000, 25000) = tone, pause, tone."""
+    from pydub import AudioSegment
+    from pydub.generators import Sine
+    audio = AudioSegment.silent(0, frame_rate=16000)
+    for i, ms in enumerate(pieces_ms):
+        piece = Sine(440).to_audio_segment(duration=ms) if i % 2 == 0 else AudioSegment.silent(ms)
+        audio += piece.set_frame_rate(16000).set_channels(1)
+    audio.export(str(path), format="wav")
+    return str(path)
+
+def test_plan_cuts_prefers_pauses_near_the_target():
+    assert plan_cuts(50_000, [(20_000, 21_000)]) == [(0, 50_000)] # short enough to send whole
+    assert plan_cuts(100_000, [(10_000, 10_400), (29_000, 31_000), (70_000, 71_000)]) == [
+        (0, 30_000), (30_000, 70_500), (70_500, 100_000)
+    ]
+
+def test_plan_cuts_hard_cuts_without_pauses():
+    assert plan_cuts(130_000, []) == [(0, 60_000), (60_000, 120_000), (120_000, 130_000)]
+
+LONG_NOTE = (25_000, 1_000, 25_000, 1_000, 25_000, 1_000, 25_000) # 103s, pauses at 25.5s, 51.5s, 77.5s
+
+def test_long_note_is_split_on_silence(tmp_path):
+    segments = split_audio(write_wav(tmp_path / "note.wav", *LONG_NOTE))
+    assert [name for name, _ in segments] == ["segment_0.wav", "segment_1.wav", "segment_2.wav"]
+    lengths = [len(pydub.AudioSegment.from_file(io.BytesIO(data), format="wav")) for _, data in segments]
+    assert lengths == [25_500, 26_000, 51_500]
+
+def test_short_or_undecodable_audio_is_sent_whole(tmp_path):
+    short = write_wav(tmp_path / "short.wav", 5_000)
+    assert [name for name, _ in split_audio(short)] == ["short.wav"]
+    junk = tmp_path / "junk.wav"
+    junk.write_bytes(b"not audio")
+    assert split_audio(str(junk)) == [("junk.wav", b"not audio")]
+
+def test_segments_are_transcribed_concurrently_and_stitched(tmp_path, whisper):
+    path = write_wav(tmp_path / "note.wav", *LONG_NOTE)
+    started = time.monotonic()
+    text = asyncio.run(transcribe_file(path))
+    elapsed = time.monotonic() - started
+    assert text == "words of segment_0.wav words of segment_1.wav words of segment_2.wav"
+    assert len(whisper.calls) == 3
+    assert elapsed < 2 * whisper.delay # one round trip, not three
+
+def test_transcripts_are_cached_by_audio_hash(tmp_path, whisper):
+    first = write_wav(tmp_path / "a.wav", 5_000)
+    copy = tmp_path / "b.wav"
+    copy.write_bytes(open(first, "rb").read())
+    assert asyncio.run(transcribe_file(first)) == "words of a.wav"
+    assert asyncio.run(transcribe_file(str(copy))) == "words of a.wav"
+    assert len(whisper.calls) == 1
+
+def test_compressed_voice_notes_are_decoded_with_ffmpeg(tmp_path):
+    pytest.importorskip("imageio_ffmpeg")
+    import subprocess
+    wav = write_wav(tmp_path / "note.wav", *LONG_NOTE)
+    ogg = str(tmp_path / "note.ogg") # what WhatsApp sends
+    subprocess.run([voice._ffmpeg(), "-loglevel", "error", "-i", wav, "-c:a", "libopus", ogg], check=True)
+
+    segments = split_audio(ogg)
+    assert [name for name, _ in segments] == ["segment_0.wav", "segment_1.wav", "segment_2.wav"]
+    lengths = [len(pydub.AudioSegment.from_file(io.BytesIO(data), format="wav")) for _, data in segments]
+    assert [round(ms / 1000) for ms in lengths] == [26, 26, 52]